@@ -0,0 +1,97 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: configlookup.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 11:20:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Measures the cost of a single configuration lookup.
+
+It compares the way configuration values used to be looked up (a
+'SafeConfigParser.get' call with interpolation variables on every access) with
+the memoized 'Main.getGiCfg' and 'Main.getGiCfgInt' lookups.
+
+Usage:
+
+    PYTHONPATH=src python benchmarks/configlookup.py [lookups]
+"""
+
+from ConfigParser import SafeConfigParser
+from homelib.main import CFG_SEC_GINFO, Main
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from timeit import Timer
+import sys
+
+
+
+def writeConfig(configFile, optionsCount):
+    """
+    Writes a configuration file with 'optionsCount' general information options
+    (every one of them uses interpolation).
+    """
+    with open(configFile, 'w') as f:
+        f.write("[" + CFG_SEC_GINFO + "]\n")
+        f.write("MY_NASTAVITVE_DIR=%(homedir)s/Documents/Nastavitve\n")
+        f.write("MY_BIND_DIR=%(MY_NASTAVITVE_DIR)s/bind\n")
+        f.write("MY_NUMBER=42\n")
+        for i in xrange(optionsCount):
+            f.write("OPTION_" + str(i) + "=%(MY_BIND_DIR)s/" + str(i) + "\n")
+
+
+
+def perLookup(stmt, lookups):
+    """
+    @returns    The best time (in microseconds) of a single lookup.
+    """
+    return min(Timer(stmt).repeat(3, lookups)) / lookups * 1e6
+
+
+
+if __name__ == '__main__':
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tmpDir = mkdtemp()
+    try:
+        configFile = join(tmpDir, 'homelib.config')
+        writeConfig(configFile, 200)
+        main = Main(homeDir=tmpDir, configFile=configFile)
+        configFileVars = {'homedir': tmpDir, 'confdir': tmpDir, 'conffile': configFile}
+        parser = SafeConfigParser()
+        parser.read(configFile)
+
+        results = [
+            ('SafeConfigParser.get (before)', perLookup(lambda: parser.get(CFG_SEC_GINFO, 'MY_BIND_DIR', vars=configFileVars), lookups)),
+            ('int(SafeConfigParser.get) (before)', perLookup(lambda: int(parser.get(CFG_SEC_GINFO, 'MY_NUMBER', vars=configFileVars)), lookups)),
+            ('Main.getGiCfg (after)', perLookup(lambda: main.getGiCfg('MY_BIND_DIR'), lookups)),
+            ('Main.getGiCfgInt (after)', perLookup(lambda: main.getGiCfgInt('MY_NUMBER'), lookups)),
+        ]
+        for (name, usec) in results:
+            print "%-40s %8.3f us/lookup" % (name, usec)
+    finally:
+        rmtree(tmpDir)
@@ -0,0 +1,127 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: linkdirtree.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 14:10:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Measures 'linkDirTree' on a synthetic tree (100k files by default) that has to
+be merged into the source directory.
+
+It compares the previous implementation ('os.walk' with an 'exists' check, a
+'makedirs' and a 'move' per file) with the current one (one 'scandir' per
+directory, every directory created once, several threads).
+
+Usage:
+
+    PYTHONPATH=src python benchmarks/linkdirtree.py [files [files per directory]]
+"""
+
+from homelib.utils import createLink
+from homelib.utils import linkDirTree
+from homelib.utils import makeBackup
+from os import makedirs
+from os import walk
+from os.path import dirname
+from os.path import exists
+from os.path import join
+from os.path import relpath
+from shutil import move
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+import logging
+import sys
+
+
+
+def oldLinkDirTree(srcDir, tarDir):
+    """
+    The previous implementation of 'linkDirTree' (the parts that matter here).
+    """
+    tarPath = join(tarDir, 'A')
+    backupDir = makeBackup(tarPath)
+    createLink(srcDir, tarPath)
+    for root, _, files in walk(backupDir):
+        for filePath in files:
+            fullFilePath = join(root, filePath)
+            destFilePath = join(srcDir, relpath(fullFilePath, backupDir))
+            if exists(destFilePath):
+                makeBackup(fullFilePath, dirname(destFilePath))
+            else:
+                try:
+                    makedirs(dirname(destFilePath))
+                except:
+                    pass
+                move(fullFilePath, destFilePath)
+
+
+
+def makeTree(baseDir, filesCount, filesPerDir):
+    """
+    Creates '<baseDir>/src/A' (every tenth directory of the tree, with a few
+    files) and '<baseDir>/tar/A' (the whole tree with 'filesCount' files).
+
+    @returns    A pair '(srcDir, tarDir)' for 'linkDirTree'.
+    """
+    srcDir = join(baseDir, 'src', 'A')
+    tarDir = join(baseDir, 'tar')
+    for d in xrange((filesCount + filesPerDir - 1) // filesPerDir):
+        relDir = join('d%03d' % (d % 100), 'd%05d' % d)
+        makedirs(join(tarDir, 'A', relDir))
+        for f in xrange(min(filesPerDir, filesCount - d * filesPerDir)):
+            open(join(tarDir, 'A', relDir, 'f%04d' % f), 'w').close()
+        if d % 10 == 0:
+            makedirs(join(srcDir, relDir))
+            for f in xrange(0, filesPerDir, 25):
+                open(join(srcDir, relDir, 'f%04d' % f), 'w').close()
+    return (srcDir, tarDir)
+
+
+
+def measure(name, fun, filesCount, filesPerDir):
+    baseDir = mkdtemp()
+    try:
+        (srcDir, tarDir) = makeTree(baseDir, filesCount, filesPerDir)
+        start = time()
+        fun(srcDir, tarDir)
+        print "%-32s %8.2f s" % (name, time() - start)
+    finally:
+        rmtree(baseDir)
+
+
+
+if __name__ == '__main__':
+    filesCount = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    filesPerDir = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    # Every clashing file is backed up with a log message.
+    logging.disable(logging.INFO)
+    print "Merging %d files (%d per directory):" % (filesCount, filesPerDir)
+    measure('os.walk (before)', oldLinkDirTree, filesCount, filesPerDir)
+    measure('linkDirTree, 1 thread', lambda s, t: linkDirTree(s, t, 1), filesCount, filesPerDir)
+    measure('linkDirTree, 4 threads', lambda s, t: linkDirTree(s, t, 4), filesCount, filesPerDir)
@@ -128,16 +128,9 @@ class HomeConfig(ConfigScript):
         info("Installing the custom `" + myBashrcFilename + "` script...")
         myBashrcScript = os.path.join(self.getMain().dirHome(), myBashrcFilename)
         bashrc = os.path.join(self.getMain().dirHome(), ".bashrc")
-        # Check that the `bashrc` script doesn't already contain the `include`:
+        # Append the `include` unless the `bashrc` script already contains it:
         includeCommand = "source '" + myBashrcScript + "'";
-        contains = any([line.lstrip().startswith(includeCommand) for line in open(bashrc)])
-        if not contains:
-            info("Does not contain command. Inserting...")
-            appendLinesToFile(bashrc, [
-               "",
-               "# Run my custom environment initialisation script:",
-               includeCommand]
-            )
+        if ensureLinesInFile(bashrc, [includeCommand], ["", "# Run my custom environment initialisation script:"]):
             warning("Telling Bash to load the custom '" + myBashrcScript + "' script on login. Please check the file '" + bashrc + "' for duplicated invocations.")
         createLink([self.getGiCfg('MY_BASHRC_DIR'), myBashrcFilename], myBashrcScript, UTILS_CREATE_LINK_DELETE)
 
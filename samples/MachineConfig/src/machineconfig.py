@@ -57,11 +57,17 @@ class MachineConfig(ConfigScript):
     def preRun(self):
         self.macoSpecificStuff()
 
+    def postUpdate(self, version):
+        # Relabel the files before the update is recorded as applied (and
+        # before later updates start the services that use them).
+        flushRestorecon()
+
     def postRun(self):
-        pass
+        flushRestorecon()
 
     def postFail(self, ex):
-        pass
+        # Relabel the files that have been set up before the failure.
+        flushRestorecon()
 
     @updateOnly('maco_server')
     def update1(self):
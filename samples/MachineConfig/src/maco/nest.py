@@ -31,6 +31,7 @@
 
 from logging import info
 
+from homelib.treeprops import fixTreeProps
 from homelib.utils import UTILS_CREATE_LINK_DELETE
 from homelib.utils import UTILS_CREATE_LINK_HARD_LINK
 from homelib.utils import createLink
@@ -38,7 +39,7 @@ from homelib.utils import mymakedirs
 from homelib.utils import runCmd
 from maco.paths import CRON_WEEKLY_DIR
 from maco.paths import MERCURIAL_ETC_DIR
-from maco.utils import restoreconR
+from maco.utils import queueRestoreconR
 
 NEST_RW_GROUP='nest_rw'
 
@@ -60,13 +61,11 @@ def configureNest(cfgScript):
     runCmd('usermod', '-a', '-G', NEST_RW_GROUP, 'matej')
     info("Added the user 'matej' to the '" + NEST_RW_GROUP + "' group.")
 
-    runCmd('chown', '-R', 'root:root', repoPath)
-    runCmd('setfacl', '-b', repoPath)
-    runCmd('setfacl', '-R', '-m', 'd:u::rwx,d:g::rwx,d:o:0,d:m:rwx,m:rwx,d:u:apache:rx,d:g:apache:rx,d:u:root:rwx,d:g:root:rwx,d:g:' + NEST_RW_GROUP + ':rwx,u:apache:rx,g:apache:rx,g:' + NEST_RW_GROUP + ':rwx', repoPath)
+    fixTreeProps(repoPath, 'root', 'root', acl='d:u::rwx,d:g::rwx,d:o:0,d:m:rwx,m:rwx,d:u:apache:rx,d:g:apache:rx,d:u:root:rwx,d:g:root:rwx,d:g:' + NEST_RW_GROUP + ':rwx,u:apache:rx,g:apache:rx,g:' + NEST_RW_GROUP + ':rwx')
     info("Configured Nest access rights.")
 
     createLink([ main.dirNastavitve(), 'Mercurial/Server Configuration/BackupHgRepos.sh' ], CRON_WEEKLY_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0550, 'root', 'root')
     createLink([ main.dirNastavitve(), 'Mercurial/Server Configuration/hgrc' ], MERCURIAL_ETC_DIR, UTILS_CREATE_LINK_HARD_LINK, 0444, 'root', 'root')
-    restoreconR(MERCURIAL_ETC_DIR)
-    restoreconR(CRON_WEEKLY_DIR)
+    queueRestoreconR(MERCURIAL_ETC_DIR)
+    queueRestoreconR(CRON_WEEKLY_DIR)
     info('Installed the global Mercurial configuration file and configured the repository backup creation script.')
@@ -35,6 +35,8 @@ from os.path import exists
 from os.path import join
 from shutil import move
 
+from homelib.linkplan import LinkPlan
+from homelib.treeprops import fixTreeProps
 from homelib.utils import UTILS_CREATE_LINK_DELETE
 from homelib.utils import UTILS_CREATE_LINK_HARD_LINK
 from homelib.utils import chprops
@@ -47,8 +49,8 @@ from maco.selinux import setupMacoPolicy
 from maco.utils import installPrivateKey
 from maco.utils import installUrbasCert
 from maco.utils import installUrbasPrivateKey
+from maco.utils import queueRestoreconR
 from maco.utils import restorecon
-from maco.utils import restoreconR
 
 
 
@@ -57,7 +59,7 @@ def setupNetworking(cfgScript):
     createLink([ dirNetworkScripts(cfgScript), 'ifcfg-p33p1' ], NET_SCRIPTS_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644)
     createLink([ dirSysconfig(cfgScript), 'iptables' ], SYSCONFIG_DIR, UTILS_CREATE_LINK_HARD_LINK, 0600)
     createLink([ dirSysconfig(cfgScript), 'system-config-firewall' ], SYSCONFIG_DIR, UTILS_CREATE_LINK_HARD_LINK, 0600)
-    restoreconR(SYSCONFIG_DIR)
+    queueRestoreconR(SYSCONFIG_DIR)
 
 
 def setupDesktopNetworking(cfgScript):
@@ -70,19 +72,19 @@ def setupDesktopNetworking(cfgScript):
 
 def setupSsh(cfgScript):
     createLink([ dirSsh(cfgScript), 'sshd_config' ], SSH_DIR, UTILS_CREATE_LINK_HARD_LINK, 0600)
-    restoreconR(SSH_DIR)
+    queueRestoreconR(SSH_DIR)
 
 
 
 def setupSvn(cfgScript):
-    runCmd('chown', '-R', 'apache:apache', srvDirSvn())
+    fixTreeProps(srvDirSvn(), 'apache', 'apache')
     setupMySvnPolicy(cfgScript)
 
     createLink([dirSvn(cfgScript), 'SVNBackup'], CRON_WEEKLY_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0550, 'root', 'root')
-    restoreconR(CRON_WEEKLY_DIR)
+    queueRestoreconR(CRON_WEEKLY_DIR)
     info('Installed the weekly SVN backup cron script.')
 
-    restoreconR(srvDirSvn())
+    queueRestoreconR(srvDirSvn())
     info('Configured the SVN repository.')
 
 
@@ -127,15 +129,18 @@ def setupHttpd(cfgScript):
 
 
 def setupBind(cfgScript):
-    createLink([dirBindConf(cfgScript), 'named.conf.default-zones'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK, 0640, 'root', 'bind')
-    createLink([dirBindConf(cfgScript), 'named.conf.options'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK, 0640, 'root', 'bind')
-    createLink([dirBindConf(cfgScript), 'named.conf.local'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK, 0640, 'root', 'bind')
-    createLink([dirBindConf(cfgScript), '90.157.141.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
-    createLink([dirBindConf(cfgScript), 'urbas.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
-    createLink([dirBindConf(cfgScript), 'stanujem.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
-    createLink([dirBindConf(cfgScript), 'stanuj.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
-    createLink([dirBindConf(cfgScript), 'banda.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
-    #createLink([dirBindSlaves(cfgScript), 'vcsweb.com.db'], NAMED_SLAVES_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'named', 'named')
+    bindConf = dirBindConf(cfgScript)
+    plan = LinkPlan()
+    plan.link([bindConf, 'named.conf.default-zones'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK, 0640, 'root', 'bind')
+    plan.link([bindConf, 'named.conf.options'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK, 0640, 'root', 'bind')
+    plan.link([bindConf, 'named.conf.local'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK, 0640, 'root', 'bind')
+    plan.link([bindConf, '90.157.141.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
+    plan.link([bindConf, 'urbas.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
+    plan.link([bindConf, 'stanujem.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
+    plan.link([bindConf, 'stanuj.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
+    plan.link([bindConf, 'banda.si.db'], NAMED_CONF_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
+    #plan.link([dirBindSlaves(cfgScript), 'vcsweb.com.db'], NAMED_SLAVES_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'named', 'named')
+    plan.apply()
     info('Configured BIND (domain name system server).')
 
 
@@ -144,12 +149,15 @@ def setupDovecot(cfgScript):
     installUrbasPrivateKey(cfgScript, 'mail.urbas.si.20110122.key.pem', 'mail.urbas.si.key.pem')
     installUrbasCert(cfgScript, 'mail.urbas.si.20110122.cert.pem', 'mail.urbas.si.cert.pem')
 
-    createLink([dirDovecotConf(cfgScript), 'dovecot.conf'], DOVECOT_ETC_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
+    plan = LinkPlan()
+    plan.link([dirDovecotConf(cfgScript), 'dovecot.conf'], DOVECOT_ETC_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
     
-    createLink([dirDovecotConfD(cfgScript), '10-auth.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
-    createLink([dirDovecotConfD(cfgScript), '10-mail.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
-    createLink([dirDovecotConfD(cfgScript), '10-master.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
-    createLink([dirDovecotConfD(cfgScript), '10-ssl.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
+    confD = dirDovecotConfD(cfgScript)
+    plan.link([confD, '10-auth.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
+    plan.link([confD, '10-mail.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
+    plan.link([confD, '10-master.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
+    plan.link([confD, '10-ssl.conf'], DOVECOT_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644, 'root', 'root')
+    plan.apply()
 
 
 
@@ -187,7 +195,7 @@ def setupPostfix(cfgScript):
 
 def installHomePage(cfgScript):
     createLink([dirHttpd(cfgScript), 'index.html'], WWW_HTML_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0444, 'apache', 'apache')
-    restoreconR(WWW_HTML_DIR)
+    queueRestoreconR(WWW_HTML_DIR)
 
 
 
@@ -195,6 +203,6 @@ def setupWebDAVCalendar(cfgScript):
     createLink([dirEtcHttpdConfd(cfgScript), 'mycalendar.conf'], HTTPD_CONFD_DIR, UTILS_CREATE_LINK_HARD_LINK | UTILS_CREATE_LINK_DELETE, 0644, 'root', 'root')
     chprops(join(srvDirMaco(), '.htpasswd.calendars'), 0440, 'apache', 'apache')
     mymakedirs(srvDirCalendars())
-    runCmd('chown', '-R', 'apache:apache', srvDirCalendars())
+    fixTreeProps(srvDirCalendars(), 'apache', 'apache')
     setupMacoPolicy(cfgScript)
     info('Configured WebDAV on HTTPD for calendars.')
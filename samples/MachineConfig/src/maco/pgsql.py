@@ -105,7 +105,7 @@ def initPgSql(cfgScript):
     createLink([main.dirNastavitve(), PGSQL_NASTAVITVE_MACO_DIR, PGSQL_MAIN_CONF_FILE], PGSQL_DATA_DIR, UTILS_CREATE_LINK_HARD_LINK, PGSQL_CONF_FILE_MODE, PGSQL_SERVICE_USER, PGSQL_SERVICE_GROUP)
 
 def enablePgSql(cfgScript):
-    cfgScript.getMain().serviceSoftware().enableServices([
+    cfgScript.getMain().serviceServices().enableServices([
             PGSQL_SERVICE_NAME
         ],
             '35')
@@ -35,7 +35,7 @@ from homelib.utils import UTILS_CREATE_LINK_HARD_LINK
 from homelib.utils import createLink
 from homelib.utils import mymakedirs
 from maco.paths import dirCups
-from maco.utils import restoreconR
+from maco.utils import queueRestoreconR
 
 CUPS_CONFIG_DIR='/etc/cups'
 CUPS_PPD_DIR=join(CUPS_CONFIG_DIR, 'ppd')
@@ -44,4 +44,4 @@ def setupPrinting(cfgScript):
     mymakedirs(CUPS_CONFIG_DIR)
     createLink([ dirCups(cfgScript), 'printers.conf' ], CUPS_CONFIG_DIR, UTILS_CREATE_LINK_HARD_LINK, 0600)
     createLink([ dirCups(cfgScript), 'ppd/HP-Photosmart-C7280.ppd' ], CUPS_PPD_DIR, UTILS_CREATE_LINK_HARD_LINK, 0644)
-    restoreconR(CUPS_CONFIG_DIR)
\ No newline at end of file
+    queueRestoreconR(CUPS_CONFIG_DIR)
\ No newline at end of file
@@ -1,43 +1,38 @@
 def setupServices1Common(cfgScript):
-    cfgScript.getMain().serviceSoftware().disableServices([
-        "avahi-daemon",
-        "fcoe",
-        "iscsi",
-        "iscsid",
-        "mdmonitor-takeover",
-        "mdmonitor",
-        "netfs",
-        "sendmail",
-        "sm-client",
-        "dbus-org.bluez",
-        "fcoe",
-        'sshd-keygen'
-    ])
-    cfgScript.getMain().serviceSoftware().enableServices([
-        'chronyd'
+    cfgScript.getMain().serviceServices().setServiceStates([
+        ("avahi-daemon", False),
+        ("fcoe", False),
+        ("iscsi", False),
+        ("iscsid", False),
+        ("mdmonitor-takeover", False),
+        ("mdmonitor", False),
+        ("netfs", False),
+        ("sendmail", False),
+        ("sm-client", False),
+        ("dbus-org.bluez", False),
+        ('sshd-keygen', False),
+        ('chronyd', True)
     ])
 
 def setupServices2Maco(cfgScript):
-    cfgScript.getMain().serviceSoftware().enableServices([
-            'network',
-            'httpd',
-            'dovecot',
-            'postfix',
-            'named',
-            'sshd'
-        ])
-    cfgScript.getMain().serviceSoftware().disableServices([
-            "NetworkManager"
+    cfgScript.getMain().serviceServices().setServiceStates([
+            ('network', True),
+            ('httpd', True),
+            ('dovecot', True),
+            ('postfix', True),
+            ('named', True),
+            ('sshd', True),
+            ("NetworkManager", False)
         ])
 
 def setupServices3Laptop(cfgScript):
-    cfgScript.getMain().serviceSoftware().disableServices([
+    cfgScript.getMain().serviceServices().disableServices([
         "abrt-ccpp",
         "abrt-oops",
         "abrt-vmcore",
         "abrtd",
         "atd",
-        "auditd"
+        "auditd",
         "avahi-daemon",
         "crond",
         "fcoe",
@@ -58,10 +53,8 @@ def setupServices3Laptop(cfgScript):
     ])
 
 def setupServices4Desktop(cfgScript):
-    cfgScript.getMain().serviceSoftware().enableServices([
-            'network',
-            'sshd'
-        ])
-    cfgScript.getMain().serviceSoftware().disableServices([
-            'NetworkManager'
+    cfgScript.getMain().serviceServices().setServiceStates([
+            ('network', True),
+            ('sshd', True),
+            ('NetworkManager', False)
         ])
\ No newline at end of file
@@ -34,11 +34,15 @@
 from logging import info
 from logging import warning
 from os import chmod
+from os.path import abspath
 from os.path import basename
 from os.path import exists
 from os.path import isdir
 from os.path import join
+from os.path import lexists
+from threading import local
 
+from homelib.cmdrunner import runCmds
 from homelib.utils import UTILS_CREATE_LINK_DELETE
 from homelib.utils import UTILS_CREATE_LINK_HARD_LINK
 from homelib.utils import createLink
@@ -83,8 +87,7 @@ def restorecon(*paths):
     @param  paths   The files/directories for which to restore their contexts.
     """
     paths = flatten(paths)
-    for path in paths:
-        runCmd('restorecon', path)
+    runCmds([('restorecon', path) for path in paths], captureOutput=False)
 
 def restoreconR(*paths):
     """
@@ -94,8 +97,90 @@ def restoreconR(*paths):
     @param  paths   The files/directories for which to restore their contexts.
     """
     paths = flatten(paths)
-    for path in paths:
-        runCmd('restorecon', '-R', path)
+    runCmds([('restorecon', '-R', path) for path in paths], captureOutput=False)
+
+def queueRestorecon(*paths):
+    """
+    Queues the given files for relabelling (see \ref flushRestorecon) instead
+    of restoring their SELinux contexts immediately. The queue has to be
+    flushed before the update that queued the files is recorded as applied
+    (e.g. in \ref homelib.config.ConfigScript.postUpdate).
+
+    @param  paths   The files/directories for which to restore their contexts.
+    """
+    _getRelabelQueue().paths.update([abspath(joinPaths(path)) for path in flatten(paths)])
+
+def queueRestoreconR(*paths):
+    """
+    Like \ref queueRestorecon, but the directories are relabelled recursively.
+
+    @param  paths   The files/directories for which to restore their contexts.
+    """
+    _getRelabelQueue().pathsR.update([abspath(joinPaths(path)) for path in flatten(paths)])
+
+def flushRestorecon():
+    """
+    Restores the SELinux contexts of all files queued by the current thread
+    (every configuration script runs in its own thread). Paths that are covered
+    by a recursively queued parent are dropped and the rest is relabelled with
+    at most two 'restorecon' invocations (a recursive and a non-recursive one).
+
+    @returns    The number of relabelled paths.
+
+    @throws If 'restorecon' failed (the paths it was given stay queued).
+    """
+    queue = _getRelabelQueue()
+    (queuedR, queued) = (set(queue.pathsR), set(queue.paths))
+    recursive = sorted(queuedR)
+    single = sorted(queued)
+    # Parents are sorted before their children.
+    roots = []
+    for path in recursive:
+        if not any([_isWithin(path, root) for root in roots]):
+            roots.append(path)
+    single = [path for path in single if not any([_isWithin(path, root) for root in roots])]
+    roots = [path for path in roots if lexists(path)]
+    single = [path for path in single if lexists(path)]
+    commands = []
+    if roots:
+        commands.append(['restorecon', '-R'] + roots)
+    if single:
+        commands.append(['restorecon'] + single)
+    results = runCmds(commands, captureOutput=False)
+    queue.pathsR.difference_update(queuedR)
+    queue.paths.difference_update(queued)
+    failed = [result.cmd for result in results if result.retcode]
+    for cmd in failed:
+        if cmd[1] == '-R':
+            queue.pathsR.update(cmd[2:])
+        else:
+            queue.paths.update(cmd[1:])
+    if failed:
+        raise Exception("Could not restore the SELinux contexts of some of the files: " + ' '.join([' '.join(cmd[1:]) for cmd in failed]))
+    count = len(roots) + len(single)
+    if count:
+        info("Restored the SELinux contexts of " + str(count) + " paths.")
+    return count
+
+def _isWithin(path, parent):
+    """
+    @returns    'True' iff the path is the parent or lies below it.
+    """
+    return path == parent or path.startswith(join(parent, ''))
+
+def _getRelabelQueue():
+    """
+    @returns    The paths queued for relabelling by the current thread (an
+                object with the sets 'paths' and 'pathsR', see
+                'flushRestorecon').
+    """
+    if not hasattr(_relabelQueue, 'paths'):
+        _relabelQueue.paths = set()
+        _relabelQueue.pathsR = set()
+    return _relabelQueue
+
+# The paths queued for relabelling (per thread, see '_getRelabelQueue').
+_relabelQueue = local()
 
 def installPrivateKey(cfgScript, keyPath, destName = None):
     """
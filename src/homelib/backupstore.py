@@ -0,0 +1,557 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: backupstore.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 14:40:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+A content-addressed store for backups made by \link homelib.utils.makeBackup
+\endlink.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from logging import info
+from os.path import abspath
+from os.path import dirname
+from os.path import exists
+from os.path import isdir
+from os.path import islink
+from os.path import join
+from os.path import lexists
+from threading import Lock
+from time import strftime
+from time import time
+
+
+
+###
+### Configuration option names/sections
+###
+
+"""
+The directory of the backup store. If this option is given, files replaced by
+HomeLib are backed up into this store instead of next to the original file.
+"""
+CFG_GINFO_BACKUP_STORE="backupStore"
+
+"""
+The maximum number of backups kept per path (optional).
+"""
+CFG_GINFO_BACKUP_MAX_VERSIONS="backupMaxVersions"
+
+"""
+The maximum age of backups in days (optional).
+"""
+CFG_GINFO_BACKUP_MAX_AGE="backupMaxAge"
+
+"""
+The maximum total size of all backups in megabytes (optional).
+"""
+CFG_GINFO_BACKUP_MAX_SIZE="backupMaxSize"
+
+
+
+###
+### Constants
+###
+
+"""
+The sub-directory of the store with the contents of backed up files (one file
+per distinct content, named by its SHA-1 hash).
+"""
+BACKUP_STORE_OBJECTS_DIR="objects"
+
+"""
+The sub-directory of the store with a tree that mirrors the backed up paths.
+Every backed up path is a directory with one entry per backup (named by the
+time of the backup). The entries are hard links to the objects.
+"""
+BACKUP_STORE_VERSIONS_DIR="versions"
+
+"""
+The index of the store: the backups of every path (a JSON file).
+"""
+BACKUP_STORE_INDEX_FILE="index.json"
+
+"""
+The lock file that serialises access to the store between processes.
+"""
+BACKUP_STORE_LOCK_FILE="lock"
+
+
+
+###
+### The Backup Store
+###
+
+class BackupStore(object):
+    """
+    Keeps backups of files keyed by their content. Backing up a file whose
+    contents are already in the store costs only a hard link and an index
+    entry.
+
+    The index maps absolute paths to lists of backups (oldest first). Paths
+    are kept as byte strings (unicode paths are encoded with the file system
+    encoding), so that every path has exactly one entry. The index is written
+    in UTF-8, so file names have to be valid UTF-8. Every backup is a
+    dictionary with these keys:
+
+        version - The name of the backup (the time of the backup).
+
+        time    - The time of the backup (seconds since the epoch).
+
+        hash    - The SHA-1 hash of the contents (None for symbolic links).
+
+        size    - The size of the contents.
+
+        mode, uid, gid  - The permissions and the owner of the original.
+
+        link    - The target of the original if it was a symbolic link (None
+                  otherwise).
+
+    Old backups are evicted by count (per path), by age and by the total size
+    of the store (see the constructor).
+    """
+
+    def __init__(self, storeDir, maxVersions=None, maxAge=None, maxSize=None):
+        """
+        @param  storeDir    The directory of the store (it is created if
+                            needed).
+
+        @param  maxVersions <b>[Optional]</b> The maximum number of backups
+                            kept for every path.
+
+        @param  maxAge      <b>[Optional]</b> The maximum age of backups (in
+                            seconds).
+
+        @param  maxSize     <b>[Optional]</b> The maximum total size of the
+                            stored contents (in bytes).
+        """
+        self.__storeDir = _getFsPath(storeDir)
+        self.__maxVersions = maxVersions
+        self.__maxAge = maxAge
+        self.__maxSize = maxSize
+        self.__lock = Lock()
+
+
+
+    @classmethod
+    def fromConfig(cls, main):
+        """
+        @returns    The backup store configured with the 'backupStore' option
+                    (and the retention options) in the 'General Information'
+                    section, or None if no store is configured.
+        """
+        storeDir = main.getGiCfg(CFG_GINFO_BACKUP_STORE)
+        if not storeDir:
+            return None
+        maxAge = main.getGiCfgInt(CFG_GINFO_BACKUP_MAX_AGE)
+        maxSize = main.getGiCfgInt(CFG_GINFO_BACKUP_MAX_SIZE)
+        return cls(storeDir,
+                   main.getGiCfgInt(CFG_GINFO_BACKUP_MAX_VERSIONS),
+                   maxAge * 24 * 3600 if maxAge else None,
+                   maxSize * 1024 * 1024 if maxSize else None)
+
+
+
+    def getStoreDir(self):
+        """
+        @returns    The directory of this store.
+        """
+        return self.__storeDir
+
+
+
+    def backup(self, path):
+        """
+        Moves the given file (or symbolic link) into the store.
+
+        @param  path    The file to back up (it is removed).
+
+        @returns    The path of the backup (within the versions tree of the
+                    store).
+        """
+        path = _getFsPath(path)
+        if isdir(path) and not islink(path):
+            raise IOError("The backup store does not keep directories: '" + path + "'.")
+        with self.__locked():
+            index = self.__loadIndex()
+            entry = self.__store(path)
+            versions = index.setdefault(path, [])
+            # Two backups in the same second must not share a name.
+            names = set([e['version'] for e in versions])
+            (baseName, n) = (entry['version'], 1)
+            while entry['version'] in names or lexists(self.__getVersionPath(path, entry['version'])):
+                entry['version'] = baseName + '.' + str(n)
+                n += 1
+            versionPath = self.__getVersionPath(path, entry['version'])
+            try:
+                os.makedirs(dirname(versionPath))
+            except OSError:
+                pass
+            if entry['link'] is None:
+                os.link(self.__getObjectPath(entry['hash']), versionPath)
+            else:
+                os.symlink(entry['link'], versionPath)
+            versions.append(entry)
+            os.remove(path)
+            self.__evict(index)
+            self.__saveIndex(index)
+        info("Backed up file '" + path + "' as '" + versionPath + "'.")
+        return versionPath
+
+
+
+    def getVersions(self, path):
+        """
+        @param  path    A path that was backed up.
+
+        @returns    A list of backups of the given path (oldest first). See the
+                    description of this class for their contents.
+        """
+        with self.__locked():
+            return list(self.__loadIndex().get(_getFsPath(path), []))
+
+
+
+    def getPaths(self, prefix=None):
+        """
+        @param  prefix  <b>[Optional]</b> A path. If given, only the paths
+                        equal to it or within it are returned.
+
+        @returns    A sorted list of all paths that have backups.
+        """
+        with self.__locked():
+            return sorted([p for p in self.__loadIndex() if prefix is None or _isWithin(p, _getFsPath(prefix))])
+
+
+
+    def restore(self, path, version=None, destPath=None):
+        """
+        Restores a backup. If the destination already exists and differs from
+        the backup, it is backed up first.
+
+        @param  path        The path that was backed up.
+
+        @param  version     <b>[Optional]</b> The name of the backup to
+                            restore (the latest one by default).
+
+        @param  destPath    <b>[Optional]</b> Where to restore the backup (the
+                            original path by default).
+
+        @returns    'True' iff the destination has been changed.
+        """
+        path = _getFsPath(path)
+        versions = self.getVersions(path)
+        entries = [e for e in versions if version is None or e['version'] == version]
+        if not entries:
+            raise IOError("There is no backup of '" + path + "'" + ((" with the name '" + version + "'") if version else '') + ".")
+        entry = entries[-1]
+        destPath = _getFsPath(destPath or path)
+        if lexists(destPath):
+            if self.__matches(destPath, entry):
+                return False
+            self.backup(destPath)
+        try:
+            os.makedirs(dirname(destPath))
+        except OSError:
+            pass
+        if entry['link'] is not None:
+            os.symlink(entry['link'], destPath)
+        else:
+            from homelib.utils import copyFile
+            from tempfile import mkstemp
+            (fd, tmpPath) = mkstemp('', '.restore.', dirname(destPath))
+            os.close(fd)
+            try:
+                copyFile(self.__getObjectPath(entry['hash']), tmpPath, False)
+                os.chmod(tmpPath, entry['mode'])
+                if os.geteuid() == 0:
+                    os.chown(tmpPath, entry['uid'], entry['gid'])
+                os.rename(tmpPath, destPath)
+            except:
+                os.remove(tmpPath)
+                raise
+        info("Restored '" + destPath + "' from the backup '" + entry['version'] + "'.")
+        return True
+
+
+
+    def restoreAll(self, *paths):
+        """
+        Restores the latest backups of all backed up paths that are equal to or
+        within any of the given paths (e.g. a whole configuration directory).
+
+        @param  paths   The paths (files or directories) to restore.
+
+        @returns    A list of the paths that have been changed.
+        """
+        restored = []
+        for path in sorted(set([p for prefix in paths for p in self.getPaths(prefix)])):
+            if self.restore(path):
+                restored.append(path)
+        return restored
+
+
+
+    def evict(self):
+        """
+        Removes the backups that are beyond the retention limits given to the
+        constructor.
+        """
+        with self.__locked():
+            index = self.__loadIndex()
+            self.__evict(index)
+            self.__saveIndex(index)
+
+
+
+    ###
+    ### Private helper methods
+    ###
+
+    @contextmanager
+    def __locked(self):
+        with self.__lock:
+            try:
+                os.makedirs(self.__storeDir)
+            except OSError:
+                pass
+            import fcntl
+            with open(join(self.__storeDir, BACKUP_STORE_LOCK_FILE), 'a') as lockFile:
+                fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+                yield
+
+
+
+    def __loadIndex(self):
+        import json
+        indexPath = join(self.__storeDir, BACKUP_STORE_INDEX_FILE)
+        if not exists(indexPath):
+            return {}
+        with open(indexPath) as f:
+            # JSON strings come back as unicode.
+            return _toFsStrings(json.load(f))
+
+
+
+    def __saveIndex(self, index):
+        import json
+        from homelib.utils import writeFileAtomically
+        writeFileAtomically(join(self.__storeDir, BACKUP_STORE_INDEX_FILE), json.dumps(index), 0600)
+
+
+
+    def __store(self, path):
+        """
+        Puts the contents of the given file into the objects directory (if
+        they are not there yet).
+
+        @returns    A new index entry for the file.
+        """
+        st = os.lstat(path)
+        entry = {
+            'version'   :   strftime('%Y-%m-%d_%H:%M:%S'),
+            'time'      :   time(),
+            'hash'      :   None,
+            'size'      :   st.st_size,
+            'mode'      :   st.st_mode & 07777,
+            'uid'       :   st.st_uid,
+            'gid'       :   st.st_gid,
+            'link'      :   None
+        }
+        if islink(path):
+            entry['link'] = os.readlink(path)
+            return entry
+        from hashlib import sha1
+        from homelib.utils import copyFile
+        from tempfile import mkstemp
+        digest = sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), ''):
+                digest.update(chunk)
+        entry['hash'] = digest.hexdigest()
+        objectPath = self.__getObjectPath(entry['hash'])
+        if not exists(objectPath):
+            try:
+                os.makedirs(dirname(objectPath))
+            except OSError:
+                pass
+            # Copy rather than move the original, because it may be a hard link
+            # to a file elsewhere (whose contents could change later).
+            (fd, tmpPath) = mkstemp('', '.tmp.', dirname(objectPath))
+            os.close(fd)
+            try:
+                copyFile(path, tmpPath, False)
+                os.chmod(tmpPath, 0400)
+                os.rename(tmpPath, objectPath)
+            except:
+                os.remove(tmpPath)
+                raise
+        return entry
+
+
+
+    def __evict(self, index):
+        """
+        Removes the backups beyond the retention limits (from the index and
+        from the store) and the objects that are no longer used.
+        """
+        # A list of pairs '(path, entry)'.
+        evicted = []
+        if self.__maxVersions:
+            for (path, versions) in index.items():
+                while len(versions) > self.__maxVersions:
+                    evicted.append((path, versions.pop(0)))
+        if self.__maxAge:
+            oldest = time() - self.__maxAge
+            for (path, versions) in index.items():
+                while versions and versions[0]['time'] < oldest:
+                    evicted.append((path, versions.pop(0)))
+        if self.__maxSize:
+            # Evict the oldest backups until the distinct contents fit.
+            allVersions = sorted([(e['time'], path, e) for (path, versions) in index.items() for e in versions])
+            sizes = {}
+            for (_, _, e) in allVersions:
+                sizes[e['hash']] = e['size']
+            total = sum([size for (h, size) in sizes.items() if h])
+            for (_, path, e) in allVersions:
+                if total <= self.__maxSize:
+                    break
+                index[path].remove(e)
+                evicted.append((path, e))
+                if e['hash'] and not any([o['hash'] == e['hash'] for versions in index.values() for o in versions]):
+                    total -= e['size']
+        if not evicted:
+            return
+        # Drop the evicted entries from the versions tree.
+        for (path, e) in evicted:
+            try:
+                os.remove(self.__getVersionPath(path, e['version']))
+            except OSError:
+                pass
+            if path in index and not index[path]:
+                del index[path]
+                try:
+                    os.removedirs(dirname(self.__getVersionPath(path, e['version'])))
+                except OSError:
+                    pass
+        # Drop the objects nobody uses anymore.
+        used = set([e['hash'] for versions in index.values() for e in versions])
+        for h in set([e['hash'] for (_, e) in evicted if e['hash']]) - used:
+            try:
+                os.remove(self.__getObjectPath(h))
+                os.rmdir(dirname(self.__getObjectPath(h)))
+            except OSError:
+                pass
+        info("Evicted " + str(len(evicted)) + " backup(s) from the backup store '" + self.__storeDir + "'.")
+
+
+
+    def __matches(self, path, entry):
+        """
+        @returns    'True' iff the file at the given path has the same contents
+                    and mode as the given backup.
+        """
+        if entry['link'] is not None:
+            return islink(path) and os.readlink(path) == entry['link']
+        st = os.lstat(path)
+        if islink(path) or st.st_size != entry['size'] or (st.st_mode & 07777) != entry['mode']:
+            return False
+        from homelib.utils import haveSameContents
+        return haveSameContents(path, self.__getObjectPath(entry['hash']))
+
+
+
+    def __getObjectPath(self, digest):
+        return join(self.__storeDir, BACKUP_STORE_OBJECTS_DIR, digest[:2], digest[2:])
+
+
+
+    def __getVersionPath(self, path, version):
+        return join(self.__storeDir, BACKUP_STORE_VERSIONS_DIR, path.lstrip('/'), version)
+
+
+
+###
+### The default store (used by 'makeBackup')
+###
+
+_defaultBackupStore = None
+
+def getDefaultBackupStore():
+    """
+    @returns    The backup store used by \link homelib.utils.makeBackup
+                \endlink (None if backups are kept next to the original
+                files).
+    """
+    return _defaultBackupStore
+
+def setDefaultBackupStore(store):
+    """
+    Sets the backup store used by \link homelib.utils.makeBackup \endlink.
+
+    @param  store   A \link BackupStore \endlink or None (to keep backups next
+                    to the original files).
+    """
+    global _defaultBackupStore
+    _defaultBackupStore = store
+
+
+
+###
+### Private helper functions
+###
+
+def _getFsPath(path):
+    """
+    @returns    The absolute path as a byte string (the type of the paths in
+                the index). Unicode paths are encoded just like the 'os'
+                functions would encode them.
+    """
+    path = abspath(path)
+    return path.encode(sys.getfilesystemencoding() or 'utf-8') if isinstance(path, unicode) else path
+
+def _toFsStrings(value):
+    """
+    @returns    The given value (loaded from the index) with all unicode
+                strings encoded back into the UTF-8 byte strings they were
+                written from (the JSON encoder decodes byte strings as UTF-8).
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_toFsStrings(x) for x in value]
+    if isinstance(value, dict):
+        return dict([(_toFsStrings(k), _toFsStrings(v)) for (k, v) in value.iteritems()])
+    return value
+
+def _isWithin(path, prefix):
+    return path == prefix or path.startswith(prefix.rstrip('/') + '/')
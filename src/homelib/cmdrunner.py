@@ -0,0 +1,326 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: cmdrunner.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 16:20:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Runs external commands concurrently (at most a given number at a time). See
+\link CommandRunner \endlink and \link runCmds \endlink.
+"""
+
+from threading import Event
+from threading import Lock
+from threading import Thread
+from time import time
+
+from homelib.utils import flatten
+from homelib.utils import joinPaths
+
+
+
+###
+### Constants
+###
+
+"""
+The default maximum number of commands that run at the same time. If None, the
+number of processors is used.
+"""
+CMD_RUNNER_MAX_PARALLEL=None
+
+
+
+###
+### Command Results and Futures
+###
+
+class CommandResult(object):
+    """
+    The outcome of a command run by a \link CommandRunner \endlink.
+    """
+
+    def __init__(self, cmd, retcode, output, errorOutput, duration):
+        """
+        @param  cmd The command and its arguments (a list).
+
+        @param  retcode The return code of the process.
+
+        @param  output  The standard output of the process (None if it was not
+                        captured).
+
+        @param  errorOutput The standard error output of the process (None if
+                            it was not captured).
+
+        @param  duration    How long the command ran (in seconds).
+        """
+        self.cmd = cmd
+        self.retcode = retcode
+        self.output = output
+        self.errorOutput = errorOutput
+        self.duration = duration
+
+
+
+    def __repr__(self):
+        return "CommandResult(" + repr(self.cmd) + ", retcode=" + repr(self.retcode) + ", duration=" + ('%.3f' % self.duration) + ")"
+
+
+
+class CommandFuture(object):
+    """
+    A command that has been submitted to a \link CommandRunner \endlink. It
+    holds the \link CommandResult \endlink once the command finishes.
+    """
+
+    def __init__(self, cmd, cwd=None, captureOutput=True):
+        self.__cmd = cmd
+        self.__cwd = cwd
+        self.__captureOutput = captureOutput
+        self.__finished = Event()
+        self.__result = None
+        self.__error = None
+
+
+
+    def getCmd(self):
+        """
+        @returns    The command and its arguments (a list).
+        """
+        return self.__cmd
+
+
+
+    def done(self):
+        """
+        @returns    'True' iff the command has finished (or could not be
+                    started).
+        """
+        return self.__finished.is_set()
+
+
+
+    def wait(self, timeout=None):
+        """
+        Waits for the command to finish.
+
+        @param  timeout <b>[Optional]</b> The maximum number of seconds to wait.
+
+        @returns    The \link CommandResult \endlink of the command, or None if
+                    it has not finished within the given time.
+
+        @throws OSError if the command could not be started (e.g. the program
+                does not exist).
+        """
+        if not self.__finished.wait(timeout):
+            # Python 2.6 always returns None.
+            if not self.__finished.is_set():
+                return None
+        if self.__error is not None:
+            raise self.__error
+        return self.__result
+
+
+
+    def _run(self):
+        """
+        Runs the command in the calling thread (called by the runner's worker
+        threads).
+        """
+        from subprocess import PIPE
+        from subprocess import Popen
+        started = time()
+        try:
+            pipe = PIPE if self.__captureOutput else None
+            proc = Popen(self.__cmd, stdout=pipe, stderr=pipe, cwd=self.__cwd)
+            (output, errorOutput) = proc.communicate()
+            self.__result = CommandResult(self.__cmd, proc.returncode, output, errorOutput, time() - started)
+        except Exception as ex:
+            self.__error = ex
+        finally:
+            self.__finished.set()
+
+
+
+###
+### Command Runner
+###
+
+class CommandRunner(object):
+    """
+    Runs submitted commands on worker threads, at most 'maxParallel' of them at
+    the same time. Every submitted command gets a \link CommandFuture \endlink.
+
+    Example:
+
+    \code
+    with CommandRunner(4) as runner:
+        for path in paths:
+            runner.submit('restorecon', '-R', path)
+    \endcode
+    """
+
+    def __init__(self, maxParallel=None):
+        """
+        @param  maxParallel <b>[Optional]</b> The maximum number of commands
+                            that run at the same time. Default is \ref
+                            CMD_RUNNER_MAX_PARALLEL.
+        """
+        from Queue import Queue
+        self.__maxParallel = max(1, maxParallel or CMD_RUNNER_MAX_PARALLEL or _getCpuCount())
+        self.__queue = Queue()
+        self.__workers = []
+        self.__futures = []
+        self.__lock = Lock()
+
+
+
+    def __enter__(self):
+        return self
+
+
+
+    def __exit__(self, excType, excValue, tb):
+        try:
+            if excType is None:
+                self.waitAll()
+        finally:
+            self.close()
+
+
+
+    def submit(self, filePath, *args, **options):
+        """
+        Starts the command as soon as fewer than 'maxParallel' commands are
+        running.
+
+        @param  filePath    The program to execute (see \ref utils.runCmd).
+
+        @param  args    The arguments of the program.
+
+        @param  options The keyword options: 'cwd' (the working directory) and
+                        'captureOutput' (whether to capture the output of the
+                        command, default is 'True').
+
+        @returns    The \link CommandFuture \endlink of the command.
+        """
+        cwd = options.get('cwd')
+        future = CommandFuture(list(flatten(joinPaths(filePath), args)), joinPaths(cwd) if cwd else None, options.get('captureOutput', True))
+        with self.__lock:
+            if self.__queue is None:
+                raise RuntimeError("The command runner has been closed.")
+            self.__futures.append(future)
+            self.__queue.put(future)
+            if len(self.__workers) < min(self.__maxParallel, len(self.__futures)):
+                # The queue is passed in, because 'close' may drop it before
+                # the worker starts.
+                worker = Thread(target=self.__work, args=(self.__queue,), name='CommandRunner-' + str(len(self.__workers)))
+                worker.daemon = True
+                worker.start()
+                self.__workers.append(worker)
+        return future
+
+
+
+    def waitAll(self):
+        """
+        Waits for all the commands that were submitted since the last call to
+        this method.
+
+        @returns    The list of \link CommandResult CommandResults \endlink (in
+                    the order of submission).
+
+        @throws OSError if some command could not be started.
+        """
+        with self.__lock:
+            (futures, self.__futures) = (self.__futures, [])
+        return [future.wait() for future in futures]
+
+
+
+    def close(self):
+        """
+        Lets the worker threads finish the submitted commands and stops them.
+        """
+        with self.__lock:
+            (queue, self.__queue) = (self.__queue, None)
+            workers = self.__workers
+        if queue is not None:
+            for _ in workers:
+                queue.put(None)
+            for worker in workers:
+                worker.join()
+
+
+
+    def __work(self, queue):
+        while True:
+            future = queue.get()
+            if future is None:
+                return
+            future._run()
+
+
+
+###
+### Batches of Commands
+###
+
+def runCmds(commands, maxParallel=None, captureOutput=True):
+    """
+    Runs a batch of independent commands concurrently and waits for all of
+    them. This is the blocking counterpart of \link CommandRunner \endlink.
+
+    @param  commands    A list of commands. Every command is a list (or a
+                        tuple) of the program and its arguments, as they would
+                        be given to \ref utils.runCmd.
+
+    @param  maxParallel <b>[Optional]</b> The maximum number of commands that
+                        run at the same time. Default is \ref
+                        CMD_RUNNER_MAX_PARALLEL.
+
+    @param  captureOutput   <b>[Optional]</b> Whether to capture the output of
+                            the commands. Default is 'True'.
+
+    @returns    The list of \link CommandResult CommandResults \endlink (in the
+                order of 'commands').
+    """
+    with CommandRunner(maxParallel) as runner:
+        for command in commands:
+            runner.submit(command[0], command[1:], captureOutput=captureOutput)
+        return runner.waitAll()
+
+def _getCpuCount():
+    """
+    @returns    The number of processors (1 if it cannot be determined).
+    """
+    try:
+        from multiprocessing import cpu_count
+        return cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
@@ -29,24 +29,33 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from ConfigParser import SafeConfigParser
+from imp import PKG_DIRECTORY
+from imp import find_module
 from logging import error
 from logging import info
 from logging import warning
-from os import fdopen
+from os import getcwd
+from os import stat
 from os.path import join
-from shutil import move
-from tempfile import mkstemp
+from threading import Condition
+from threading import Lock
+from threading import Thread
+from time import time
 from traceback import format_exc
 
 from homelib.service import Service
+from homelib.utils import UTILS_DURABILITY_BATCHED
 from homelib.utils import addLoggerHandler
 from homelib.utils import cfgGetIntOrDefault
+from homelib.utils import cfgGetOrDefault
 from homelib.utils import cfgSet
+from homelib.utils import clearKnownDirs
 from homelib.utils import flatten
+from homelib.utils import getClassFQName
 from homelib.utils import loadClass
-from homelib.utils import makedirs
 from homelib.utils import removeLoggerHandler
+from homelib.utils import setDurability
+from homelib.utils import syncPendingWrites
 
 
 
@@ -61,6 +70,23 @@ or a user's home folder).
 """
 CFG_SEC_CONFIG="Configuration"
 
+"""
+The option in the 'Configuration' section that sets how many configuration
+scripts may run at the same time when all the scripts are run (see
+Config.runAllScripts). If not given, the scripts are run one after another.
+"""
+CFG_CONFIG_MAX_PARALLEL="maxParallelScripts"
+
+"""
+The option in the 'Configuration' section that tells whether the scripts that
+do not depend on a failed script are still run when all the scripts are run
+(see Config.runAllScripts). It is off by default, unless some script declares
+its dependencies (with the '<i>.cfgScriptAfter' option). When off, no script
+is started after the first failure (later scripts may rely on the earlier ones
+implicitly, through the order in which they are listed).
+"""
+CFG_CONFIG_CONTINUE_AFTER_FAILURE="continueAfterFailure"
+
 """
 This is the file that stores the version of the configuration update process for
 a particular 'configuration update script'. This file resides in the directory
@@ -69,6 +95,14 @@ configured in the HomeLib's configuration file with the option name
 """
 CONFIG_VERSION_FILE=".config_version"
 
+"""
+This file (in the same directory as the 'version file') records the progress of
+a running configuration script. A record is durably appended to it after every
+successful update. The records are replayed when the version file is loaded and
+the journal is removed once the version file has been rewritten.
+"""
+CONFIG_VERSION_JOURNAL_FILE=".config_version.journal"
+
 """
 This section is in the 'version file' above. It contains information about how
 far we have come with the configuration update process and other per
@@ -81,6 +115,58 @@ The version to which the script was able to update the configuration.
 """
 CFG_VINFO_CUR_VERSION="updatedToVersion"
 
+"""
+The versions (a comma-separated list) for which the script had update methods
+when it last ran.
+"""
+CFG_VINFO_AVAILABLE_VERSIONS="availableVersions"
+
+"""
+The path, modification time and size of the script's source file when it last
+ran. If the fingerprint still matches, the stored 'availableVersions' are still
+valid and the script does not have to be loaded to find out whether it has any
+pending updates.
+"""
+CFG_VINFO_SCRIPT_FINGERPRINT="scriptFingerprint"
+
+"""
+The time (a UNIX timestamp) when the script was last started.
+"""
+CFG_VINFO_LAST_RUN_STARTED="lastRunStarted"
+
+"""
+The time (a UNIX timestamp) when the last run of the script finished.
+"""
+CFG_VINFO_LAST_RUN_FINISHED="lastRunFinished"
+
+"""
+The duration (in seconds) of the last run of the script.
+"""
+CFG_VINFO_LAST_RUN_DURATION="lastRunDuration"
+
+"""
+The outcomes of a script run (or of a single phase of the run) as recorded in
+the run history (see \link homelib.runhistory \endlink).
+"""
+RUN_OUTCOME_SUCCESS="success"
+RUN_OUTCOME_FAILED="failed"
+RUN_OUTCOME_ABORTED="aborted"
+
+"""
+The outcome of an update phase that was skipped on purpose (its update method
+threw an 'UpdateNotAppliedException', e.g. because of '@updateOnly').
+"""
+RUN_OUTCOME_NOT_APPLIED="not applied"
+
+"""
+The option in the 'General Information' section that sets how durable the
+files written by HomeLib (version files, backup indices etc.) are: 'none',
+'batched' (the default, the file systems are synced once at the end of every
+script run) or 'strict' (every file is synced when written). See \link
+homelib.utils.writeFileAtomically \endlink.
+"""
+CFG_GINFO_DURABILITY="durability"
+
 
 
 class Config(Service):
@@ -104,7 +190,7 @@ class Config(Service):
         main = self.getMain()
         i = 0
         while True:
-            curCfgScript = main.getCfgs(CFG_SEC_CONFIG, [i.__str__() + ".cfgScript" + s for s in [ "Name", "Class", "Path", "Store", "Description", "RootRequired" ]])
+            curCfgScript = main.getCfgs(CFG_SEC_CONFIG, [i.__str__() + ".cfgScript" + s for s in [ "Name", "Class", "Path", "Store", "Description", "RootRequired", "After", "SkipIfUpToDate" ]])
             if not curCfgScript[0]:
                 break;
             if self.__cfgScripts.has_key(curCfgScript[0]):
@@ -112,6 +198,19 @@ class Config(Service):
             self.__cfgScripts[curCfgScript[0]] = curCfgScript
             self.__cfgScriptsNames.append(curCfgScript[0])
             i = i + 1
+        # 'loadClass' temporarily changes 'sys.path', so scripts must not be
+        # loaded concurrently.
+        self.__loadLock = Lock()
+        # The number of scripts that are running at the moment (see
+        # 'runScript').
+        self.__runningScripts = 0
+        self.__runLock = Lock()
+        # The backup store is set up when the first script is initialised.
+        self.__backupStoreSet = False
+        setDurability(main.getGiCfg(CFG_GINFO_DURABILITY) or UTILS_DURABILITY_BATCHED)
+        self.__versionStore = None
+        # None until loaded, 'False' if the run history is turned off.
+        self.__runHistory = None
 
 
 
@@ -139,6 +238,14 @@ class Config(Service):
 
                         5   - Indicates whether root privileges are required to
                               run this script.
+
+                        6   - A comma-separated list of names of configuration
+                              scripts that have to finish before this one is
+                              started (or None).
+
+                        7   - Whether the script may be skipped without being
+                              loaded when it is known to be up to date (see
+                              \link Config.canSkipCfgScript \endlink).
         """
         return self.__cfgScripts.copy()
 
@@ -185,10 +292,81 @@ class Config(Service):
 
                         4   - A human readable description of what the script
                               actually does.
+
+                        5   - Indicates whether root privileges are required to
+                              run this script.
+
+                        6   - A comma-separated list of names of configuration
+                              scripts that have to finish before this one is
+                              started (or None).
+
+                        7   - Whether the script may be skipped without being
+                              loaded when it is known to be up to date (see
+                              \link Config.canSkipCfgScript \endlink).
         """
         return list(self.__cfgScripts[cfgScriptName]) if self.__cfgScripts.has_key(cfgScriptName) else None
 
 
+
+    def getCfgScriptDependencies(self, cfgScriptName):
+        """
+        @param  cfgScriptName   The name of the script.
+
+        @returns    A list of names of configuration scripts that have to
+                    finish successfully before the given script may start (as
+                    given in the '<i>.cfgScriptAfter' option).
+        """
+        details = self.__cfgScripts.get(cfgScriptName)
+        if not details or not details[6]:
+            return []
+        return [x.strip() for x in details[6].split(',') if x.strip()]
+
+
+
+    def canSkipCfgScript(self, cfgScriptName):
+        """
+        @param  cfgScriptName   The name of the script.
+
+        @returns    'True' iff the script's '<i>.cfgScriptSkipIfUpToDate'
+                    option is turned on (it is off by default). Such a script
+                    is neither loaded nor initialised (its \link
+                    ConfigScript.preRun \endlink is not called) while it is
+                    up to date, so it must not fetch new updates in 'preRun'.
+        """
+        details = self.__cfgScripts.get(cfgScriptName)
+        return bool(details) and (details[7] or 'false').strip().lower() in ('true', 'yes', 'on', '1')
+
+
+
+    def getCfgScriptsRunOrder(self):
+        """
+        @returns    The names of all configuration scripts in an order in which
+                    every script comes after all the scripts it depends on.
+                    Scripts that do not depend on each other keep the order in
+                    which they were specified in the HomeLib configuration file.
+
+        @throws If a script depends on an unknown script or if the
+                dependencies are cyclic.
+        """
+        order = []
+        visiting = set()
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise Exception("The configuration script '" + name + "' depends on itself (through '.cfgScriptAfter').")
+            visiting.add(name)
+            for dep in self.getCfgScriptDependencies(name):
+                if not self.__cfgScripts.has_key(dep):
+                    raise Exception("The configuration script '" + name + "' depends on the unknown script '" + dep + "'.")
+                visit(dep)
+            visiting.remove(name)
+            order.append(name)
+        for name in self.__cfgScriptsNames:
+            visit(name)
+        return order
+
+
     ##
     #Loads the script with the given name and returns it. This method does not
     #initialise the script (it does not call its \link ConfigScript.init \endlink or
@@ -237,10 +415,11 @@ class Config(Service):
             if details:
                 # Load the saved progress of the last run for this script
                 # @type curVersionInfo SafeConfigParser
-                curVersionInfo = Config.__loadVersionFile(details)
+                curVersionInfo = self.__loadVersionFile(details)
 
                 # Load the actual script module, class and create an instance.
-                inst = loadClass(cfgScriptName, details[1], details[2])()
+                with self.__loadLock:
+                    inst = loadClass(cfgScriptName, details[1], details[2])()
 
                 # @type inst ConfigScript
                 if not isinstance(inst, ConfigScript):
@@ -278,6 +457,7 @@ class Config(Service):
 
         \param details details about the configuration script.
         """
+        self.__setUpBackupStore()
         theScript.init(details, curVersionInfo, self)
         # Run the 'pre-run' function -- just before we start calling the
         # update functions.
@@ -285,7 +465,92 @@ class Config(Service):
 
 
 
-    def runScript(self, cfgScriptName, startFrom=None, maxVersion=None):
+    def runAllScripts(self, jobs=None):
+        """
+        Runs all configuration scripts. A script that declares dependencies
+        (with the '<i>.cfgScriptAfter' option) is started only after all the
+        scripts it depends on have finished successfully. Scripts that do not
+        depend on each other are run concurrently.
+
+        If a script fails, the scripts that depend on it are skipped. The other
+        scripts are still run only if some script declares its dependencies or
+        the 'continueAfterFailure' option is turned on; otherwise no script is
+        started after the first failure.
+
+        @param  jobs    <b>[Optional]</b> The maximum number of scripts to run
+                        at the same time. If not given, the value of the
+                        'maxParallelScripts' option in the 'Configuration'
+                        section is used (or 1, if the option is not given).
+
+        @throws If any of the scripts failed or was skipped.
+        """
+        order = self.getCfgScriptsRunOrder()
+        if jobs is None:
+            jobs = self.getMain().getCfgInt(CFG_SEC_CONFIG, CFG_CONFIG_MAX_PARALLEL, 1)
+        jobs = max(1, jobs)
+        keepGoing = any(self.getCfgScriptDependencies(name) for name in order) or (self.getMain().getCfg(CFG_SEC_CONFIG, CFG_CONFIG_CONTINUE_AFTER_FAILURE) or 'false').strip().lower() in ('true', 'yes', 'on', '1')
+
+        pending = list(order)
+        running = []
+        # Maps names of finished scripts to 'True' (success) or 'False'
+        # (failed or skipped).
+        finished = {}
+        failed = []
+        cond = Condition()
+
+        def runOne(name):
+            ok = False
+            try:
+                self.runScript(name, isolateLog=jobs > 1)
+                ok = True
+            except Exception as ex:
+                error("The configuration script '" + name + "' failed: " + str(ex))
+            finally:
+                with cond:
+                    finished[name] = ok
+                    running.remove(name)
+                    if not ok:
+                        failed.append(name)
+                    cond.notify()
+
+        with cond:
+            while pending or running:
+                if failed and not keepGoing:
+                    for name in pending:
+                        finished[name] = False
+                        failed.append(name)
+                        warning("Skipping the configuration script '" + name + "' because an earlier script did not finish successfully.")
+                    del pending[:]
+                # Start (or skip) the scripts whose dependencies have finished.
+                # Because 'pending' is in the run order, a skipped script is
+                # marked before any of its dependants are looked at.
+                for name in list(pending):
+                    if len(running) >= jobs or (failed and not keepGoing):
+                        break
+                    deps = self.getCfgScriptDependencies(name)
+                    if any(finished.get(dep) is False for dep in deps):
+                        pending.remove(name)
+                        finished[name] = False
+                        failed.append(name)
+                        warning("Skipping the configuration script '" + name + "' because a script it depends on did not finish successfully.")
+                    elif all(finished.get(dep) for dep in deps):
+                        pending.remove(name)
+                        running.append(name)
+                        if jobs == 1:
+                            runOne(name)
+                        else:
+                            thread = Thread(target=runOne, args=(name,), name=name)
+                            thread.daemon = True
+                            thread.start()
+                if running:
+                    # A timeout keeps the main thread responsive to Ctrl+C.
+                    cond.wait(1)
+        if failed:
+            raise Exception("The following configuration scripts did not finish successfully: " + ', '.join(failed))
+
+
+
+    def runScript(self, cfgScriptName, startFrom=None, maxVersion=None, isolateLog=False):
         """
         Loads the script with the given name and runs it.
 
@@ -301,103 +566,302 @@ class Config(Service):
                             If `None` the script will be executed until its last
                             `update#` function.
 
+        @param  isolateLog  <b>[Optional]</b> If `True`, the script's log file
+                            receives only messages logged by the current
+                            thread. This is used when several scripts run
+                            concurrently.
+
         @throws If for any reason the script failed or did not start at all.
         """
+        if startFrom is None and maxVersion is None and self.canSkipCfgScript(cfgScriptName) and self.isScriptUpToDate(cfgScriptName):
+            info("The configuration script '" + cfgScriptName + "' is up to date.")
+            return
+        # Imported here, so that skipping up-to-date scripts (or listing their
+        # status) does not pay for it.
+        from homelib.timings import PhaseTimer
+        started = time()
+        timer = PhaseTimer()
+        # Take the fingerprint before loading, so that changes to the script
+        # made during the run are noticed next time.
+        fingerprint = _getScriptFingerprint(self.getCfgScriptDetails(cfgScriptName))
         # Load the script (an exception will be thrown if the loading fails -- so, never will we get None from it).
-        (inst, curVersionInfo, details) = self.loadScript(cfgScriptName);
+        with timer.measure('load'):
+            (inst, curVersionInfo, details) = self.loadScript(cfgScriptName);
+        with self.__runLock:
+            # Files may have changed since the previous script ran. Scripts
+            # that are still running keep the known directories, though.
+            if not self.__runningScripts:
+                clearKnownDirs()
+            self.__runningScripts += 1
+        outcome = RUN_OUTCOME_FAILED
+        errorType = None
+        main = self.getMain()
+        # The version before the first update whose deferred work has not been
+        # done yet (None if there is no such update).
+        heldVersion = None
         try:
             # Create the logger this script should use
-            (lh, fd) = addLoggerHandler(type(inst), details[3])
+            (lh, fd) = addLoggerHandler(type(inst), details[3], onlyCurrentThread=isolateLog)
             _sepMsg("Starting the configuration script '" + cfgScriptName + "'")
             info("This machine is of the following types: " + ', '.join([x for x in self.getMain().serviceMyMachines().getMachineDetails()[2]]))
 
-            self.initScript(inst, curVersionInfo, details)
+            with timer.measure('init'):
+                self.initScript(inst, curVersionInfo, details)
 
             # Okay, we have an instance of the script class, now start
-            # running. First get the prefix of the methods that do the
-            # actual work in the script.
-            upFunPrfx = inst.getUpdateMethodPrefix()
-
-            # Get the latest version and start updating.
-            i = (startFrom - 1) if isinstance(startFrom, int) and startFrom > 0 else inst.getLastRunVersion()
+            # running. Get the latest version and the update methods that
+            # come after it.
+            lastVersion = (startFrom - 1) if isinstance(startFrom, int) and startFrom > 0 else inst.getLastRunVersion()
 
             # Now start calling all the update functions.
-            while maxVersion is None or i < maxVersion:
-                i = i + 1
-
-                # Construct the name of the next update function to call.
-                funName = upFunPrfx + i.__str__()
-                try:
-                    # Try getting a handle on the function
-                    fun = getattr(inst, funName)
-                except:
-                    break
+            for (i, funName) in inst.getUpdateRegistry().getPendingUpdates(lastVersion, maxVersion):
+                marks = main.getPendingMarks()
                 try:
-                    # Finally invoke the update function!
-                    fun()
-                except UpdateNotAppliedException as ex:
-                    info("Update number " + i.__str__() + " not applied. " + ex.__str__())
+                    try:
+                        # Finally invoke the update function!
+                        with timer.measure(funName, i, UpdateNotAppliedException):
+                            getattr(inst, funName)()
+                    except UpdateNotAppliedException as ex:
+                        info("Update number " + i.__str__() + " not applied. " + ex.__str__())
+                    inst.postUpdate(i)
                 except Exception as ex:
+                    # The work the failed update has deferred must not be done.
+                    main.discardPendingWork(marks)
                     raise
                 _sepMsg("Updated to version number " + i.__str__())
-                # Store the last successful update version.
+                if heldVersion is None and main.hasPendingWork():
+                    heldVersion = cfgGetIntOrDefault(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_CUR_VERSION, 0)
+                # Store the last successful update version (and make sure it
+                # survives a crash). While the services hold deferred work, the
+                # version is checkpointed only after the work has been done.
                 cfgSet(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_CUR_VERSION, i)
+                if heldVersion is None:
+                    self.getVersionStore().checkpoint(details, curVersionInfo)
 
-            inst.postRun()
+            # Carry out the work the services have deferred (e.g. queued
+            # package installations).
+            with timer.measure('flush'):
+                self.__flushDeferred(details, curVersionInfo, heldVersion)
+                heldVersion = None
+
+            with timer.measure('postRun'):
+                inst.postRun()
 
             _sepMsg("Configuration script '" + cfgScriptName + "' finished successfully")
+            outcome = RUN_OUTCOME_SUCCESS
         except AbortConfigException:
+            outcome = RUN_OUTCOME_ABORTED
             warning("Configuration aborted with message: " + format_exc())
+            self.__tryFlushDeferred(details, curVersionInfo, heldVersion)
         except Exception as ex:
+            errorType = type(ex).__name__
+            # The updates that did succeed may have deferred some work.
+            self.__tryFlushDeferred(details, curVersionInfo, heldVersion)
             try:
                 if inst != None and isinstance(inst, ConfigScript):
-                    inst.postFail(ex)
+                    with timer.measure('postFail'):
+                        inst.postFail(ex)
             except Exception as _:
                 error("The configuration script threw an exception in the 'Post-Fail Invocation' phase. Error: " + format_exc())
             error("Updating failed. Error: " + format_exc())
             raise ex
         finally:
             try:
-                removeLoggerHandler(lh, fd)
+                finished = time()
+                cfgSet(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_LAST_RUN_STARTED, repr(started))
+                cfgSet(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_LAST_RUN_FINISHED, repr(finished))
+                cfgSet(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_LAST_RUN_DURATION, repr(finished - started))
+                cfgSet(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_AVAILABLE_VERSIONS, ','.join([str(v) for v in inst.getUpdateRegistry().getVersions()]))
+                cfgSet(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_SCRIPT_FINGERPRINT, fingerprint or '')
+                with timer.measure('save'):
+                    self.__saveVersionFile(details, curVersionInfo)
             finally:
-                Config.__saveVersionFile(details, curVersionInfo)
+                try:
+                    self.__saveTimings(cfgScriptName, inst, details, started, timer)
+                    self.__recordRun(cfgScriptName, started, outcome, errorType, timer)
+                    self.__syncWrites(cfgScriptName)
+                finally:
+                    with self.__runLock:
+                        self.__runningScripts -= 1
+                    removeLoggerHandler(lh, fd)
 
 
 
-    @staticmethod
-    def __loadVersionFile(details):
+    def __flushDeferred(self, details, curVersionInfo, heldVersion):
+        """
+        Carries out the work the services have deferred and then checkpoints
+        the version reached by the script. If the work fails, the version is
+        rolled back to 'heldVersion' (so that the updates that deferred the
+        work are run again next time) and the work is discarded.
+
+        @param  heldVersion The version before the first update whose deferred
+                            work has not been done yet (or None).
+        """
+        try:
+            self.getMain().flushServices()
+        except Exception:
+            if heldVersion is not None:
+                cfgSet(curVersionInfo, CFG_SEC_VINFO, CFG_VINFO_CUR_VERSION, heldVersion)
+            self.getMain().discardPendingWork()
+            raise
+        if heldVersion is not None:
+            self.getVersionStore().checkpoint(details, curVersionInfo)
+
+
+
+    def __tryFlushDeferred(self, details, curVersionInfo, heldVersion):
+        """
+        Like \ref __flushDeferred, but only logs failures (used when the
+        script has already failed).
+        """
+        try:
+            self.__flushDeferred(details, curVersionInfo, heldVersion)
+        except Exception:
+            error("Could not carry out the deferred work of services. Error: " + format_exc())
+
+
+
+    def getScriptStatus(self, cfgScriptName):
+        """
+        Finds out how far the given script has come and which of its updates
+        are still pending, without loading the script. The information is
+        taken from the version info saved by the script's last run.
+
+        @param  cfgScriptName   The name of the script.
+
+        @returns    A pair '(version, pending)', where 'version' is the version
+                    to which the script has updated the configuration and
+                    'pending' is a list of versions of updates that have not
+                    been applied yet. 'pending' is None if it cannot be known
+                    without loading the script (the script has not run yet or
+                    its source has changed since its last run).
+        """
+        details = self.getCfgScriptDetails(cfgScriptName)
+        if not details:
+            raise Exception("Could not find details about the '" + cfgScriptName + "' script.")
+        versionInfo = self.__loadVersionFile(details)
+        version = cfgGetIntOrDefault(versionInfo, CFG_SEC_VINFO, CFG_VINFO_CUR_VERSION, 0)
+        fingerprint = cfgGetOrDefault(versionInfo, CFG_SEC_VINFO, CFG_VINFO_SCRIPT_FINGERPRINT)
+        available = cfgGetOrDefault(versionInfo, CFG_SEC_VINFO, CFG_VINFO_AVAILABLE_VERSIONS)
+        if not fingerprint or available is None or fingerprint != _getScriptFingerprint(details):
+            return (version, None)
+        return (version, [v for v in [int(x) for x in available.split(',') if x] if v > version])
+
+
+
+    def isScriptUpToDate(self, cfgScriptName):
+        """
+        @param  cfgScriptName   The name of the script.
+
+        @returns    'True' iff the script is known to have no pending updates
+                    (see \link Config.getScriptStatus \endlink). This check
+                    neither loads nor initialises the script.
+        """
+        return self.getScriptStatus(cfgScriptName)[1] == []
+
+
+
+    def getVersionStore(self):
+        """
+        @returns    The \link homelib.versionstore.VersionStore \endlink that
+                    keeps the progress of the configuration scripts (as chosen
+                    with the 'versionStore' option in the 'General
+                    Information' section).
+        """
+        if not self.__versionStore:
+            with self.__loadLock:
+                if not self.__versionStore:
+                    from homelib.versionstore import VersionStore
+                    self.__versionStore = VersionStore.loadChosenImpl(self.getMain())
+        return self.__versionStore
+
+
+
+    def __setUpBackupStore(self):
+        """
+        Lets 'makeBackup' use the backup store (if one is configured). This is
+        done only once a script is about to run, so that e.g. '--status' does
+        not import the store.
+        """
+        with self.__loadLock:
+            if not self.__backupStoreSet:
+                from homelib.backupstore import BackupStore, setDefaultBackupStore
+                setDefaultBackupStore(BackupStore.fromConfig(self.getMain()))
+                self.__backupStoreSet = True
+
+
+
+    def __saveTimings(self, cfgScriptName, inst, details, started, timer):
+        """
+        Logs the summary of the timings of the script's run and appends them
+        to the '<script class>.timings' file next to the script's log file.
+        """
+        from homelib.timings import TIMINGS_FILE_SUFFIX
+        info("Timings of the configuration script '" + cfgScriptName + "':\n" + timer.formatSummary())
+        try:
+            timer.save(join(details[3] or getcwd(), getClassFQName(type(inst)) + TIMINGS_FILE_SUFFIX), cfgScriptName, started)
+        except Exception:
+            warning("Could not save the timings of the configuration script '" + cfgScriptName + "'. Error: " + format_exc())
+
+
+
+    def getRunHistory(self):
+        """
+        @returns    The \link homelib.runhistory.RunHistory \endlink that keeps
+                    the history of all script runs, or None if the history is
+                    turned off (with the 'runHistory' option in the 'General
+                    Information' section).
+        """
+        if self.__runHistory is None:
+            with self.__loadLock:
+                if self.__runHistory is None:
+                    from homelib.runhistory import RunHistory
+                    self.__runHistory = RunHistory(self.getMain()) if RunHistory.isEnabled(self.getMain()) else False
+        return self.__runHistory or None
+
+
+
+    def __syncWrites(self, cfgScriptName):
+        """
+        Makes the files written in the 'batched' durability mode durable.
+        """
+        # This also syncs the files of the scripts that are running at the same
+        # time, which only makes them durable sooner.
+        try:
+            syncPendingWrites()
+        except Exception:
+            warning("Could not sync the files written by the configuration script '" + cfgScriptName + "'. Error: " + format_exc())
+
+
+
+    def __recordRun(self, cfgScriptName, started, outcome, errorType, timer):
+        """
+        Stores the run in the run history (if it is turned on).
+        """
+        try:
+            runHistory = self.getRunHistory()
+            if runHistory:
+                runHistory.recordRun(cfgScriptName, started, time() - started, outcome, errorType, timer.getPhases())
+        except Exception:
+            warning("Could not record the run of the configuration script '" + cfgScriptName + "' in the run history. Error: " + format_exc())
+
+
+
+    def __loadVersionFile(self, details):
         """
         @returns    A reference to the read configuration parser (which has
                     already read the version file).
         """
-        storeDir = details[3]
-        if not storeDir:
-            raise Exception("The store directory for the configuration script '" + details[0] + "' not specified.")
-        cfgParser = SafeConfigParser()
-        cfgParser.read(join(storeDir, CONFIG_VERSION_FILE))
-        return cfgParser
+        return self.getVersionStore().load(details)
 
 
 
-    @staticmethod
-    def __saveVersionFile(details, curVersionInfo):
+    def __saveVersionFile(self, details, curVersionInfo):
         """
         @param  curVersionInfo  A reference to the read configuration parser
                                 (which has already read the version file).
         """
-        storeDir = details[3]
-        if not storeDir:
-            raise Exception("The store directory for the configuration script '" + details[0] + "' not specified.")
-        # @type curVersionInfo SafeConfigParser
-        try:
-            makedirs(storeDir)
-        except:
-            pass
-        (fd, tmpPath) = mkstemp('', CONFIG_VERSION_FILE, storeDir)
-        fd = fdopen(fd, 'w')
-        curVersionInfo.write(fd)
-        fd.close()
-        move(tmpPath, join(storeDir, CONFIG_VERSION_FILE))
+        self.getVersionStore().save(details, curVersionInfo)
 
 
 
@@ -421,6 +885,7 @@ class ConfigScript(object):
 
     Where the 'method prefix' is the prefix returned by the method
     @see getUpdateMethodPrefix, and the 'version number' is a positive integer.
+    Version numbers need not be contiguous (gaps are simply skipped).
 
     Only those methods will be called that have a greater version number than
     the one stored in the update process information file found in the 'config
@@ -488,6 +953,19 @@ class ConfigScript(object):
 
 
 
+    def postUpdate(self, version):
+        """
+        This method is run after every successful 'update' function, just
+        before the version of the update is stored. Work that the script has
+        postponed during the update should be finished here (the update is not
+        run again once its version is stored).
+
+        @param  version The version of the update that has just been applied.
+        """
+        pass
+
+
+
     def postRun(self):
         """
         This method is run just after the 'update' functions have been called.
@@ -500,7 +978,9 @@ class ConfigScript(object):
         """
         This method is called if any of the update functions fails. After the
         call to this method no other update function will be invoked. The last
-        successful update version will still be stored in the version file.
+        successful update version will still be stored in the version file
+        (unless the work deferred by the successful updates fails, in which
+        case the version before them is stored).
 
         @param  ex  The exception that occured in one of the update functions.
         """
@@ -530,6 +1010,26 @@ class ConfigScript(object):
 
 
 
+    def getUpdateRegistry(self):
+        """
+        @returns    The \link UpdateRegistry \endlink of this script's class
+                    (built on first use and shared by all instances of the
+                    class).
+        """
+        return UpdateRegistry.forClass(type(self), self.getUpdateMethodPrefix())
+
+
+
+    def getPendingUpdates(self):
+        """
+        @returns    A list of `(version, methodName)` pairs of the update
+                    methods that have not been applied yet (sorted by
+                    version).
+        """
+        return self.getUpdateRegistry().getPendingUpdates(self.getLastRunVersion())
+
+
+
     def getMain(self):
         """
         @returns    The contextual 'Main' object (contains all info about
@@ -548,6 +1048,96 @@ class ConfigScript(object):
 
 
 
+class UpdateRegistry(object):
+    """
+    An index of the update methods of a configuration script class.
+
+    The registry is built once per class (and update method prefix) by
+    looking at the class' members whose names consist of the prefix and a
+    positive integer. The version numbers do not have to be contiguous.
+    """
+
+    # Maps pairs '(class, prefix)' to their registries.
+    __registries = {}
+
+    def __init__(self, cls, prefix):
+        """
+        @param  cls     The configuration script class to index.
+
+        @param  prefix  The prefix of the update methods' names (see
+                        \link ConfigScript.getUpdateMethodPrefix \endlink).
+        """
+        methods = {}
+        for name in dir(cls):
+            number = name[len(prefix):]
+            if not name.startswith(prefix) or not number.isdigit() or not callable(getattr(cls, name, None)):
+                continue
+            version = int(number)
+            if version < 1:
+                continue
+            if methods.has_key(version):
+                raise Exception("The configuration script '" + getClassFQName(cls) + "' has more than one update method for version " + str(version) + ": '" + methods[version] + "' and '" + name + "'.")
+            methods[version] = name
+        self.__versions = sorted(methods.keys())
+        self.__updates = [(version, methods[version]) for version in self.__versions]
+        # Maps every known version to the position of the update after it.
+        self.__nextPos = dict((version, pos + 1) for (pos, version) in enumerate(self.__versions))
+
+
+
+    @classmethod
+    def forClass(cls, scriptClass, prefix):
+        """
+        @returns    The (cached) registry of the given configuration script
+                    class.
+        """
+        key = (scriptClass, prefix)
+        registry = cls.__registries.get(key)
+        if registry is None:
+            registry = UpdateRegistry(scriptClass, prefix)
+            cls.__registries[key] = registry
+        return registry
+
+
+
+    def getVersions(self):
+        """
+        @returns    A sorted list of all version numbers that have an update
+                    method.
+        """
+        return list(self.__versions)
+
+
+
+    def getLatestVersion(self):
+        """
+        @returns    The highest version number that has an update method (or 0
+                    if there are none).
+        """
+        return self.__versions[-1] if self.__versions else 0
+
+
+
+    def getPendingUpdates(self, lastVersion, maxVersion=None):
+        """
+        @param  lastVersion The version to which the configuration has already
+                            been updated.
+
+        @param  maxVersion  <b>[Optional]</b> The highest version to include.
+
+        @returns    A list of `(version, methodName)` pairs of the update
+                    methods with versions greater than `lastVersion` (and not
+                    greater than `maxVersion`), sorted by version.
+        """
+        from bisect import bisect_right
+        start = self.__nextPos.get(lastVersion)
+        if start is None:
+            start = bisect_right(self.__versions, lastVersion)
+        end = len(self.__versions) if maxVersion is None else bisect_right(self.__versions, maxVersion)
+        return self.__updates[start:end]
+
+
+
 class UpdateNotAppliedException(Exception):
     """
     This exception is thrown if an update is not applied because of controlled
@@ -648,5 +1238,30 @@ def updateMachine(*machineNames):
 
 
 
+def _getScriptFingerprint(details):
+    """
+    @param  details The details of a configuration script.
+
+    @returns    A string that identifies the current version of the script's
+                source file (its path, modification time and size) or None, if
+                the source file could not be found. The script is not
+                imported.
+    """
+    try:
+        (f, path, description) = find_module(details[0], [details[2]] if details[2] else None)
+    except ImportError:
+        return None
+    if f:
+        f.close()
+    if description[2] == PKG_DIRECTORY:
+        path = join(path, '__init__.py')
+    try:
+        st = stat(path)
+    except OSError:
+        return None
+    return path + '|' + repr(st.st_mtime) + '|' + str(st.st_size)
+
+
+
 def _sepMsg(msg):
     info('{0:=^80}'.format(' ' + msg + ' '))
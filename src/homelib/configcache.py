@@ -0,0 +1,159 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: configcache.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 12:40:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import marshal
+import os
+from os.path import abspath
+from os.path import basename
+from os.path import dirname
+from os.path import join
+
+
+
+###
+### Constants
+###
+
+"""
+The version of the snapshot format. Snapshots of other versions are ignored.
+"""
+CONFIG_SNAPSHOT_FORMAT=1
+
+"""
+The suffix of the snapshot file. The snapshot of '/etc/homelib/homelib.config'
+is stored in '/etc/homelib/.homelib.config.cache'.
+"""
+CONFIG_SNAPSHOT_SUFFIX=".cache"
+
+
+
+###
+### Parsed Configuration Snapshots
+###
+
+def getConfigSnapshotPath(configFile):
+    """
+    @param  configFile  The path to a HomeLib configuration file.
+
+    @returns    The path of the snapshot file of the given configuration file.
+    """
+    return join(dirname(configFile), '.' + basename(configFile) + CONFIG_SNAPSHOT_SUFFIX)
+
+
+
+def parseConfig(configFile, variables):
+    """
+    Parses the given configuration file and interpolates all of its values.
+
+    @param  configFile  The path to the configuration file.
+
+    @param  variables   The interpolation variables (e.g.: 'homedir').
+
+    @returns    A dictionary that maps section names to dictionaries of option
+                values. Option names are normalised as by the configuration
+                parser (lower-case). Options whose values could not be
+                interpolated map to None.
+    """
+    # The parser is needed only when the snapshot is out of date.
+    from ConfigParser import DEFAULTSECT, SafeConfigParser
+    parser = SafeConfigParser()
+    parser.read(configFile)
+    sections = parser.sections()
+    if parser.defaults():
+        sections.append(DEFAULTSECT)
+    snapshot = {}
+    for section in sections:
+        # The interpolation variables are visible as options of every section
+        # (just like with 'SafeConfigParser.get').
+        options = set(parser.options(section)) | set([parser.optionxform(var) for var in variables])
+        values = {}
+        for option in options:
+            try:
+                values[option] = parser.get(section, option, False, variables)
+            except:
+                values[option] = None
+        snapshot[section] = values
+    return snapshot
+
+
+
+def loadConfigSnapshot(configFile, variables):
+    """
+    Loads the snapshot of the given configuration file. The snapshot is used
+    only if it was taken from the same file (path, modification time and size)
+    with the same interpolation variables.
+
+    @param  configFile  The path to the configuration file.
+
+    @param  variables   The interpolation variables.
+
+    @returns    The parsed configuration (see \link parseConfig \endlink) or
+                None, if there is no valid snapshot.
+    """
+    try:
+        st = os.stat(configFile)
+        with open(getConfigSnapshotPath(configFile), 'rb') as f:
+            (fmt, path, mtime, size, snapshotVars, snapshot) = marshal.load(f)
+    except:
+        return None
+    if fmt != CONFIG_SNAPSHOT_FORMAT or path != abspath(configFile) or mtime != st.st_mtime or size != st.st_size or snapshotVars != variables:
+        return None
+    return snapshot
+
+
+
+def saveConfigSnapshot(configFile, variables, snapshot):
+    """
+    Stores the snapshot of the given configuration file next to it. Failures
+    (e.g.: a read-only directory) are silently ignored -- the configuration
+    file will simply be parsed again next time.
+
+    @param  configFile  The path to the configuration file.
+
+    @param  variables   The interpolation variables used for the snapshot.
+
+    @param  snapshot    The parsed configuration (see \link parseConfig
+                        \endlink).
+
+    @returns    'True' iff the snapshot was stored.
+    """
+    from homelib.utils import UTILS_DURABILITY_NONE
+    from homelib.utils import writeFileAtomically
+    try:
+        st = os.stat(configFile)
+        # A lost snapshot is simply rebuilt, so it is never synced.
+        writeFileAtomically(getConfigSnapshotPath(configFile),
+                            marshal.dumps((CONFIG_SNAPSHOT_FORMAT, abspath(configFile), st.st_mtime, st.st_size, variables, snapshot)),
+                            st.st_mode & 0666,
+                            UTILS_DURABILITY_NONE)
+        return True
+    except:
+        return False
@@ -0,0 +1,144 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: journal.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 10:12:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+from os.path import dirname
+from os.path import exists
+from zlib import crc32
+
+
+
+###
+### Progress Journal
+###
+
+class ProgressJournal(object):
+    """
+    An append-only file of 'key=value' records. Every appended record is
+    flushed to the disk (with 'fsync') before 'append' returns, so the records
+    survive a crash or a power loss.
+
+    Each record is stored in its own line together with a checksum. When the
+    journal is read, a torn or corrupted record (and everything after it) is
+    ignored.
+
+    A journal is meant to be replayed on top of a snapshot of the data and
+    cleared once the snapshot has been rewritten (compacted).
+    """
+    def __init__(self, path):
+        """
+        @param  path    The path of the journal file. The file (and its
+                        directory) is created on the first append.
+        """
+        self.__path = path
+        self.__fd = None
+
+
+
+    def getPath(self):
+        """
+        @returns    The path of the journal file.
+        """
+        return self.__path
+
+
+
+    def append(self, key, value):
+        """
+        Durably appends a record to the journal.
+
+        @param  key     The name of the record (must not contain '=' or line
+                        breaks).
+
+        @param  value   The value of the record. It is converted to a string
+                        via 'str' and must not contain line breaks.
+        """
+        payload = key + '=' + str(value)
+        if '\n' in payload:
+            raise ValueError("Journal records must not contain line breaks.")
+        if self.__fd is None:
+            try:
+                os.makedirs(dirname(self.__path))
+            except OSError:
+                pass
+            self.__fd = os.open(self.__path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+        os.write(self.__fd, '{0}\t{1:08x}\n'.format(payload, crc32(payload) & 0xffffffff))
+        os.fsync(self.__fd)
+
+
+
+    def replay(self):
+        """
+        @returns    A dictionary with the last valid value (a string) of every
+                    key in the journal. Reading stops at the first torn or
+                    corrupted record.
+        """
+        values = {}
+        if not exists(self.__path):
+            return values
+        with open(self.__path, 'rb') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                (payload, _, checksum) = line[:-1].rpartition('\t')
+                try:
+                    valid = int(checksum, 16) == crc32(payload) & 0xffffffff
+                except ValueError:
+                    valid = False
+                if not valid or '=' not in payload:
+                    break
+                (key, _, value) = payload.partition('=')
+                values[key] = value
+        return values
+
+
+
+    def close(self):
+        """
+        Closes the journal file (if it was opened for appending).
+        """
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+
+
+    def clear(self):
+        """
+        Closes and removes the journal file. Call this only after the data in
+        the journal has been durably stored elsewhere.
+        """
+        self.close()
+        try:
+            os.remove(self.__path)
+        except OSError:
+            if exists(self.__path):
+                raise
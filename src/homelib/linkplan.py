@@ -0,0 +1,312 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: linkplan.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 13:30:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Batched creation of links, copies and moves (see \link LinkPlan \endlink).
+"""
+
+from logging import info
+from os import lstat
+from os import stat
+from os.path import abspath
+from os.path import basename
+from os.path import dirname
+from os.path import isdir
+from os.path import join
+from stat import S_ISDIR
+
+from homelib.utils import UTILS_CREATE_LINK_COPY
+from homelib.utils import UTILS_CREATE_LINK_MAKE_TARGET_DIRS
+from homelib.utils import UTILS_CREATE_LINK_MOVE
+from homelib.utils import isLinkUpToDate
+from homelib.utils import joinPaths
+from homelib.utils import placeLink
+
+
+
+###
+### Constants
+###
+
+"""
+What happened to a target of a link plan (see \link LinkPlan.apply \endlink).
+"""
+LINK_PLAN_CREATED="created"
+LINK_PLAN_REPLACED="replaced"
+LINK_PLAN_UNCHANGED="unchanged"
+
+
+
+###
+### Stat Cache
+###
+
+class StatCache(object):
+    """
+    Remembers the results of successful 'os.stat' and 'os.lstat' calls
+    (failures are not cached, the paths may be created at any time). Paths
+    that are changed through the cache's users must be invalidated (see
+    'invalidate').
+    """
+
+    def __init__(self):
+        # Both map paths to stat results.
+        self.__stats = {}
+        self.__lstats = {}
+
+
+
+    def stat(self, path):
+        """
+        The same as 'os.stat', but cached.
+        """
+        return self.__get(self.__stats, stat, path)
+
+
+
+    def lstat(self, path):
+        """
+        The same as 'os.lstat', but cached.
+        """
+        return self.__get(self.__lstats, lstat, path)
+
+
+
+    def exists(self, path):
+        """
+        The same as 'os.path.exists', but cached.
+        """
+        try:
+            self.stat(path)
+            return True
+        except OSError:
+            return False
+
+
+
+    def lexists(self, path):
+        """
+        The same as 'os.path.lexists', but cached.
+        """
+        try:
+            self.lstat(path)
+            return True
+        except OSError:
+            return False
+
+
+
+    def isdir(self, path):
+        """
+        The same as 'os.path.isdir', but cached.
+        """
+        try:
+            return S_ISDIR(self.stat(path).st_mode)
+        except OSError:
+            return False
+
+
+
+    def invalidate(self, path):
+        """
+        Forgets everything about the given path. Call this after the file at
+        this path has been changed.
+        """
+        self.__stats.pop(path, None)
+        self.__lstats.pop(path, None)
+
+
+
+    def clear(self):
+        """
+        Forgets everything.
+        """
+        self.__stats.clear()
+        self.__lstats.clear()
+
+
+
+    def __get(self, cache, statFun, path):
+        try:
+            return cache[path]
+        except KeyError:
+            result = statFun(path)
+            cache[path] = result
+            return result
+
+
+
+###
+### Link Plan
+###
+
+class LinkPlan(object):
+    """
+    Collects many link, copy and move operations (with the same arguments as
+    \link homelib.utils.createLink \endlink) and executes them in one go.
+
+    Before anything is touched, the whole plan is validated: all sources must
+    exist, the targets must be distinct and their directories must exist (or
+    be created with the option 'UTILS_CREATE_LINK_MAKE_TARGET_DIRS'). Targets
+    that are already up to date are left alone. Each target directory is
+    created at most once.
+
+    The stats of the sources go through a \link StatCache \endlink, which by
+    default lives only for one call of 'validate' or 'apply' (files may change
+    between plans). Targets and target directories are always looked at anew.
+
+    Example:
+
+        plan = LinkPlan()
+        plan.link([confDir, 'named.conf'], '/etc', UTILS_CREATE_LINK_HARD_LINK, 0640, 'root', 'named')
+        plan.copy([confDir, 'rndc.key'], '/etc', 0, 0600)
+        plan.apply()
+    """
+
+    def __init__(self, statCache=None):
+        """
+        @param  statCache   <b>[Optional]</b> The \link StatCache \endlink to
+                            use. By default every call of 'validate' and
+                            'apply' uses a new cache.
+        """
+        self.__statCache = statCache
+        # A list of tuples '(srcFile, tarPath, options, mode, owner, group)'.
+        self.__operations = []
+
+
+
+    def link(self, srcFile, tarPath=".", options=0, mode=None, owner=None, group=None):
+        """
+        Adds an operation to the plan. The arguments are the same as in \link
+        homelib.utils.createLink \endlink (so a copy or a move can be requested
+        through 'options' as well).
+
+        @returns    This plan.
+        """
+        self.__operations.append((srcFile, tarPath, options or 0, mode, owner, group))
+        return self
+
+
+
+    def copy(self, srcFile, tarPath=".", options=0, mode=None, owner=None, group=None):
+        """
+        The same as 'link', but with 'UTILS_CREATE_LINK_COPY' in 'options'.
+        """
+        return self.link(srcFile, tarPath, (options or 0) | UTILS_CREATE_LINK_COPY, mode, owner, group)
+
+
+
+    def move(self, srcFile, tarPath=".", options=0, mode=None, owner=None, group=None):
+        """
+        The same as 'link', but with 'UTILS_CREATE_LINK_MOVE' in 'options'.
+        """
+        return self.link(srcFile, tarPath, (options or 0) | UTILS_CREATE_LINK_MOVE, mode, owner, group)
+
+
+
+    def validate(self):
+        """
+        Resolves all paths of the plan and checks the plan. Nothing is
+        changed on the file system.
+
+        @returns    A list of tuples '(srcFile, linkPath, options, mode, owner,
+                    group, linkExists, upToDate)', one for every operation.
+
+        @throws IOError if any of the operations cannot be executed (the
+                message lists all problems).
+        """
+        return self.__validate(self.__statCache or StatCache())
+
+
+
+    def apply(self):
+        """
+        Validates the plan (see 'validate') and executes it.
+
+        @returns    A list of tuples '(linkPath, srcFile, change)', where
+                    'change' is one of 'LINK_PLAN_CREATED',
+                    'LINK_PLAN_REPLACED' or 'LINK_PLAN_UNCHANGED'.
+        """
+        cache = self.__statCache or StatCache()
+        report = []
+        for (srcFile, linkPath, options, mode, owner, group, linkExists, upToDate) in self.__validate(cache):
+            if upToDate:
+                report.append((linkPath, srcFile, LINK_PLAN_UNCHANGED))
+                continue
+            try:
+                placeLink(srcFile, linkPath, options, mode, owner, group, linkExists)
+            finally:
+                cache.invalidate(linkPath)
+                if options & UTILS_CREATE_LINK_MOVE:
+                    cache.invalidate(srcFile)
+            report.append((linkPath, srcFile, LINK_PLAN_REPLACED if linkExists else LINK_PLAN_CREATED))
+        changes = [change for (_, _, change) in report]
+        info("Link plan applied: %d created, %d replaced, %d unchanged." % (changes.count(LINK_PLAN_CREATED), changes.count(LINK_PLAN_REPLACED), changes.count(LINK_PLAN_UNCHANGED)))
+        return report
+
+
+
+    def __validate(self, cache):
+        problems = []
+        steps = []
+        linkPaths = set()
+        newDirs = set()
+        for (srcFile, tarPath, options, mode, owner, group) in self.__operations:
+            srcFile = abspath(joinPaths(srcFile))
+            if not cache.exists(srcFile):
+                problems.append("The source file '" + srcFile + "' does not exist.")
+                continue
+            if not tarPath:
+                problems.append("No target path given for '" + srcFile + "'.")
+                continue
+            tarPath = joinPaths(tarPath)
+            # Target directories may be created at any time (e.g. by a package
+            # installation), so they are never cached.
+            linkPath = join(tarPath, basename(srcFile)) if isdir(tarPath) else tarPath
+            if linkPath in linkPaths:
+                problems.append("The target '" + linkPath + "' appears more than once in the plan.")
+                continue
+            linkPaths.add(linkPath)
+            linkDir = dirname(abspath(linkPath))
+            if not (linkDir in newDirs or isdir(linkDir)):
+                if options & UTILS_CREATE_LINK_MAKE_TARGET_DIRS:
+                    newDirs.add(linkDir)
+                else:
+                    problems.append("The target directory '" + linkDir + "' does not exist.")
+                    continue
+            # The targets are what plans change, so always look at them anew.
+            cache.invalidate(linkPath)
+            linkExists = cache.lexists(linkPath)
+            upToDate = linkExists and isLinkUpToDate(srcFile, linkPath, options, mode, owner, group, cache)
+            steps.append((srcFile, linkPath, options, mode, owner, group, linkExists, upToDate))
+        if problems:
+            raise IOError("The link plan cannot be executed:\n    " + "\n    ".join(problems))
+        return steps
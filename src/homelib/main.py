@@ -1,12 +1,8 @@
 #!/bin/python
 
-from ConfigParser import SafeConfigParser
-from homelib.utils import getHomePath, getHomeLibFile, cfgGetOrDefault
 from os.path import join
 import os
 import sys
-import logging
-import traceback
 
 
 
@@ -56,30 +52,6 @@ CFG_GINFO_LOG_DIR = "logDir"
 
 
 
-###
-### Private Helper Functions
-###
-
-
-
-def _tryLoadConfigFile(config, path):
-    """
-    Tries to read the configuration file at the given path.
-
-    @param  config  The configuration parser to use when reading the config
-                    file.
-
-    @param  path    The path to the configuration file to read.
-
-    @returns    True, if the reading succeeded. False otherwise.
-    """
-    if os.path.isfile(path):
-        config.read(path)
-        return True
-    return False
-
-
-
 ###
 ### The main class
 ###
@@ -100,6 +72,19 @@ class Main(object):
 
     Keys from the 'homelib.config' file that are used in this class are listed in variables whose name
     starts with 'CFG_<secname word>_<keyname>' and 'CFG_SEC_<secname word>'.
+
+    The parsed and interpolated configuration is cached in a snapshot file next
+    to the configuration file (see \link homelib.configcache \endlink). As long
+    as the configuration file does not change, it is not parsed again.
+
+    Note: HomeLib modules (and heavy standard modules) are imported only when
+    they are needed, so that the start-up stays fast (see the
+    `--startup-profile` option).
+
+    Looked-up values (and values converted by the typed accessors, e.g.
+    'getCfgInt') are memoized. The memo is dropped whenever the configuration
+    is reloaded or an interpolation variable changes (see 'reloadConfig' and
+    'setCfgVar').
     """
 
     def __init__(self, homeDir=None, configFile=None):
@@ -111,11 +96,17 @@ class Main(object):
 
         @param  configFile  The path to the HomeLib configuration file.
         """
+        from homelib.utils import getHomePath, getHomeLibFile, initLogging
+        initLogging()
         ###
         ### Configuration
         ###
         self.__absHomeDir = os.path.abspath(homeDir or getHomePath())
         self.__configFileVars = None
+        self.__extraConfigFileVars = {}
+        self.__config = None
+        self.__cfgCache = {}
+        self.__typedCfgCache = {}
         
         # Try to read the configuration file. Raise an exception if the
         # configuration file could not be loaded.
@@ -133,13 +124,12 @@ class Main(object):
         else:
             loadDirs = [configFile]
         
-        self.__config = SafeConfigParser()
-        
-        # Now try to load the configuration file and report an error is it
-        # could not be loaded from any of the predefined paths.
-        self.__configFile = next((p for p in loadDirs if _tryLoadConfigFile(self.__config, p)), None)
+        # Now try to find the configuration file and report an error is it
+        # could not be found in any of the predefined paths.
+        self.__configFile = next((p for p in loadDirs if os.path.isfile(p)), None)
         if self.__configFile is None:
             raise Exception("The configuration file could not be loaded. Please check that there is a configuration file in one of these paths: " + str(loadDirs))
+        self.reloadConfig()
         
         ###
         ### Services
@@ -148,14 +138,14 @@ class Main(object):
         self.__configService = None
         self.__softwareService = None
         self.__servicesService = None
+        # Services are created on first use, possibly by several configuration
+        # scripts at the same time (a service may create other services).
+        from threading import RLock
+        self.__servicesLock = RLock()
         ###
         ### Logging
         ###
         self.__logger = None
-        ####
-        #### Finalisation
-        ####
-        self.__refreshConfigFileVars()
 
 
 
@@ -165,13 +155,78 @@ class Main(object):
 
 
 
+    def flushServices(self):
+        """
+        Calls 'flush' on all services that have been created (see \link
+        homelib.service.Service.flush \endlink).
+        """
+        for service in self.__getCreatedServices():
+            service.flush()
+
+
+
+    def hasPendingWork(self):
+        """
+        @returns    'True' iff any of the created services has deferred some
+                    work that has not been done yet.
+        """
+        return any(service.hasPendingWork() for service in self.__getCreatedServices())
+
+
+
+    def getPendingMarks(self):
+        """
+        @returns    The marks of the work deferred so far by the created
+                    services (to be passed to \ref discardPendingWork).
+        """
+        return dict((service, service.getPendingMark()) for service in self.__getCreatedServices())
+
+
+
+    def discardPendingWork(self, marks=None):
+        """
+        Drops the work deferred by the created services without doing it.
+
+        @param  marks   <b>[Optional]</b> The marks returned by \ref
+                        getPendingMarks. If given, only the work deferred after
+                        the marks were taken is dropped.
+        """
+        for service in self.__getCreatedServices():
+            if marks is not None and service in marks:
+                service.discardPending(marks[service])
+            else:
+                service.discardPending()
+
+
+
+    def invalidateServices(self):
+        """
+        Calls 'invalidate' on all services that have been created (see \link
+        homelib.service.Service.invalidate \endlink).
+        """
+        for service in self.__getCreatedServices():
+            service.invalidate()
+
+
+
+    def __getCreatedServices(self):
+        """
+        @returns    The services that have been created so far (in the order in
+                    which their deferred work should be done).
+        """
+        return [service for service in (self.__myMachinesService, self.__softwareService, self.__servicesService, self.__configService) if service]
+
+
+
     def serviceMyMachines(self):
         """
         @returns    The 'My Machines' service, which helps identify machines.
         """
         if not self.__myMachinesService:
-            from homelib.mymachines import MyMachines
-            self.__myMachinesService = MyMachines(self)
+            with self.__servicesLock:
+                if not self.__myMachinesService:
+                    from homelib.mymachines import MyMachines
+                    self.__myMachinesService = MyMachines(self)
         return self.__myMachinesService
 
 
@@ -182,8 +237,10 @@ class Main(object):
                     installation, removal and similar functionality.
         """
         if not self.__softwareService:
-            from homelib.software import Software
-            self.__softwareService = Software.loadChosenImpl(self)
+            with self.__servicesLock:
+                if not self.__softwareService:
+                    from homelib.software import Software
+                    self.__softwareService = Software.loadChosenImpl(self)
         return self.__softwareService
 
 
@@ -194,8 +251,10 @@ class Main(object):
                     configuration automation.
         """
         if not self.__configService:
-            from homelib.config import Config
-            self.__configService = Config(self)
+            with self.__servicesLock:
+                if not self.__configService:
+                    from homelib.config import Config
+                    self.__configService = Config(self)
         return self.__configService
     
 
@@ -206,8 +265,10 @@ class Main(object):
                     management (enabling/disabling running services on this machine).
         """
         if not self.__servicesService:
-            from homelib.services import Services
-            self.__servicesService = Services.loadChosenImpl(self)
+            with self.__servicesLock:
+                if not self.__servicesService:
+                    from homelib.services import Services
+                    self.__servicesService = Services.loadChosenImpl(self)
         return self.__servicesService
 
 
@@ -216,6 +277,56 @@ class Main(object):
     ### Configuration Access Methods
     ###
 
+    def reloadConfig(self):
+        """
+        Loads the configuration again (from the snapshot, if it is still valid,
+        otherwise from the configuration file itself) and drops all memoized
+        configuration values.
+
+        Call this method if the configuration file has been changed while
+        HomeLib is running.
+        """
+        from homelib.configcache import loadConfigSnapshot, parseConfig, saveConfigSnapshot
+        self.__refreshConfigFileVars()
+        # Use the snapshot of the configuration if it is still valid.
+        # Otherwise parse the configuration file and store a new snapshot.
+        config = loadConfigSnapshot(self.__configFile, self.__configFileVars)
+        if config is None:
+            config = parseConfig(self.__configFile, self.__configFileVars)
+            saveConfigSnapshot(self.__configFile, self.__configFileVars, config)
+        self.__config = config
+        self.__cfgCache = {}
+        self.__typedCfgCache = {}
+
+
+
+    def setCfgVar(self, name, value):
+        """
+        Sets an additional variable that can be used for interpolation in the
+        configuration file (in addition to the built-in `homedir`, `confdir` and
+        `conffile` variables), e.g.: `%(name)s`.
+
+        The configuration is re-interpolated and all memoized values are
+        dropped.
+
+        @param  name    The name of the variable (case-insensitive).
+
+        @param  value   The value of the variable. If None, the variable is
+                        removed.
+        """
+        name = name.lower()
+        if value is None:
+            if name not in self.__extraConfigFileVars:
+                return
+            del self.__extraConfigFileVars[name]
+        else:
+            if self.__extraConfigFileVars.get(name) == value:
+                return
+            self.__extraConfigFileVars[name] = value
+        self.reloadConfig()
+
+
+
     def getCfg(self, section, key):
         """
         @param  section The section in the configuration file where to search
@@ -226,7 +337,40 @@ class Main(object):
         @returns    The configuration value from the configuration file (or None
                     if the option with the given key does not exist).
         """
-        return cfgGetOrDefault(self.__config, section, key, None, self.__configFileVars)
+        try:
+            return self.__cfgCache[(section, key)]
+        except KeyError:
+            # Option names are case-insensitive (the parser stores them in
+            # lower-case).
+            value = self.__config.get(section, {}).get(key.lower())
+            self.__cfgCache[(section, key)] = value
+            return value
+
+
+
+    def getCfgInt(self, section, key, default=None):
+        """
+        @param  section The section in the configuration file where to search
+                        for the option with the given name.
+
+        @param  key     The name of the option we want the value of.
+
+        @param  default The value to return if the option does not exist or is
+                        not an integer.
+
+        @returns    The configuration value converted to an integer (or
+                    `default`).
+        """
+        cacheKey = (section, key, int)
+        try:
+            value = self.__typedCfgCache[cacheKey]
+        except KeyError:
+            try:
+                value = int(self.getCfg(section, key))
+            except (TypeError, ValueError):
+                value = None
+            self.__typedCfgCache[cacheKey] = value
+        return default if value is None else value
 
 
 
@@ -252,7 +396,23 @@ class Main(object):
         @returns    The general information configuration value from the
                     configuration file, or None, if no such option exists.
         """
-        return cfgGetOrDefault(self.__config, CFG_SEC_GINFO, key, None, self.__configFileVars)
+        return self.getCfg(CFG_SEC_GINFO, key)
+
+
+
+    def getGiCfgInt(self, key, default=None):
+        """
+        This method is a shorthand for 'getCfgInt(CFG_SEC_GINFO, key, default)'.
+
+        @param  key     The name of the option we want the value of.
+
+        @param  default The value to return if the option does not exist or is
+                        not an integer.
+
+        @returns    The general information configuration value converted to an
+                    integer (or `default`).
+        """
+        return self.getCfgInt(CFG_SEC_GINFO, key, default)
 
 
 
@@ -340,6 +500,7 @@ class Main(object):
             'confdir'   :   self.dirConfDir(),
             'conffile'  :   self.dirConfFile()
         }
+        self.__configFileVars.update(self.__extraConfigFileVars)
 
 
 
@@ -382,6 +543,12 @@ def main(arguments):
     
     @returns    0 on success, otherwise it returns 1.
     """
+    # Measure the imports before anything else gets imported.
+    profiler = None
+    if '--startup-profile' in arguments:
+        from homelib.startupprofile import ImportProfiler
+        profiler = ImportProfiler()
+        profiler.install()
     
     try:
         (main, args) = init(arguments)
@@ -393,19 +560,43 @@ def main(arguments):
             for script in cfgService.getCfgScriptsNames():
                 print "  - " + script + " :: " + cfgService.getCfgScriptDetails(script)[4] + " :: " + str(cfgService.getCfgScriptDetails(script))
             return 0
+        # Shall we just print which updates are pending?
+        elif args.status:
+            for script in cfgService.getCfgScriptsNames():
+                (version, pending) = cfgService.getScriptStatus(script)
+                if pending is None:
+                    print "  - " + script + " :: at version " + str(version) + " :: pending updates unknown (the script has changed or has not run yet)"
+                elif pending:
+                    print "  - " + script + " :: at version " + str(version) + " :: pending updates: " + ', '.join([str(v) for v in pending])
+                else:
+                    print "  - " + script + " :: at version " + str(version) + " :: up to date"
+            return 0
+        # Shall we just print the statistics from the run history?
+        elif args.stats:
+            runHistory = cfgService.getRunHistory()
+            if runHistory is None:
+                print "The run history is turned off (see the `runHistory` option)."
+                return 1
+            print runHistory.formatStats(args.scriptName)
+            return 0
         # Shall we run a specific configuration script?
         elif args.scriptName is None:
             # Run all configuration scripts:
-            for script in cfgService.getCfgScriptsNames():
-                cfgService.runScript(script)
+            cfgService.runAllScripts(args.jobs[0] if args.jobs else None)
         # Okay, run everything (update the whole computer):
         else:
             # Run the selected configuration script:
             cfgService.runScript(args.scriptName, args.start[0] if args.start else None, args.end[0] if args.end else None)
         return 0
     except Exception as ex:
+        import logging
+        import traceback
         logging.error("The configuration script did not execute correctly. The following exception occurred: `" + str(ex) + "`\n\nStack trace: " + traceback.format_exc())
         return 1;
+    finally:
+        if profiler:
+            profiler.uninstall()
+            profiler.report()
 
 if __name__ == '__main__':
     sys.exit(main(sys.argv[1:]))
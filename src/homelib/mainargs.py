@@ -34,11 +34,33 @@ parser.add_argument('-e', '--end',
     help='This option is used only when `script name` is given. It tells HomeLib to stop executing the configuration script with update `version`.'
 )
 
+parser.add_argument('-j', '--jobs',
+    type=int,
+    nargs=1,
+    metavar='count',
+    help='This option is used only when `script name` is not given. It tells HomeLib how many configuration scripts it may run at the same time (scripts wait for the ones listed in their `cfgScriptAfter` option). Overrides the `maxParallelScripts` option in the `Configuration` section.'
+)
+
 parser.add_argument('-l', '--listScripts',
     action='store_true',
     help='List the configuration scripts provided in the `homelib.config` configuration file and exit.'
 )
 
+parser.add_argument('--status',
+    action='store_true',
+    help='Print the version of every configuration script and its pending updates (without loading the scripts) and exit.'
+)
+
+parser.add_argument('--stats',
+    action='store_true',
+    help='Print the median and the 95th percentile of the durations of script runs and of every update function (as recorded in the run history), their trends and the number of failures, and exit. If `script name` is given, only the statistics of that script are printed.'
+)
+
+parser.add_argument('--startup-profile',
+    action='store_true',
+    help='Report how long it took to import every module (to the standard error output) when HomeLib finishes.'
+)
+
 parser.add_argument('-c', '--config-file',
     type=str,
     nargs=1,
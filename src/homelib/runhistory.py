@@ -0,0 +1,348 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: runhistory.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 12:50:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Keeps the history of all configuration script runs in a SQLite database (the
+same database as the one used by the 'sqlite' version store).
+"""
+
+from os import makedirs
+from os import uname
+from os.path import dirname
+
+from homelib.config import RUN_OUTCOME_FAILED
+from homelib.config import RUN_OUTCOME_NOT_APPLIED
+from homelib.config import RUN_OUTCOME_SUCCESS
+from homelib.service import Service
+from homelib.versionstore import CFG_GINFO_DATABASE
+from homelib.versionstore import getDefaultDatabasePath
+
+
+
+###
+### Configuration option names/sections
+###
+
+"""
+Whether to record the history of script runs (`true` or `false`). The default
+is `true`.
+"""
+CFG_GINFO_RUN_HISTORY="runHistory"
+
+
+
+###
+### Constants
+###
+
+"""
+The number of the most recent runs that are compared with the older runs when
+computing the trend of a phase.
+"""
+RUN_HISTORY_TREND_RUNS=5
+
+"""
+The name of the pseudo-phase that stands for the whole run in statistics.
+"""
+RUN_HISTORY_WHOLE_RUN="(run)"
+
+
+
+###
+### The Run History
+###
+
+class RunHistory(Service):
+    """
+    Records every run of a configuration script: the script, the host, when it
+    started, how long it took, its outcome and the type of the exception that
+    stopped it (if any). The timings of the individual phases of the run (see
+    \link homelib.timings.PhaseTimer \endlink) are recorded too.
+
+    The history is used to compute duration percentiles and trends per script
+    and per update function (see 'getStats').
+    """
+    def __init__(self, main=None):
+        Service.__init__(self, main)
+        self.__dbPath = self.getMain().getGiCfg(CFG_GINFO_DATABASE) or getDefaultDatabasePath(self.getMain())
+        conn = self.__connect()
+        try:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS script_runs ('
+                             'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                             'script TEXT NOT NULL, '
+                             'host TEXT NOT NULL, '
+                             'target TEXT, '
+                             'started REAL NOT NULL, '
+                             'duration REAL, '
+                             'outcome TEXT NOT NULL, '
+                             'error TEXT)')
+                conn.execute('CREATE INDEX IF NOT EXISTS script_runs_script ON script_runs (script, host, started)')
+                conn.execute('CREATE TABLE IF NOT EXISTS script_run_phases ('
+                             'run_id INTEGER NOT NULL REFERENCES script_runs (id), '
+                             'phase TEXT NOT NULL, '
+                             'version INTEGER, '
+                             'duration REAL, '
+                             'user_time REAL, '
+                             'sys_time REAL, '
+                             'child_user_time REAL, '
+                             'child_sys_time REAL, '
+                             'outcome TEXT NOT NULL, '
+                             'error TEXT)')
+                conn.execute('CREATE INDEX IF NOT EXISTS script_run_phases_run ON script_run_phases (run_id)')
+        finally:
+            conn.close()
+
+
+
+    @classmethod
+    def isEnabled(cls, main):
+        """
+        @returns    'False' iff recording of the run history has been turned
+                    off with the 'runHistory' option.
+        """
+        return (main.getGiCfg(CFG_GINFO_RUN_HISTORY) or 'true').strip().lower() not in ('false', 'no', 'off', '0')
+
+
+
+    def getDatabasePath(self):
+        """
+        @returns    The path to the SQLite database of the run history.
+        """
+        return self.__dbPath
+
+
+
+    def recordRun(self, script, started, duration, outcome, error=None, phases=()):
+        """
+        Records a run of a configuration script.
+
+        @param  script      The name of the configuration script.
+
+        @param  started     The time (in seconds since the epoch) when the run
+                            started.
+
+        @param  duration    The wall time of the run (in seconds).
+
+        @param  outcome     One of the 'RUN_OUTCOME_*' values (see
+                            \link homelib.config \endlink).
+
+        @param  error       <b>[Optional]</b> The name of the type of the
+                            exception that stopped the run.
+
+        @param  phases      <b>[Optional]</b> The phases of the run (as
+                            returned by \link homelib.timings.PhaseTimer.getPhases
+                            \endlink).
+        """
+        conn = self.__connect()
+        try:
+            with conn:
+                runId = conn.execute('INSERT INTO script_runs (script, host, target, started, duration, outcome, error) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                     (script, uname()[1], self.getMain().dirHome(), started, duration, outcome, error)).lastrowid
+                conn.executemany('INSERT INTO script_run_phases (run_id, phase, version, duration, user_time, sys_time, child_user_time, child_sys_time, outcome, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                 [(runId, p['phase'], p.get('version'), p['wall'], p['user'], p['sys'], p['childUser'], p['childSys'], _getPhaseOutcome(p), p['error'])
+                                  for p in phases])
+        finally:
+            conn.close()
+
+
+
+    def getRuns(self, script=None, host=None):
+        """
+        @param  script  <b>[Optional]</b> Return only the runs of this script.
+
+        @param  host    <b>[Optional]</b> Return only the runs on this host.
+
+        @returns    A list of tuples '(script, host, started, duration,
+                    outcome, error)' ordered by the start time.
+        """
+        (where, params) = _getFilter(script, host)
+        conn = self.__connect()
+        try:
+            return conn.execute('SELECT script, host, started, duration, outcome, error FROM script_runs' + where + ' ORDER BY started', params).fetchall()
+        finally:
+            conn.close()
+
+
+
+    def getStats(self, script=None, host=None):
+        """
+        Computes statistics of the durations of successful runs and of the
+        successful phases of runs.
+
+        @param  script  <b>[Optional]</b> Only the runs of this script are
+                        taken into account.
+
+        @param  host    <b>[Optional]</b> Only the runs on this host are taken
+                        into account.
+
+        @returns    A list of tuples '(script, host, phase, count, p50, p95,
+                    trend, failures)', where:
+
+                        phase    - The name of the phase (e.g. 'update5'), or
+                                   'RUN_HISTORY_WHOLE_RUN' for whole runs.
+
+                        p50, p95 - The median and the 95th percentile of the
+                                   durations (in seconds).
+
+                        trend    - The median of the last
+                                   'RUN_HISTORY_TREND_RUNS' durations divided
+                                   by the median of the older durations (None
+                                   if there are not enough runs).
+
+                        failures - The number of failed runs (or phases).
+
+                    Phases that were not applied (see \link
+                    homelib.config.RUN_OUTCOME_NOT_APPLIED \endlink) are left
+                    out.
+        """
+        (where, params) = _getFilter(script, host, 'r.')
+        conn = self.__connect()
+        try:
+            runs = conn.execute('SELECT r.script, r.host, ?, r.duration, r.outcome FROM script_runs r' + where + ' ORDER BY r.started',
+                                (RUN_HISTORY_WHOLE_RUN,) + params).fetchall()
+            phases = conn.execute('SELECT r.script, r.host, p.phase, p.duration, p.outcome FROM script_run_phases p JOIN script_runs r ON p.run_id = r.id' + where + ' ORDER BY r.started, p.rowid',
+                                  params).fetchall()
+        finally:
+            conn.close()
+        # Group the durations by (script, host, phase), keeping the order in
+        # which the phases first appeared (whole runs come first).
+        groups = {}
+        order = []
+        for (s, h, phase, duration, outcome) in runs + phases:
+            if outcome == RUN_OUTCOME_NOT_APPLIED:
+                # Skipped updates neither failed nor did their work.
+                continue
+            key = (s, h, phase)
+            if key not in groups:
+                groups[key] = ([], [0])
+                order.append(key)
+            if outcome == RUN_OUTCOME_SUCCESS and duration is not None:
+                groups[key][0].append(duration)
+            elif outcome != RUN_OUTCOME_SUCCESS:
+                groups[key][1][0] += 1
+        stats = []
+        for key in sorted(order, key=lambda k: k[:2]):
+            (durations, failures) = groups[key]
+            stats.append(key + (len(durations), _percentile(durations, 50), _percentile(durations, 95), _trend(durations), failures[0]))
+        return stats
+
+
+
+    def formatStats(self, script=None, host=None):
+        """
+        @returns    A table (a multi-line string) of the statistics returned by
+                    'getStats'.
+        """
+        rowFormat = "  %-20s %-16s %-24s %6s %10s %10s %8s %8s"
+        lines = [rowFormat % ('script', 'host', 'phase', 'runs', 'p50 [s]', 'p95 [s]', 'trend', 'failed')]
+        for (s, h, phase, count, p50, p95, trend, failures) in self.getStats(script, host):
+            lines.append(rowFormat % (s, h, phase, count,
+                                      '-' if p50 is None else "%.3f" % p50,
+                                      '-' if p95 is None else "%.3f" % p95,
+                                      '-' if trend is None else "x%.2f" % trend,
+                                      failures))
+        return '\n'.join(lines)
+
+
+
+    def __connect(self):
+        # Connections are not shared, so scripts running in different threads
+        # can record their runs at the same time.
+        try:
+            makedirs(dirname(self.__dbPath))
+        except:
+            pass
+        import sqlite3
+        return sqlite3.connect(self.__dbPath, timeout=60)
+
+
+
+###
+### Private helper functions
+###
+
+def _getFilter(script, host, prefix=''):
+    """
+    @returns    A pair '(where clause, parameters)' that selects the runs of
+                the given script on the given host (both are optional).
+    """
+    conditions = []
+    params = ()
+    if script is not None:
+        conditions.append(prefix + 'script = ?')
+        params += (script,)
+    if host is not None:
+        conditions.append(prefix + 'host = ?')
+        params += (host,)
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else '', params)
+
+
+
+def _getPhaseOutcome(phase):
+    """
+    @param  phase   A phase recorded by \link homelib.timings.PhaseTimer
+                    \endlink.
+
+    @returns    The 'RUN_OUTCOME_*' value of the phase.
+    """
+    if phase.get('notApplied'):
+        return RUN_OUTCOME_NOT_APPLIED
+    return RUN_OUTCOME_FAILED if phase['error'] else RUN_OUTCOME_SUCCESS
+
+
+
+def _percentile(values, percent):
+    """
+    @returns    The given percentile of the values (using the nearest-rank
+                method), or None if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-percent * len(ordered) // 100))
+    return ordered[int(rank) - 1]
+
+
+
+def _trend(durations):
+    """
+    @returns    The median of the most recent durations divided by the median of
+                the older ones (or None if there are not enough durations).
+    """
+    recent = durations[-RUN_HISTORY_TREND_RUNS:]
+    older = durations[:-RUN_HISTORY_TREND_RUNS]
+    if not older:
+        return None
+    olderMedian = _percentile(older, 50)
+    if not olderMedian:
+        return None
+    return _percentile(recent, 50) / olderMedian
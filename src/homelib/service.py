@@ -63,6 +63,57 @@ class Service(object):
 
 
 
+    def flush(self):
+        """
+        Performs all the work that this service has deferred (e.g. queued
+        package installations). This method is called by 'main' at the end of
+        every run of a configuration script, and scripts may call it whenever
+        they need the deferred work to be done.
+
+        Work that could not be done must stay pending (so that it can be
+        retried or discarded, see \ref discardPending).
+        """
+
+
+
+    def hasPendingWork(self):
+        """
+        @returns    'True' iff this service has deferred some work that has not
+                    been done yet (see \ref flush).
+        """
+        return False
+
+
+
+    def getPendingMark(self):
+        """
+        @returns    A mark of the work this service has deferred so far (to be
+                    passed to \ref discardPending).
+        """
+        return None
+
+
+
+    def discardPending(self, mark=None):
+        """
+        Drops the deferred work without doing it.
+
+        @param  mark    <b>[Optional]</b> A mark returned by \ref
+                        getPendingMark. If given, only the work deferred after
+                        the mark was taken is dropped.
+        """
+
+
+
+    def invalidate(self):
+        """
+        Forgets everything this service has cached about the state of the
+        machine. This method is called by 'main' after the machine has changed
+        in ways the service cannot notice (e.g. packages have been installed).
+        """
+
+
+
 class MultiService(Service):
     """
     The base-class of all services in this library that have multiple
@@ -95,4 +95,29 @@ class Services(MultiService):
 
         @param  levels      A string made up of numbers from 0 to 6.
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+
+
+    def setServiceStates(self, states, levels = None):
+        """
+        Enables and disables many services at once. Implementations should
+        change only the services that are not in the desired state already.
+
+        This implementation simply passes the services to \ref enableServices
+        and \ref disableServices.
+
+        @param  states      A dictionary (or a list of pairs) from service names
+                            to 'True' (enable the service) or 'False' (disable
+                            it). If a list contains a service more than once,
+                            the last state counts.
+
+        @param  levels      A string made up of numbers from 0 to 6.
+        """
+        states = dict(states)
+        toDisable = [service for (service, enabled) in states.iteritems() if not enabled]
+        toEnable = [service for (service, enabled) in states.iteritems() if enabled]
+        if toDisable:
+            self.disableServices(sorted(toDisable), levels)
+        if toEnable:
+            self.enableServices(sorted(toEnable), levels)
\ No newline at end of file
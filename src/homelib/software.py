@@ -29,7 +29,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+from threading import Lock
+from threading import local
+
 from homelib.service import MultiService
+from homelib.utils import flatten
 
 
 
@@ -46,6 +50,14 @@ Currently known (supported) software service implementations:
 """
 CFG_GINFO_SOFTWARE_SERVICE="softwareService"
 
+"""
+Whether package installations are deferred (`true` or `false`, the default).
+Deferred installations and repositories are queued and installed in a single
+transaction when the software service is flushed (at the end of every run of a
+configuration script or when a script calls \link Software.flush \endlink).
+"""
+CFG_GINFO_SOFTWARE_DEFERRED="softwareDeferred"
+
 
 
 ###
@@ -59,6 +71,17 @@ class Software(MultiService):
     """
     def __init__(self, main=None):
         MultiService.__init__(self, main)
+        try:
+            deferred = self.getMain().getGiCfg(CFG_GINFO_SOFTWARE_DEFERRED)
+        except:
+            deferred = None
+        self.__deferred = (deferred or 'false').strip().lower() in ('true', 'yes', 'on', '1')
+        # The queues of deferred repositories and packages are kept per
+        # thread, so that concurrently running configuration scripts flush
+        # only their own requests.
+        self.__pending = local()
+        # The package manager is run by one thread at a time.
+        self.__lock = Lock()
 
     @classmethod
     def knownImpls(cls):
@@ -77,20 +100,165 @@ class Software(MultiService):
     ###
     def install(self, *packages):
         """
-        Installs the given packages on this machine.
+        Installs the given packages on this machine. In the deferred mode (see
+        \ref setDeferred) the packages are only queued (see \ref flush).
 
         @param  packages    The list of packages to install.
 
         @throws If the installation failed for any reason.
         """
-        raise NotImplementedError
+        packages = flatten(packages)
+        if packages:
+            if self.__deferred:
+                pending = self.__getPending()
+                pending.packages.extend([p for p in packages if p not in pending.packages])
+                return
+            try:
+                with self.__lock:
+                    self.installNow(packages)
+            finally:
+                # The packages may have brought new services, users etc.
+                self.getMain().invalidateServices()
 
 
 
     def addRepository(self, uri):
         """
-        Downloads, installs and enables the repository at the given URI.
+        Downloads, installs and enables the repository at the given URI. In the
+        deferred mode (see \ref setDeferred) the repository is only queued (see
+        \ref flush).
 
         @param  uri The uri of the repository to add.
         """
-        pass
\ No newline at end of file
+        if self.__deferred:
+            pending = self.__getPending()
+            if uri not in pending.repositories:
+                pending.repositories.append(uri)
+            return
+        with self.__lock:
+            self.addRepositoryNow(uri)
+
+
+
+    def flush(self):
+        """
+        Adds all repositories and then installs all packages queued by the
+        current thread in a single transaction. The repositories and packages
+        stay queued until they have been added or installed successfully.
+
+        @throws If the installation failed for any reason.
+        """
+        pending = self.__getPending()
+        if not (pending.repositories or pending.packages):
+            return
+        try:
+            with self.__lock:
+                for uri in list(pending.repositories):
+                    self.addRepositoryNow(uri)
+                    pending.repositories.remove(uri)
+                if pending.packages:
+                    self.installNow(list(pending.packages))
+                    pending.packages = []
+        finally:
+            self.getMain().invalidateServices()
+
+
+
+    def hasPendingWork(self):
+        pending = self.__getPending()
+        return bool(pending.repositories or pending.packages)
+
+
+
+    def getPendingMark(self):
+        pending = self.__getPending()
+        return (tuple(pending.repositories), tuple(pending.packages))
+
+
+
+    def discardPending(self, mark=None):
+        (repositories, packages) = mark or ((), ())
+        pending = self.__getPending()
+        pending.repositories = [x for x in pending.repositories if x in repositories]
+        pending.packages = [x for x in pending.packages if x in packages]
+
+
+
+    def setDeferred(self, deferred=True):
+        """
+        Turns the deferred mode on or off (it is off by default, unless the
+        'softwareDeferred' option is set). In the deferred mode 'install' and
+        'addRepository' only queue their requests, which are carried out by
+        \ref flush. Turning the mode off does not flush the queue.
+        """
+        self.__deferred = deferred
+
+
+
+    def isDeferred(self):
+        """
+        @returns    'True' iff installations are deferred (see \ref
+                    setDeferred).
+        """
+        return self.__deferred
+
+
+
+    def installNow(self, packages):
+        """
+        Installs the given packages on this machine immediately (in a single
+        transaction).
+
+        @param  packages    The list of packages to install.
+
+        @throws If the installation failed for any reason.
+        """
+        raise NotImplementedError
+
+
+
+    def addRepositoryNow(self, uri):
+        """
+        Downloads, installs and enables the repository at the given URI
+        immediately.
+
+        @param  uri The uri of the repository to add.
+        """
+        pass
+
+
+
+    def isInstalled(self, package):
+        """
+        @param  package The name of a package.
+
+        @returns    'True' iff the given package is installed on this machine.
+        """
+        return not self.missing([package])
+
+
+
+    def missing(self, packages):
+        """
+        Finds the packages that are not installed on this machine (in a single
+        query for all of them).
+
+        @param  packages    A list of package names.
+
+        @returns    The list of packages (in the given order) that are not
+                    installed.
+        """
+        raise NotImplementedError
+
+
+
+    def __getPending(self):
+        """
+        @returns    The queues of the current thread (an object with the lists
+                    'repositories' and 'packages').
+        """
+        pending = self.__pending
+        if not hasattr(pending, 'packages'):
+            pending.repositories = []
+            pending.packages = []
+        return pending
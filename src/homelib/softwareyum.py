@@ -29,15 +29,32 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from homelib.utils import flatten
+import os
+from logging import info
+from os.path import join
+from threading import Lock
+
 from homelib.software import Software
+from homelib.utils import flatten
 from homelib.utils import runCmd
-from logging import info
+from homelib.utils import runCmdGetLines
 
 
 
 PACKAGE_MANAGER="yum"
 
+"""
+The directories where the RPM database may reside (older systems keep it in
+'/var/lib/rpm', newer ones in '/usr/lib/sysimage/rpm').
+"""
+RPM_DB_DIRS=('/var/lib/rpm', '/usr/lib/sysimage/rpm')
+
+"""
+The names under which an installed package can be asked for (see
+'SoftwareYum.missing').
+"""
+RPM_QUERY_FORMAT='%{NAME}\\n%{NAME}.%{ARCH}\\n%{NAME}-%{VERSION}\\n%{NAME}-%{VERSION}-%{RELEASE}\\n%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}\\n'
+
 
 
 
@@ -48,13 +65,22 @@ PACKAGE_MANAGER="yum"
 class SoftwareYum(Software):
     """
     The RPM/Yum implementation of the HomeLib software service.
+
+    The names of installed packages are read from the RPM database once and
+    kept until the database changes (its files get a new modification time),
+    so that 'install' starts Yum only if some packages are missing.
     """
     def __init__(self, main=None):
         Software.__init__(self, main)
+        self.__installed = None
+        self.__installedStamp = None
+        self.__lock = Lock()
 
-    def install(self, *packages):
+    def installNow(self, packages):
         if packages:
-            packages = flatten(packages)
+            packages = self.missing(packages)
+            if not packages:
+                return
             if runCmd(PACKAGE_MANAGER, "-y", "install", packages):
                 raise Exception("Installation process failed.")
             info("Installed packages: " + ", ".join(packages))
@@ -64,5 +90,65 @@ class SoftwareYum(Software):
 #            yb.resolveDeps()
 #            yb.processTransaction()
 
-    def addRepository(self, uri):
+    def missing(self, packages):
+        installed = self.getInstalledPackages()
+        # Paths, URLs, groups and capabilities are left to Yum.
+        return [package for package in flatten(packages) if package not in installed or not _isPackageName(package)]
+
+    def getInstalledPackages(self):
+        """
+        @returns    A set of the installed packages (their names, the names with
+                    architectures, versions and releases). The set is read
+                    again only after the RPM database changes.
+        """
+        with self.__lock:
+            stamp = _getRpmDbStamp()
+            if self.__installed is None or stamp is None or stamp != self.__installedStamp:
+                (retcode, lines) = runCmdGetLines('rpm', '-qa', '--qf', RPM_QUERY_FORMAT)
+                if retcode:
+                    raise Exception("Could not list the installed packages.")
+                self.__installed = frozenset(lines)
+                self.__installedStamp = stamp
+            return self.__installed
+
+    def addRepositoryNow(self, uri):
         runCmd(PACKAGE_MANAGER, '-y', '-v', 'localinstall', '--nogpgcheck', uri)
+
+
+
+###
+### Private helper methods
+###
+
+def _getRpmDbStamp():
+    """
+    @returns    The modification times of the RPM database directory and its
+                files (which change with every transaction), or None if the
+                database cannot be found.
+    """
+    for dbDir in RPM_DB_DIRS:
+        try:
+            names = os.listdir(dbDir)
+        except OSError:
+            continue
+        stamp = [(dbDir, os.stat(dbDir).st_mtime)]
+        for name in sorted(names):
+            # Lock files and shared memory change even when the database is
+            # only read.
+            if name.startswith(('__db', '.')) or name.endswith(('-shm', '.lock')):
+                continue
+            try:
+                st = os.stat(join(dbDir, name))
+            except OSError:
+                continue
+            stamp.append((name, st.st_mtime, st.st_size))
+        return tuple(stamp)
+    return None
+
+def _isPackageName(package):
+    """
+    @returns    'True' iff the given string is a plain package name (possibly
+                with a version or an architecture) rather than a path, an URL, a
+                group or a capability.
+    """
+    return not any([c in package for c in '/()@<>= '])
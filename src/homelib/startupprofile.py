@@ -0,0 +1,141 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: startupprofile.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 11:45:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Measures how long it takes to import modules.
+
+This module is used by the `--startup-profile` option of the HomeLib entry
+point (see \link homelib.main \endlink). It must not import any HomeLib module
+itself, so that it can be installed before anything else is imported.
+"""
+
+import __builtin__
+import sys
+from time import time
+
+
+
+###
+### Import Profiling
+###
+
+class ImportProfiler(object):
+    """
+    Replaces the built-in '__import__' function with one that measures the time
+    spent importing modules that have not been loaded yet.
+
+    Every import that loads at least one new module is recorded. The total time
+    includes the imports nested within it, while the 'self' time excludes them.
+    """
+
+    def __init__(self):
+        """
+        Initialises the profiler (it does not install it though, see 'install').
+        """
+        self.__origImport = None
+        self.__started = None
+        # A list of tuples: (module name, nesting depth, total time, self time).
+        self.__records = []
+        # The time spent in nested imports for every import on the stack.
+        self.__nestedTimes = []
+
+
+
+    def install(self):
+        """
+        Starts measuring imports.
+        """
+        if self.__origImport is None:
+            self.__origImport = __builtin__.__import__
+            self.__started = time()
+            __builtin__.__import__ = self.__profiledImport
+
+
+
+    def uninstall(self):
+        """
+        Stops measuring imports.
+        """
+        if self.__origImport is not None:
+            __builtin__.__import__ = self.__origImport
+            self.__origImport = None
+
+
+
+    def getRecords(self):
+        """
+        @returns    A list of tuples '(module name, nesting depth, total seconds,
+                    self seconds)' in the order in which the imports finished.
+        """
+        return list(self.__records)
+
+
+
+    def getTotalTime(self):
+        """
+        @returns    The time (in seconds) spent in top-level imports.
+        """
+        return sum([total for (name, depth, total, selfTime) in self.__records if depth == 0])
+
+
+
+    def report(self, limit=30, out=None):
+        """
+        Writes a table of the slowest imports.
+
+        @param  limit   The maximum number of imports to list.
+
+        @param  out     The file where to write the table (standard error by
+                        default).
+        """
+        out = out or sys.stderr
+        records = sorted(self.__records, key=lambda r: r[2], reverse=True)
+        out.write("Startup profile (%d imports, %.1f ms in top-level imports, %.1f ms since the profiler was installed):\n" % (len(self.__records), self.getTotalTime() * 1000, (time() - (self.__started or time())) * 1000))
+        out.write("  %10s  %10s  %s\n" % ('total [ms]', 'self [ms]', 'module'))
+        for (name, depth, total, selfTime) in records[:limit]:
+            out.write("  %10.2f  %10.2f  %s%s\n" % (total * 1000, selfTime * 1000, '  ' * depth, name))
+
+
+
+    def __profiledImport(self, name, globals=None, locals=None, fromlist=None, level=-1):
+        modulesCount = len(sys.modules)
+        self.__nestedTimes.append(0.0)
+        start = time()
+        try:
+            return self.__origImport(name, globals, locals, fromlist, level)
+        finally:
+            total = time() - start
+            nested = self.__nestedTimes.pop()
+            # Imports of already loaded modules are not interesting.
+            if len(sys.modules) > modulesCount:
+                self.__records.append((name, len(self.__nestedTimes), total, total - nested))
+                if self.__nestedTimes:
+                    self.__nestedTimes[-1] += total
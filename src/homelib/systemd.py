@@ -31,30 +31,155 @@
 
 from homelib.services import Services
 from homelib.utils import runCmd
+from homelib.utils import runCmdGetLines
 from logging import info
 
 SERVICE_MANAGER="systemctl"
 
+"""
+The states of unit files (as listed by 'systemctl list-unit-files') in which
+units need not (or cannot) be enabled.
+"""
+SYSTEMD_ENABLED_STATES=('enabled', 'enabled-runtime', 'static', 'indirect', 'generated', 'transient', 'alias')
+
+"""
+The states of unit files in which units have to be disabled.
+"""
+SYSTEMD_DISABLE_STATES=('enabled', 'enabled-runtime', 'linked', 'linked-runtime')
+
+"""
+The suffixes of unit names. Names without one of them are services.
+"""
+SYSTEMD_UNIT_SUFFIXES=('.service', '.socket', '.target', '.timer', '.path', '.mount', '.automount', '.swap', '.slice')
+
 class SystemDServices(Services):
     '''
     The SystemD services management implementation of the HomeLib services
     service.
+
+    The states of all unit files are read with a single 'systemctl
+    list-unit-files' call and kept until the service is invalidated (e.g. after
+    packages get installed) or a unit that has not been looked for yet is not
+    found among them. Only the units
+    that are not in the desired state are enabled or disabled, all of them with
+    a single 'systemctl' call. Units that are still not listed (e.g. SysV
+    services) are passed to 'systemctl' as well. The deferred work of other
+    services (e.g. queued package installations) is done before any units are
+    looked at.
     '''
     def __init__(self, main=None):
         Services.__init__(self, main)
+        self.__unitFileStates = None
+        # The units that have been found missing from the current unit file
+        # states after they were read again (they are not read again for
+        # these units).
+        self.__unlistedUnits = set()
 
     def disableServices(self, services, levels = None):
-        for service in services:
-            self.configureService(service, 'off')
+        self.setServiceStates([(service, False) for service in services], levels)
 
     def enableServices(self, services, levels = None):
-        for service in services:
-            self.configureService(service, 'on')
+        self.setServiceStates([(service, True) for service in services], levels)
 
     def configureService(self, service, newStatus='on', levels = None):
-        turnOff = (newStatus == 'off')
+        self.setServiceStates([(service, newStatus != 'off')], levels)
+
+    def setServiceStates(self, states, levels = None):
         #levels = filter(lambda x: x in '0123456', levels) if levels else None
-        if runCmd(SERVICE_MANAGER, 'disable' if turnOff else 'enable', service + '.service'):
-            info("Could not " + ('disable' if turnOff else 'enable') + " service: " + service + ".")
+        # The units may come with packages whose installation was deferred.
+        self.getMain().flushServices()
+        fresh = self.__unitFileStates is None
+        unitStates = self.getUnitFileStates()
+        states = [(_getUnitName(service), enabled) for (service, enabled) in sorted(dict(states).iteritems())]
+        if not fresh and [unit for (unit, _) in states if unit not in unitStates and unit not in self.__unlistedUnits]:
+            # The unit may have been installed since the states were read.
+            # What is known about the units that are never listed is kept.
+            unlisted = dict([(unit, unitStates.get(unit)) for unit in self.__unlistedUnits])
+            self.invalidateUnitFileStates()
+            unitStates = self.getUnitFileStates()
+            for (unit, state) in unlisted.iteritems():
+                if unit not in unitStates:
+                    self.__unlistedUnits.add(unit)
+                    if state is not None:
+                        unitStates[unit] = state
+        # SysV services and template instances are never listed.
+        self.__unlistedUnits.update([unit for (unit, _) in states if unit not in unitStates])
+        toChange = {True: [], False: []}
+        for (unit, enabled) in states:
+            state = unitStates.get(unit)
+            if state is None:
+                # Let 'systemctl' decide (it forwards SysV services to
+                # 'chkconfig' and reports the missing ones).
+                toChange[enabled].append(unit)
+            elif enabled and state not in SYSTEMD_ENABLED_STATES:
+                toChange[True].append(unit)
+            elif not enabled and state in SYSTEMD_DISABLE_STATES:
+                toChange[False].append(unit)
+        for enabled in (False, True):
+            if toChange[enabled]:
+                self.__changeUnits(toChange[enabled], enabled)
+
+    def getUnitFileStates(self):
+        """
+        @returns    A dictionary from the names of all unit files (e.g.
+                    'sshd.service') to their states (e.g. 'enabled'). The
+                    states are read again only after 'invalidate'.
+        """
+        if self.__unitFileStates is None:
+            (retcode, lines) = runCmdGetLines(SERVICE_MANAGER, 'list-unit-files', '--no-legend', '--no-pager', '--full')
+            if retcode:
+                raise Exception("Could not list the unit files of SystemD.")
+            states = {}
+            for line in lines:
+                columns = line.split()
+                if len(columns) >= 2:
+                    states[columns[0]] = columns[1]
+            self.__unitFileStates = states
+        return self.__unitFileStates
+
+    def invalidateUnitFileStates(self):
+        """
+        Forgets the states of unit files (they will be read again when needed).
+        """
+        self.__unitFileStates = None
+        self.__unlistedUnits = set()
+
+    def invalidate(self):
+        self.invalidateUnitFileStates()
+
+    def __changeUnits(self, units, enable):
+        """
+        Enables or disables the given units with a single 'systemctl' call. If
+        the call fails, the units are changed one by one (so that the failing
+        ones can be reported).
+        """
+        action = 'enable' if enable else 'disable'
+        if runCmd(SERVICE_MANAGER, action, units):
+            for unit in units:
+                if runCmd(SERVICE_MANAGER, action, unit):
+                    info("Could not " + action + " service: " + _getServiceName(unit) + ".")
+                else:
+                    self.__setUnitState(unit, enable)
+                    info(('Enabled' if enable else 'Disabled') + " service '" + _getServiceName(unit) + "'.")
         else:
-            info(('Disabled' if turnOff else 'Enabled') + " service '" + service + "'.")
\ No newline at end of file
+            for unit in units:
+                self.__setUnitState(unit, enable)
+            info(('Enabled' if enable else 'Disabled') + " services: " + ', '.join([_getServiceName(unit) for unit in units]) + ".")
+
+    def __setUnitState(self, unit, enable):
+        if self.__unitFileStates is not None:
+            self.__unitFileStates[unit] = 'enabled' if enable else 'disabled'
+
+def _getUnitName(service):
+    """
+    @returns    The name of the unit file of the given service (e.g. 'sshd' ->
+                'sshd.service').
+    """
+    return service if service.endswith(SYSTEMD_UNIT_SUFFIXES) else service + '.service'
+
+def _getServiceName(unit):
+    """
+    @returns    The name of the service of the given unit (e.g. 'sshd.service'
+                -> 'sshd').
+    """
+    return unit[:-len('.service')] if unit.endswith('.service') else unit
@@ -0,0 +1,218 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: timings.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 12:20:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Measures how long the phases of a configuration script run take.
+
+For every phase the wall time, the user and system CPU time of this process and
+the user and system CPU time of its (finished) child processes are recorded.
+"""
+
+import resource
+from contextlib import contextmanager
+from os import uname
+from time import time
+
+
+
+###
+### Constants
+###
+
+"""
+The suffix of the file (next to the script's log file) to which the timings of
+every run of the script are appended (one JSON record per line).
+"""
+TIMINGS_FILE_SUFFIX = ".timings"
+
+"""
+The names of the measured quantities (in seconds) in every phase record.
+"""
+TIMINGS_QUANTITIES = ('wall', 'user', 'sys', 'childUser', 'childSys')
+
+
+
+###
+### Phase Timing
+###
+
+class PhaseTimer(object):
+    """
+    Collects the timings of consecutive phases (see 'measure').
+
+    Note: CPU times are taken from 'getrusage' and are process-wide. When
+    several scripts run at the same time (in different threads), the CPU times
+    of a phase include the work done by the other scripts in the meantime. The
+    wall time is not affected by this.
+    """
+
+    def __init__(self):
+        # A list of dictionaries with the keys 'phase', 'version', 'error',
+        # 'notApplied' and the ones in 'TIMINGS_QUANTITIES'.
+        self.__phases = []
+
+
+
+    @contextmanager
+    def measure(self, phase, version=None, notApplied=()):
+        """
+        Measures the code in the 'with' block, e.g.:
+
+            with timer.measure('update5'):
+                inst.update5()
+
+        The phase is recorded even if the block throws an exception (the name
+        of the exception's type is stored under the 'error' key). Exceptions
+        of the 'notApplied' types are not errors, they only set the
+        'notApplied' key.
+
+        @param  phase   The name of the phase.
+
+        @param  version <b>[Optional]</b> The version of the update if the
+                        phase is an update function.
+
+        @param  notApplied  <b>[Optional]</b> An exception type (or a tuple of
+                            them) that tells that the phase has been skipped
+                            on purpose (e.g. 'UpdateNotAppliedException').
+        """
+        before = _getUsage()
+        error = None
+        skipped = False
+        try:
+            yield
+        except notApplied:
+            skipped = True
+            raise
+        except BaseException as ex:
+            error = type(ex).__name__
+            raise
+        finally:
+            after = _getUsage()
+            record = dict(zip(TIMINGS_QUANTITIES, [a - b for (a, b) in zip(after, before)]))
+            record['phase'] = phase
+            record['version'] = version
+            record['error'] = error
+            record['notApplied'] = skipped
+            self.__phases.append(record)
+
+
+
+    def getPhases(self):
+        """
+        @returns    The list of recorded phases (in the order in which they
+                    finished). Every phase is a dictionary with the keys
+                    'phase', 'version', 'error', 'notApplied' and the ones
+                    in 'TIMINGS_QUANTITIES'.
+        """
+        return list(self.__phases)
+
+
+
+    def getTotals(self):
+        """
+        @returns    A dictionary with the sums of all quantities in
+                    'TIMINGS_QUANTITIES' over all recorded phases.
+        """
+        return dict([(q, sum([p[q] for p in self.__phases])) for q in TIMINGS_QUANTITIES])
+
+
+
+    def formatSummary(self):
+        """
+        @returns    A table (a multi-line string) of all recorded phases,
+                    sorted from the slowest to the fastest one.
+        """
+        rowFormat = "  %-24s %10s %10s %10s %13s %13s  %s"
+        numFormat = "%.3f"
+        lines = [(rowFormat % ('phase', 'wall [s]', 'user [s]', 'sys [s]', 'child usr [s]', 'child sys [s]', '')).rstrip()]
+        for p in sorted(self.__phases, key=lambda p: p['wall'], reverse=True):
+            lines.append((rowFormat % tuple([p['phase']] + [numFormat % p[q] for q in TIMINGS_QUANTITIES] + [p['error'] or ('not applied' if p.get('notApplied') else '')])).rstrip())
+        totals = self.getTotals()
+        lines.append((rowFormat % tuple(['total'] + [numFormat % totals[q] for q in TIMINGS_QUANTITIES] + [''])).rstrip())
+        return '\n'.join(lines)
+
+
+
+    def save(self, filePath, script, started):
+        """
+        Appends a record of all measured phases (as a single JSON line) to the
+        given file.
+
+        @param  filePath    The file to which to append the record.
+
+        @param  script      The name of the configuration script.
+
+        @param  started     The time (in seconds since the epoch) when the
+                            run started.
+        """
+        import json
+        record = {
+            'script'    :   script,
+            'host'      :   uname()[1],
+            'started'   :   started,
+            'phases'    :   self.__phases
+        }
+        with open(filePath, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+
+def loadTimings(filePath):
+    """
+    @param  filePath    A file written by 'PhaseTimer.save'.
+
+    @returns    A list of all records in the file (in the order in which they
+                were appended). Unreadable records are skipped.
+    """
+    import json
+    records = []
+    with open(filePath) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                pass
+    return records
+
+
+
+###
+### Private helper methods
+###
+
+def _getUsage():
+    """
+    @returns    A tuple with the current values of the quantities in
+                'TIMINGS_QUANTITIES'.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (time(), own.ru_utime, own.ru_stime, children.ru_utime, children.ru_stime)
@@ -0,0 +1,292 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: treeprops.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 15:10:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import os
+import re
+from logging import info
+from os.path import join
+from stat import S_ISDIR
+from stat import S_ISLNK
+
+from homelib.utils import getGid
+from homelib.utils import getUid
+from homelib.utils import joinPaths
+from homelib.utils import resolveOwnership
+from homelib.utils import runCmdGetString
+from homelib.utils import scanDir
+
+
+
+###
+### Constants
+###
+
+"""
+The default number of threads that 'fixTreeProps' uses to scan directories.
+"""
+TREE_PROPS_THREADS=1
+
+"""
+The maximum number of paths passed to a single 'setfacl' invocation.
+"""
+TREE_PROPS_SETFACL_BATCH=256
+
+"""
+The keys of the counts returned by 'fixTreeProps'.
+"""
+TREE_PROPS_SCANNED="scanned"
+TREE_PROPS_OWNER="owner"
+TREE_PROPS_MODE="mode"
+TREE_PROPS_ACL="acl"
+
+
+
+###
+### Tree Properties
+###
+
+def fixTreeProps(rootDir, owner=None, group=None, mode=None, dirMode=None, acl=None, threads=None):
+    """
+    The incremental counterpart of 'chown -R', 'chmod -R' and 'setfacl -R -m'.
+    Walks the whole tree (without following symbolic links) and changes only
+    the entries whose owner, group, mode or ACL differ from the requested ones.
+    An up-to-date tree is therefore only scanned (and not touched at all).
+
+    @param  rootDir The root of the tree (included).
+
+    @param  owner   <b>[Optional]</b> The new owner of all entries (see \ref
+                    chprops, the 'user:group' syntax is supported too).
+
+    @param  group   <b>[Optional]</b> The new group of all entries.
+
+    @param  mode    <b>[Optional]</b> The new permissions of files.
+
+    @param  dirMode <b>[Optional]</b> The new permissions of directories.
+
+    @param  acl     <b>[Optional]</b> The ACL entries that every entry must
+                    have, in the syntax of 'setfacl -m' (e.g.
+                    'u:apache:rx,d:g:wheel:rwx'). Default entries are applied to
+                    directories only. The current ACLs are read with a single
+                    'getfacl -R' call and only the entries that miss some of
+                    the ACL entries are passed to (batched) 'setfacl -m' calls.
+
+    @param  threads <b>[Optional]</b> The number of threads that scan the
+                    directories (one level of the tree at a time). Default is
+                    \ref TREE_PROPS_THREADS.
+
+    @returns    A dictionary with the number of scanned entries (\ref
+                TREE_PROPS_SCANNED) and the numbers of entries whose ownership
+                (\ref TREE_PROPS_OWNER), mode (\ref TREE_PROPS_MODE) and ACL
+                (\ref TREE_PROPS_ACL) have been changed.
+    """
+    rootDir = joinPaths(rootDir)
+    (uid, gid) = resolveOwnership(owner, group)
+    mode = int(mode) if mode else None
+    dirMode = int(dirMode) if dirMode else None
+    aclEntries = _parseAclSpec(acl) if acl else None
+    currentAcls = _getTreeAcls(rootDir) if aclEntries else None
+    threads = threads or TREE_PROPS_THREADS
+
+    def fixEntry(path, st, counts, aclFixes):
+        counts[TREE_PROPS_SCANNED] += 1
+        ownerChanged = uid not in (-1, st.st_uid) or gid not in (-1, st.st_gid)
+        if ownerChanged:
+            os.lchown(path, -1 if uid == st.st_uid else uid, -1 if gid == st.st_gid else gid)
+            counts[TREE_PROPS_OWNER] += 1
+        if S_ISLNK(st.st_mode):
+            # Symbolic links have neither their own permissions nor ACLs.
+            return
+        isDirectory = S_ISDIR(st.st_mode)
+        newMode = dirMode if isDirectory else mode
+        # Changing the owner may clear the set-ID bits (like in 'chpropsMany').
+        modeChanged = newMode and ((st.st_mode & 07777) != newMode or ownerChanged)
+        if modeChanged:
+            os.chmod(path, newMode)
+            counts[TREE_PROPS_MODE] += 1
+        # The group permissions are the ACL mask, so a changed mode is checked
+        # by 'setfacl' again.
+        if aclEntries and (modeChanged or not _hasAclEntries(currentAcls.get(path), aclEntries, isDirectory)):
+            aclFixes.append((path, isDirectory))
+
+    def fixDir(dirPath):
+        counts = _newCounts()
+        subDirs = []
+        aclFixes = []
+        for (name, isDirectory, isLink) in scanDir(dirPath):
+            path = join(dirPath, name)
+            fixEntry(path, os.lstat(path), counts, aclFixes)
+            if isDirectory and not isLink:
+                subDirs.append(path)
+        return (subDirs, aclFixes, counts)
+
+    counts = _newCounts()
+    aclFixes = []
+    fixEntry(rootDir, os.lstat(rootDir), counts, aclFixes)
+    level = [rootDir]
+    pool = None
+    try:
+        while level:
+            if threads > 1 and len(level) > 1:
+                if pool is None:
+                    from multiprocessing.pool import ThreadPool
+                    pool = ThreadPool(threads)
+                results = pool.map(fixDir, level)
+            else:
+                results = map(fixDir, level)
+            level = []
+            for (subDirs, dirAclFixes, dirCounts) in results:
+                level.extend(subDirs)
+                aclFixes.extend(dirAclFixes)
+                for (key, value) in dirCounts.iteritems():
+                    counts[key] += value
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if aclFixes:
+        _setAcls(aclFixes, acl, aclEntries)
+        counts[TREE_PROPS_ACL] = len(aclFixes)
+    if counts[TREE_PROPS_OWNER] or counts[TREE_PROPS_MODE] or counts[TREE_PROPS_ACL]:
+        info("Fixed the properties in '" + rootDir + "' (" + str(counts[TREE_PROPS_SCANNED]) + " entries scanned): " +
+                str(counts[TREE_PROPS_OWNER]) + " owners, " + str(counts[TREE_PROPS_MODE]) + " modes and " +
+                str(counts[TREE_PROPS_ACL]) + " ACLs changed.")
+    return counts
+
+
+
+def _newCounts():
+    """
+    @returns    Zeroed counts of changes (see \ref fixTreeProps).
+    """
+    return {TREE_PROPS_SCANNED: 0, TREE_PROPS_OWNER: 0, TREE_PROPS_MODE: 0, TREE_PROPS_ACL: 0}
+
+
+
+###
+### ACL Helpers
+###
+
+# The short names of ACL tags (as accepted by 'setfacl').
+_ACL_TAGS = {'u': 'user', 'user': 'user', 'g': 'group', 'group': 'group', 'm': 'mask', 'mask': 'mask', 'o': 'other', 'other': 'other'}
+
+# The escapes of special characters in the output of 'getfacl'.
+_ACL_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+def _parseAclSpec(spec):
+    """
+    @param  spec    ACL entries in the syntax of 'setfacl -m'.
+
+    @returns    A dictionary of normalised ACL entries (as printed by 'getfacl
+                --numeric', e.g. 'default:user:48' -> 'r-x').
+    """
+    entries = {}
+    for item in spec.split(','):
+        parts = item.strip().split(':')
+        if parts == ['']:
+            continue
+        prefix = ''
+        if parts[0] in ('d', 'default'):
+            prefix = 'default:'
+            parts = parts[1:]
+        if len(parts) == 2:
+            # 'mask' and 'other' entries may omit the qualifier.
+            parts.insert(1, '')
+        if len(parts) != 3 or parts[0] not in _ACL_TAGS:
+            raise ValueError("Invalid ACL entry '" + item + "'.")
+        (tag, qualifier, perms) = (_ACL_TAGS[parts[0]], parts[1], parts[2])
+        if qualifier and tag in ('user', 'group'):
+            qualifierId = getUid(qualifier) if tag == 'user' else getGid(qualifier)
+            if qualifierId is None:
+                raise IOError("The " + tag + " '" + qualifier + "' does not exist.")
+            qualifier = str(qualifierId)
+        entries[prefix + tag + ':' + qualifier] = _normalizeAclPerms(perms, item)
+    return entries
+
+def _normalizeAclPerms(perms, item):
+    """
+    @returns    The permissions in the 'rwx' form (e.g. 'rx' -> 'r-x',
+                '6' -> 'rw-').
+    """
+    if perms.isdigit() and len(perms) == 1 and int(perms) < 8:
+        bits = int(perms)
+        return ('r' if bits & 4 else '-') + ('w' if bits & 2 else '-') + ('x' if bits & 1 else '-')
+    if perms.strip('rwx-'):
+        raise ValueError("Unsupported permissions in the ACL entry '" + item + "'.")
+    return ''.join([c if c in perms else '-' for c in 'rwx'])
+
+def _getTreeAcls(rootDir):
+    """
+    @returns    A dictionary from paths in the tree to the dictionaries of their
+                ACL entries (see \ref _parseAclSpec). The ACLs are read with a
+                single 'getfacl -R' call.
+    """
+    (retcode, output) = runCmdGetString('getfacl', '--recursive', '--physical', '--absolute-names', '--numeric', '--', rootDir)
+    if retcode != 0:
+        raise IOError("Could not read the ACLs in '" + rootDir + "'.")
+    acls = {}
+    entries = None
+    for line in output.splitlines():
+        if line.startswith('# file: '):
+            entries = {}
+            acls[_ACL_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), line[8:])] = entries
+        elif line and not line.startswith('#') and entries is not None:
+            # Strip the '#effective:' comments.
+            (entry, perms) = line.split('#', 1)[0].strip().rsplit(':', 1)
+            entries[entry] = perms
+    return acls
+
+def _hasAclEntries(current, wanted, isDirectory):
+    """
+    @returns    'True' iff the ACL 'current' contains all the 'wanted' entries
+                (default entries are checked on directories only).
+    """
+    if current is None:
+        return False
+    for (entry, perms) in wanted.iteritems():
+        if (isDirectory or not entry.startswith('default:')) and current.get(entry) != perms:
+            return False
+    return True
+
+def _setAcls(paths, spec, wanted):
+    """
+    Runs 'setfacl -m' on the given '(path, isDirectory)' pairs, many paths per
+    call.
+    """
+    fileSpec = ','.join([entry + ':' + perms for (entry, perms) in sorted(wanted.iteritems()) if not entry.startswith('default:')])
+    for (isDirectory, aclSpec) in ((True, spec), (False, fileSpec)):
+        batch = [path for (path, pathIsDir) in paths if pathIsDir == isDirectory]
+        if not aclSpec:
+            continue
+        for i in xrange(0, len(batch), TREE_PROPS_SETFACL_BATCH):
+            (retcode, _) = runCmdGetString('setfacl', '-m', aclSpec, '--', batch[i:i + TREE_PROPS_SETFACL_BATCH])
+            if retcode != 0:
+                raise IOError("Could not set the ACLs in '" + batch[i] + "' and " + str(len(batch[i:i + TREE_PROPS_SETFACL_BATCH]) - 1) + " other entries.")
@@ -31,9 +31,9 @@
 
 import logging
 import os
-import subprocess
 import sys
-from inspect import isclass
+import thread
+import types
 from logging import Formatter
 from logging import StreamHandler
 from logging import info
@@ -48,7 +48,6 @@ from os import makedirs
 from os import remove
 from os import rmdir
 from os import symlink
-from os import walk
 from os.path import abspath
 from os.path import basename
 from os.path import dirname
@@ -59,14 +58,18 @@ from os.path import lexists
 from os.path import relpath
 from os.path import samefile
 from os.path import split
-from shutil import copy2
-from shutil import move
-from subprocess import PIPE
-from subprocess import Popen
-from tempfile import mkdtemp
-from tempfile import mkstemp
 from time import strftime
 
+# 'os.scandir' is new in Python 3.5, the 'scandir' package provides it for older
+# versions.
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
 
 
 ###
@@ -82,6 +85,29 @@ UTILS_CREATE_LINK_COPY=4
 UTILS_CREATE_LINK_MOVE=8
 UTILS_CREATE_LINK_ABS=16
 UTILS_CREATE_LINK_MAKE_TARGET_DIRS=32
+UTILS_CREATE_LINK_COMPARE=64
+
+"""
+The default number of threads that 'linkDirTree' uses to move files.
+"""
+UTILS_LINK_DIR_TREE_THREADS=4
+
+"""
+How durable the atomic writes of a run are (see \ref writeFileAtomically):
+
+    -   'none': the data are renamed into place without any syncing (a crash may
+        leave an empty or an old file).
+
+    -   'batched': the renames are remembered and all the touched file systems
+        are synced once at the end of the run (see \ref syncPendingWrites).
+
+    -   'strict': every file and its directory are synced before the write
+        returns.
+"""
+UTILS_DURABILITY_NONE="none"
+UTILS_DURABILITY_BATCHED="batched"
+UTILS_DURABILITY_STRICT="strict"
+UTILS_DURABILITY_MODES=(UTILS_DURABILITY_NONE, UTILS_DURABILITY_BATCHED, UTILS_DURABILITY_STRICT)
 
 
 
@@ -175,7 +201,9 @@ def getClassFQName(cls):
     @returns    The fully qualified name of the given class (or 'None' if 'cls'
                 is not a class at all.
     """
-    if isclass(cls):
+    # The same check as 'inspect.isclass' (the 'inspect' module is expensive to
+    # import).
+    if isinstance(cls, (type, types.ClassType)):
         return cls.__module__ + "." + cls.__name__
     return None
 
@@ -193,10 +221,287 @@ def appendLinesToFile(filePath, *lines):
 
     @returns    The number of lines printed.
     """
-    fd = open(joinPaths(filePath), 'a')
-    count = invokeForEach(lambda s, i: fd.write(s.__str__()) or fd.write('\n'), lines)
-    fd.close()
-    return count
+    lines = [line.__str__() for line in flatten(lines)]
+    _appendToFile(joinPaths(filePath), ''.join([line + '\n' for line in lines]), False)
+    return len(lines)
+
+def ensureLinesInFile(filePaths, lines, header=None):
+    """
+    Appends the lines that are missing in the given files. A line is present if
+    some line of the file equals it (ignoring the leading and trailing
+    whitespace). The files are searched through 'mmap' (without reading them
+    into lists of lines) and the missing lines are appended with a single
+    'O_APPEND' write per file.
+
+    @param  filePaths   The path (or a list of paths) to the files. Files that
+                        do not exist are created.
+
+    @param  lines   A list of lines that must be in the files. Missing lines
+                    are appended as given (only the whitespace around them is
+                    ignored when looking for them). Duplicates and empty lines
+                    are ignored.
+
+    @param  header  <b>[Optional]</b> A list of lines to write before the
+                    missing lines (e.g. an empty line and a comment). It is
+                    written only if some lines are missing.
+
+    @returns    The list of files to which lines were appended.
+    """
+    # Every line is appended at most once (empty lines are always "present",
+    # use the header for those).
+    uniqueLines = []
+    keys = set()
+    for line in flatten(lines):
+        line = line.__str__().rstrip('\r\n')
+        key = line.strip()
+        if key and key not in keys:
+            keys.add(key)
+            uniqueLines.append((key, line))
+    changed = []
+    for filePath in _getFilePaths(filePaths):
+        missing = [line for (key, line) in uniqueLines if not _containsLine(filePath, key)]
+        if missing:
+            _appendToFile(filePath, ''.join([line + '\n' for line in flatten(header or [], missing)]))
+            info("Appended " + str(len(missing)) + " lines to '" + filePath + "'.")
+            changed.append(filePath)
+    return changed
+
+def ensureBlockInFile(filePaths, block):
+    """
+    Appends the given block of text to the files that do not contain it yet (as
+    a verbatim substring). The files are searched through 'mmap' and the block
+    is appended with a single 'O_APPEND' write per file.
+
+    @param  filePaths   The path (or a list of paths) to the files. Files that
+                        do not exist are created.
+
+    @param  block   The block of text (a string or a list of lines).
+
+    @returns    The list of files to which the block was appended.
+    """
+    if isinstance(block, (list, tuple)):
+        block = ''.join([line.__str__() + '\n' for line in flatten(block)])
+    changed = []
+    for filePath in _getFilePaths(filePaths):
+        if _findInFile(filePath, lambda data, size: data.find(block) >= 0) is not True:
+            _appendToFile(filePath, block)
+            info("Appended a block of " + str(block.count('\n')) + " lines to '" + filePath + "'.")
+            changed.append(filePath)
+    return changed
+
+def _getFilePaths(filePaths):
+    """
+    @returns    The list of paths given either as a single path or as a list of
+                paths (each of which is joined with \ref joinPaths).
+    """
+    if isinstance(filePaths, basestring):
+        filePaths = [filePaths]
+    return [joinPaths(filePath) for filePath in filePaths]
+
+def _findInFile(filePath, search):
+    """
+    @param  search  A function '(data, size) -> result' that searches the
+                    memory map of the file ('data').
+
+    @returns    The result of 'search' or None if the file is empty or does not
+                exist.
+    """
+    import mmap
+    try:
+        fd = os.open(filePath, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        size = os.fstat(fd).st_size
+        if not size:
+            return None
+        data = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        try:
+            return search(data, size)
+        finally:
+            data.close()
+    finally:
+        close(fd)
+
+def _containsLine(filePath, line):
+    """
+    @returns    'True' iff a line of the file equals 'line' (ignoring the
+                leading and trailing whitespace of the file's lines).
+    """
+    def search(data, size):
+        i = data.find(line)
+        while i >= 0:
+            start = i
+            while start > 0 and data[start - 1] in ' \t':
+                start -= 1
+            end = i + len(line)
+            while end < size and data[end] in ' \t\r':
+                end += 1
+            if (start == 0 or data[start - 1] == '\n') and (end == size or data[end] == '\n'):
+                return True
+            i = data.find(line, i + 1)
+        return False
+    return bool(line) and _findInFile(filePath, search) is True
+
+def _appendToFile(filePath, text, endLine=True):
+    """
+    Appends the text to the file (which is created if it does not exist) with a
+    single 'O_APPEND' write. If 'endLine' is 'True', a new line is inserted
+    first if the file does not end with one.
+    """
+    fd = os.open(filePath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0666)
+    try:
+        if endLine and _findInFile(filePath, lambda data, size: data[size - 1] != '\n'):
+            text = '\n' + text
+        while text:
+            text = text[os.write(fd, text):]
+    finally:
+        close(fd)
+
+def writeFileAtomically(filePath, data, mode=None, durability=None):
+    """
+    Replaces the file with new contents atomically: the contents are written to
+    a temporary file in the same directory, which is then renamed over the
+    file. Readers see either the old or the new contents, never a partial
+    file.
+
+    @param  filePath    The path to the file.
+
+    @param  data    The new contents (a string) or a function that is given
+                    the open temporary file and writes the contents into it.
+
+    @param  mode    <b>[Optional]</b> The permissions of the file. By default
+                    the permissions of the replaced file are kept (new files
+                    get 0644 minus the umask).
+
+    @param  durability  <b>[Optional]</b> One of \ref UTILS_DURABILITY_MODES.
+                        Default is the mode of the run (see \ref
+                        setDurability).
+    """
+    from tempfile import mkstemp
+    filePath = joinPaths(filePath)
+    durability = durability or _durability
+    dirPath = dirname(filePath) or '.'
+    if mode is None:
+        try:
+            mode = os.stat(filePath).st_mode & 07777
+        except OSError:
+            mode = 0644 & ~_umask
+    (fd, tmpPath) = mkstemp('', '.' + basename(filePath) + '.', dirPath)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if callable(data):
+                data(f)
+            else:
+                f.write(data)
+            f.flush()
+            if durability == UTILS_DURABILITY_STRICT:
+                os.fsync(f.fileno())
+        chmod(tmpPath, mode)
+        os.rename(tmpPath, filePath)
+    except:
+        try:
+            remove(tmpPath)
+        except OSError:
+            pass
+        raise
+    if durability == UTILS_DURABILITY_STRICT:
+        syncDir(dirPath)
+    elif durability == UTILS_DURABILITY_BATCHED:
+        with _pendingSyncLock:
+            _pendingSyncDirs.add(dirPath)
+
+def syncDir(dirPath):
+    """
+    Makes the entries of the given directory (e.g. a renamed file) durable.
+    """
+    fd = os.open(dirPath, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        close(fd)
+
+def setDurability(durability):
+    """
+    Sets the durability mode of all atomic writes in this run (see \ref
+    UTILS_DURABILITY_MODES).
+    """
+    global _durability
+    if durability not in UTILS_DURABILITY_MODES:
+        raise ValueError("Unknown durability mode '" + str(durability) + "'. Use one of: " + ', '.join(UTILS_DURABILITY_MODES) + ".")
+    _durability = durability
+
+def getDurability():
+    """
+    @returns    The durability mode of the atomic writes in this run.
+    """
+    return _durability
+
+def syncPendingWrites():
+    """
+    Makes all atomic writes that were done in the 'batched' durability mode
+    durable. Every touched file system is synced once (through 'syncfs', or
+    'sync' where 'syncfs' is not available).
+
+    @returns    The number of synced file systems.
+    """
+    with _pendingSyncLock:
+        dirPaths = list(_pendingSyncDirs)
+        _pendingSyncDirs.clear()
+    if not dirPaths:
+        return 0
+    libc = _getLibc()
+    if libc is None or not hasattr(libc, 'syncfs'):
+        if libc is not None:
+            libc.sync()
+        else:
+            runCmd('sync')
+        return 1
+    synced = set()
+    for dirPath in dirPaths:
+        try:
+            fd = os.open(dirPath, os.O_RDONLY)
+        except OSError:
+            # The directory has been removed since.
+            continue
+        try:
+            dev = os.fstat(fd).st_dev
+            if dev not in synced:
+                if libc.syncfs(fd) != 0:
+                    import ctypes
+                    err = ctypes.get_errno()
+                    raise OSError(err, os.strerror(err), dirPath)
+                synced.add(dev)
+        finally:
+            close(fd)
+    return len(synced)
+
+def _getLibc():
+    """
+    @returns    The C library loaded through 'ctypes' (or None if it cannot be
+                loaded).
+    """
+    global _libc
+    if _libc is None:
+        try:
+            import ctypes
+            import ctypes.util
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        except (ImportError, OSError):
+            _libc = False
+    return _libc or None
+
+# The durability mode of the run and the directories of the atomic writes that
+# have not been synced yet (see 'writeFileAtomically').
+_durability = UTILS_DURABILITY_BATCHED
+_pendingSyncDirs = set()
+_pendingSyncLock = thread.allocate_lock()
+_libc = None
+
+# The umask of the process. It can only be read by setting it, which must not
+# happen while other threads create files, so it is read once on import.
+_umask = os.umask(022)
+os.umask(_umask)
 
 def shredRemoveFiles(*fileNames):
     """
@@ -234,12 +539,23 @@ def makeBackup(fileName, tarDir = None):
                         backup.
 
     @returns            The name of the newly created backup.
+
+    If a backup store is configured (see \link homelib.backupstore \endlink)
+    and no 'tarDir' is given, files and symbolic links are moved into the
+    store instead.
     """
+    from shutil import move
+    if tarDir is None and lexists(fileName) and not (isdir(fileName) and not os.path.islink(fileName)):
+        from homelib.backupstore import getDefaultBackupStore
+        store = getDefaultBackupStore()
+        if store:
+            return store.backup(fileName)
     if isdir(fileName):
         (dirPath, name) = split(fileName)
         backupName = createTmpDir(name, tarDir or dirPath)
         rmdir(backupName)
         move(fileName, backupName)
+        forgetDirs(fileName)
         info("Backed up directory '" + fileName + "' as '" + backupName + "'.")
         return backupName
     elif lexists(fileName):
@@ -286,6 +602,11 @@ def makeBackup(fileName, tarDir = None):
 #      32  - Create the target directory (if it doesn't exists).
 #            Variable: \ref UTILS_CREATE_LINK_MAKE_TARGET_DIRS.
 #
+#      64  - When copying, compare the contents of an existing target with
+#            the source first and keep the target (only its mode, owner and
+#            group are set) if they are the same.
+#            Variable: \ref UTILS_CREATE_LINK_COMPARE.
+#
 #@param  mode    <b>[Optional]</b> The permissions mode with which to create
 #                the link (only works on hard links and copies).
 #
@@ -294,6 +615,10 @@ def makeBackup(fileName, tarDir = None):
 #
 #@param  group   <b>[Optional]</b> The group of the link (only works on hard
 #                links and copies).
+#
+#@returns    'False' if the target already was the requested link (or an
+#            identical copy) with the requested mode, owner and group, and was
+#            left untouched. 'True' otherwise.
 def createLink(srcFile, tarPath=".", options=0, mode=None, owner=None, group=None):
     """
     Creates a link, copies or moves the source file to the target.
@@ -329,6 +654,11 @@ def createLink(srcFile, tarPath=".", options=0, mode=None, owner=None, group=Non
           32  - Create the target directory (if it doesn't exists).
                 Variable: \ref UTILS_CREATE_LINK_MAKE_TARGET_DIRS.
 
+          64  - When copying, compare the contents of an existing target with
+                the source first and keep the target (only its mode, owner
+                and group are set) if they are the same.
+                Variable: \ref UTILS_CREATE_LINK_COMPARE.
+
     @param  mode    <b>[Optional]</b> The permissions mode with which to create
                     the link (only works on hard links and copies).
 
@@ -337,6 +667,10 @@ def createLink(srcFile, tarPath=".", options=0, mode=None, owner=None, group=Non
 
     @param  group   <b>[Optional]</b> The group of the link (only works on hard
                     links and copies).
+
+    @returns    'False' if the target already was the requested link (or an
+                identical copy) with the requested mode, owner and group, and
+                was left untouched. 'True' otherwise.
     """
     linkPath = None
 
@@ -354,26 +688,84 @@ def createLink(srcFile, tarPath=".", options=0, mode=None, owner=None, group=Non
     else:
         linkPath = tarPath
 
-    # Now we have the path of the link. Check that it does not clash with an
-    # existing file.
+    # Now we have the path of the link. If it is already exactly what we would
+    # create, leave it alone (no backups or deletions on reruns).
+    options = options or 0
+    if isLinkUpToDate(srcFile, linkPath, options, mode, owner, group):
+        info("Up to date: '" + linkPath + "'.")
+        return False
+    placeLink(srcFile, linkPath, options, mode, owner, group)
+    return True
+
+def placeLink(srcFile, linkPath, options=0, mode=None, owner=None, group=None, linkExists=None):
+    """
+    Does the actual work of \ref createLink: backs up (or deletes) whatever is
+    at 'linkPath' and creates the link, copy or moves the file there. Unlike
+    \ref createLink it does not resolve the paths, validate the source or
+    check whether the target is already up to date.
+
+    @param  srcFile     The path to the source file.
+
+    @param  linkPath    The full path of the link (not its directory).
+
+    @param  options     The same as in \ref createLink.
+
+    @param  mode        The same as in \ref createLink.
+
+    @param  owner       The same as in \ref createLink.
+
+    @param  group       The same as in \ref createLink.
+
+    @param  linkExists  <b>[Optional]</b> Whether something already exists at
+                        'linkPath' (if the caller already knows). If not
+                        given, it is checked.
+    """
     options = options or 0
-    if lexists(linkPath):
+    if linkExists is None:
+        linkExists = lexists(linkPath)
+
+    # Do not rewrite a copy that already has the right contents.
+    if linkExists and (options & UTILS_CREATE_LINK_COPY) and (options & UTILS_CREATE_LINK_COMPARE):
+        linkStat = os.lstat(linkPath)
+        from stat import S_ISREG
+        if S_ISREG(linkStat.st_mode) and linkStat.st_size == os.stat(srcFile).st_size and haveSameContents(srcFile, linkPath):
+            info("The copy '" + linkPath + "' of '" + srcFile + "' is up to date.")
+            chprops(linkPath, mode, owner, group)
+            return
+
+    # Check that it does not clash with an existing file.
+    if linkExists:
         # Okay, the link path clashes with an existing file. Depending on
         # the options delete or backup the clashing file:
         if options & UTILS_CREATE_LINK_DELETE:
             remove(linkPath)
+            forgetDirs(linkPath)
             info("Removed file '" + linkPath + "'.")
         else:
             makeBackup(linkPath)
     elif options & UTILS_CREATE_LINK_MAKE_TARGET_DIRS:
         # The target path does not exist and the user wants us to create any
         # non-existing target directories. Well, make it so.
-        try:
-            makedirs(dirname(linkPath))
-        except:
-            pass
+        ensureDir(dirname(linkPath))
 
     # Done, now either create a link or a copy:
+    try:
+        _makeLink(srcFile, linkPath, options)
+    except (IOError, OSError) as ex:
+        # The target directory may have been removed since 'ensureDir' saw it
+        # (e.g. by an external command). Create it again and retry once.
+        from errno import ENOENT
+        if ex.errno != ENOENT or linkExists or not (options & UTILS_CREATE_LINK_MAKE_TARGET_DIRS) or isdir(dirname(linkPath)):
+            raise
+        forgetDirs(dirname(linkPath))
+        ensureDir(dirname(linkPath))
+        _makeLink(srcFile, linkPath, options)
+    chprops(linkPath, mode, owner, group)
+
+def _makeLink(srcFile, linkPath, options):
+    """
+    Creates the link, the copy or moves the file (see \ref placeLink).
+    """
     srcFile = abspath(srcFile)
     if options & UTILS_CREATE_LINK_HARD_LINK:
         # Create a hard link
@@ -381,11 +773,13 @@ def createLink(srcFile, tarPath=".", options=0, mode=None, owner=None, group=Non
         info("Hardlinked: '" + linkPath + "' ==> '" + srcFile + "'.")
     elif options & UTILS_CREATE_LINK_COPY:
         # Create a copy
-        copy2(srcFile, linkPath)
+        copyFile(srcFile, linkPath)
         info("Copied file '" + srcFile + "' to '" + linkPath + "'.")
     elif options & UTILS_CREATE_LINK_MOVE:
         # Simply move the file
+        from shutil import move
         move(srcFile, linkPath)
+        forgetDirs(srcFile)
         info("Moved file '" + srcFile + "' to '" + linkPath + "'.")
     else:
         # Create a symbolic link
@@ -394,7 +788,41 @@ def createLink(srcFile, tarPath=".", options=0, mode=None, owner=None, group=Non
             srcFile = relpath(srcFile, dirname(linkPath))
         symlink(srcFile, linkPath)
         info("Symlinked: '" + linkPath + "' --> '" + srcFile + "'.")
-    chprops(linkPath, mode, owner, group)
+
+def copyFile(srcFile, tarFile, copyStat=True):
+    """
+    Copies the contents (and by default the permission bits and times) of a
+    file like 'shutil.copy2', but lets the kernel do the copying where
+    possible. These methods are tried in order:
+
+        1. a reflink (the 'FICLONE' ioctl, on e.g. Btrfs or XFS), which shares
+           the data blocks of the source until one of the files changes,
+
+        2. 'copy_file_range' (which may be done by the file system or the
+           storage itself),
+
+        3. 'sendfile',
+
+        4. copying through Python buffers ('shutil.copyfileobj').
+
+    @param  srcFile     The file to copy.
+
+    @param  tarFile     The path of the copy (not a directory).
+
+    @param  copyStat    <b>[Optional]</b> Whether to copy the permission bits
+                        and times as well ('True' by default).
+    """
+    with open(srcFile, 'rb') as src:
+        with open(tarFile, 'wb') as dst:
+            size = os.fstat(src.fileno()).st_size
+            # Files that report no size (e.g. in '/proc' or '/sys') may still
+            # have contents, which the kernel would not copy.
+            if not (size and _copyFileData(src.fileno(), dst.fileno(), size)):
+                from shutil import copyfileobj
+                copyfileobj(src, dst)
+    if copyStat:
+        from shutil import copystat
+        copystat(srcFile, tarFile)
 
 ##
 #Makes all parent subdirectories for the given path.
@@ -409,11 +837,67 @@ def mymakedirs(*path):
     @param path    A list of directory names in the directory structure that should
                    be made. Note that these names are first joined (via
                    \ref joinPaths).
+
+    @throws OSError if the directory could not be created (see \ref ensureDir).
     """
-    try:
-        makedirs(joinPaths(path))
-    except:
-        pass
+    ensureDir(joinPaths(path))
+
+def ensureDir(dirPath):
+    """
+    Creates the directory (and its parents) unless it exists. Directories that
+    are known to exist (because they have been checked or created earlier in
+    this run) are not checked again.
+
+    @param  dirPath The path to the directory.
+
+    @returns    'True' iff the directory has been created.
+
+    @throws OSError if the directory could not be created (e.g. a file is in
+            the way or the permissions are missing).
+    """
+    from errno import EEXIST
+    dirPath = abspath(dirPath)
+    if dirPath in _knownDirs:
+        return False
+    created = False
+    if not isdir(dirPath):
+        try:
+            makedirs(dirPath)
+            created = True
+        except OSError as ex:
+            # Another thread might have created it in the meantime.
+            if ex.errno != EEXIST or not isdir(dirPath):
+                raise
+    # The parents exist too.
+    while dirPath not in _knownDirs:
+        _knownDirs.add(dirPath)
+        dirPath = dirname(dirPath)
+    return created
+
+def forgetDirs(path):
+    """
+    Forgets that the given directory and the directories below it exist (see
+    \ref ensureDir). Must be called when a directory is moved or removed,
+    unless it is removed by HomeLib itself (e.g. by \ref makeBackup). Links
+    created with 'UTILS_CREATE_LINK_MAKE_TARGET_DIRS' recreate their target
+    directory even if it was not forgotten.
+    """
+    path = abspath(path)
+    prefix = join(path, '')
+    for dirPath in list(_knownDirs):
+        if dirPath == path or dirPath.startswith(prefix):
+            _knownDirs.discard(dirPath)
+
+def clearKnownDirs():
+    """
+    Forgets all directories known to exist (at the start of every script run).
+    """
+    _knownDirs.clear()
+
+# The absolute paths of the directories that are known to exist (see
+# 'ensureDir'). Adding and discarding elements of a set is atomic, so the set
+# is not locked.
+_knownDirs = set()
 
 ##
 #Changes the most common attributes of a file.
@@ -433,33 +917,310 @@ def chprops(filePath, mode=None, owner=None, group=None):
 
     @param   mode    <b>[Optional]</b> The new permissions.
 
-    @param   owner   <b>[Optional]</b> The new owner.
+    @param   owner   <b>[Optional]</b> The new owner: a user name, a user ID
+                     (an integer or a numeric string) or 'user:group' (like
+                     with the 'chown' command).
 
-    @param   group   <b>[Optional]</b> The new group.
+    @param   group   <b>[Optional]</b> The new group: a group name or a group
+                     ID.
     """
-    if mode or owner or group:
-        if not exists(filePath):
-            raise IOError("The path '" + filePath + "' does not exist.")
+    chpropsMany([filePath], mode, owner, group)
+
+##
+#Changes the most common attributes of many files (with one name lookup).
+#
+#@param   filePaths   The files for which to update the attributes.
+#
+#@param   mode    <b>[Optional]</b> The new permissions.
+#
+#@param   owner   <b>[Optional]</b> The new owner (see \ref chprops).
+#
+#@param   group   <b>[Optional]</b> The new group (see \ref chprops).
+#
+#@returns The number of files that have been changed.
+def chpropsMany(filePaths, mode=None, owner=None, group=None):
+    """
+    Changes the most common attributes of many files. The names of the owner
+    and the group are resolved only once (and cached) and no external commands
+    are run. Attributes that are already set are not touched.
 
-        if isinstance(owner, str):
-            runCmd('chown', owner, filePath)
-        elif isinstance(owner, int):
-            chown(filePath, owner, -1)
+    @param   filePaths   The files for which to update the attributes.
 
-        if isinstance(group, str):
-            runCmd('chgrp', group, filePath)
-        elif isinstance(group, int):
-            chown(filePath, -1, group)
+    @param   mode    <b>[Optional]</b> The new permissions.
 
-        mode = int(mode)
-        if mode:
-            chmod(filePath, mode)
+    @param   owner   <b>[Optional]</b> The new owner (see \ref chprops).
 
-        info("Changed the attributes of '" + filePath + "'." +
+    @param   group   <b>[Optional]</b> The new group (see \ref chprops).
+
+    @returns The number of files that have been changed.
+    """
+    mode = int(mode) if mode else None
+    if not mode and owner in (None, '') and group in (None, ''):
+        return 0
+    (uid, gid) = resolveOwnership(owner, group)
+    changed = []
+    for filePath in filePaths:
+        try:
+            st = os.stat(filePath)
+        except OSError:
+            raise IOError("The path '" + filePath + "' does not exist.")
+        changeUid = uid if uid != -1 and uid != st.st_uid else -1
+        changeGid = gid if gid != -1 and gid != st.st_gid else -1
+        if changeUid != -1 or changeGid != -1:
+            chown(filePath, changeUid, changeGid)
+        # Set the mode after the owner ('chown' may clear the set-ID bits).
+        if mode and ((st.st_mode & 07777) != mode or changeUid != -1 or changeGid != -1):
+            chmod(filePath, mode)
+        elif changeUid == -1 and changeGid == -1:
+            continue
+        changed.append(filePath)
+    if changed:
+        info("Changed the attributes of " + (("'" + changed[0] + "'") if len(changed) == 1 else (str(len(changed)) + " files")) + "." +
                 ((' Mode: {0:o}'.format(mode)) if mode else '') +
-                ((" Owner: " + owner.__str__()) if owner else '') +
-                ((" Group: " + group.__str__()) if group else '')
+                ((" Owner: " + owner.__str__()) if owner not in (None, '') else '') +
+                ((" Group: " + group.__str__()) if group not in (None, '') else '')
             )
+    return len(changed)
+
+def isLinkUpToDate(srcFile, linkPath, options=0, mode=None, owner=None, group=None, statCache=None):
+    """
+    Checks whether \ref createLink would leave the target untouched.
+
+    The parameters are the same as in \ref createLink (but 'linkPath' is the
+    full path of the link, not its directory) plus:
+
+    @param  statCache   <b>[Optional]</b> An object with the methods 'stat' and
+                        'lstat' (e.g. \link homelib.linkplan.StatCache
+                        \endlink) that is used instead of 'os.stat' and
+                        'os.lstat'.
+
+    @returns    'True' iff 'createLink' with the given arguments would produce
+                exactly what is already at 'linkPath':
+
+                    hard link - the same inode as the source file,
+
+                    copy      - a regular file with the same size and either
+                                the same modification time or the same
+                                contents as the source file,
+
+                    symlink   - a symbolic link with the same target path,
+
+                and the mode, owner and group (if given) already match. Moves
+                are never up to date (the source file has to go).
+    """
+    if options & UTILS_CREATE_LINK_MOVE:
+        return False
+    statFile = statCache.stat if statCache else os.stat
+    try:
+        linkStat = statCache.lstat(linkPath) if statCache else os.lstat(linkPath)
+    except OSError:
+        return False
+    srcFile = abspath(srcFile)
+    if options & UTILS_CREATE_LINK_HARD_LINK:
+        srcStat = statFile(srcFile)
+        if (linkStat.st_dev, linkStat.st_ino) != (srcStat.st_dev, srcStat.st_ino):
+            return False
+    elif options & UTILS_CREATE_LINK_COPY:
+        from stat import S_ISREG
+        srcStat = statFile(srcFile)
+        if not S_ISREG(linkStat.st_mode) or linkStat.st_size != srcStat.st_size:
+            return False
+        if linkStat.st_mtime != srcStat.st_mtime and not haveSameContents(srcFile, linkPath):
+            return False
+    else:
+        from stat import S_ISLNK
+        if not (options & UTILS_CREATE_LINK_ABS):
+            srcFile = relpath(srcFile, dirname(linkPath))
+        if not S_ISLNK(linkStat.st_mode) or os.readlink(linkPath) != srcFile:
+            return False
+    return _havePropsMatch(statFile(linkPath), mode, owner, group)
+
+# The 'FICLONE' ioctl request (from 'linux/fs.h').
+_FICLONE = 0x40049409
+
+# See '_getKernelCopyFunctions'.
+_kernelCopyFunctions = None
+
+def _copyFileData(srcFd, dstFd, size):
+    """
+    Copies the contents of the source file to the (empty) target file using
+    the kernel. The data are copied until the end of the source file (even if
+    it has grown past 'size' in the meantime).
+
+    @returns    'False' if the kernel could not copy the data (in which case
+                nothing has been written to the target file).
+    """
+    from errno import EBADF, EINVAL, ENOSYS, ENOTTY, EOPNOTSUPP, ETXTBSY, EXDEV
+    unsupported = (EBADF, EINVAL, ENOSYS, EOPNOTSUPP, ETXTBSY, EXDEV)
+    # A reflink: the copy shares the data blocks with the source.
+    try:
+        import fcntl
+        fcntl.ioctl(dstFd, _FICLONE, srcFd)
+        return True
+    except (IOError, OSError) as ex:
+        if ex.errno not in unsupported + (ENOTTY,):
+            raise
+    for copyChunk in _getKernelCopyFunctions():
+        copied = 0
+        try:
+            while True:
+                n = copyChunk(srcFd, dstFd, max(size - copied, 1024 * 1024))
+                if n == 0:
+                    return True
+                copied += n
+        except OSError as ex:
+            # Fall back to the next method only if nothing has been copied.
+            if copied or ex.errno not in unsupported:
+                raise
+    return False
+
+def _getKernelCopyFunctions():
+    """
+    @returns    A list of functions '(srcFd, dstFd, count) -> copied bytes'
+                that copy data in the kernel ('copy_file_range' and
+                'sendfile'), from the 'os' module or, on older Pythons,
+                through 'ctypes'.
+    """
+    global _kernelCopyFunctions
+    if _kernelCopyFunctions is None:
+        functions = []
+        if hasattr(os, 'copy_file_range'):
+            functions.append(os.copy_file_range)
+        if hasattr(os, 'sendfile'):
+            functions.append(lambda srcFd, dstFd, count: os.sendfile(dstFd, srcFd, None, count))
+        if not functions:
+            functions = _getLibcCopyFunctions()
+        _kernelCopyFunctions = functions
+    return _kernelCopyFunctions
+
+def _getLibcCopyFunctions():
+    """
+    @returns    The 'copy_file_range' and 'sendfile' functions of the C library
+                (those that are available) wrapped like in
+                '_getKernelCopyFunctions'.
+    """
+    import ctypes
+    libc = _getLibc()
+    if libc is None:
+        return []
+
+    def wrap(call):
+        def copyChunk(srcFd, dstFd, count):
+            n = call(srcFd, dstFd, count)
+            if n < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+            return n
+        return copyChunk
+
+    functions = []
+    if hasattr(libc, 'copy_file_range'):
+        libc.copy_file_range.restype = ctypes.c_ssize_t
+        libc.copy_file_range.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint]
+        functions.append(wrap(lambda srcFd, dstFd, count: libc.copy_file_range(srcFd, None, dstFd, None, count, 0)))
+    if hasattr(libc, 'sendfile'):
+        libc.sendfile.restype = ctypes.c_ssize_t
+        libc.sendfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+        functions.append(wrap(lambda srcFd, dstFd, count: libc.sendfile(dstFd, srcFd, None, count)))
+    return functions
+
+def haveSameContents(fileA, fileB, bufferSize=1024 * 1024):
+    """
+    @returns    'True' iff the two files have the same contents.
+    """
+    with open(fileA, 'rb') as a:
+        with open(fileB, 'rb') as b:
+            while True:
+                bufA = a.read(bufferSize)
+                if bufA != b.read(bufferSize):
+                    return False
+                if not bufA:
+                    return True
+
+def _havePropsMatch(st, mode=None, owner=None, group=None):
+    """
+    @param  st  The result of 'os.stat' of the file.
+
+    @returns    'True' iff 'chprops' with the given arguments would not change
+                the file (the file's mode, owner and group already are what
+                they would be set to).
+    """
+    if mode and (st.st_mode & 07777) != int(mode):
+        return False
+    try:
+        (uid, gid) = resolveOwnership(owner, group)
+    except IOError:
+        return False
+    return uid in (-1, st.st_uid) and gid in (-1, st.st_gid)
+
+def resolveOwnership(owner, group):
+    """
+    @param  owner   See \ref chprops.
+
+    @param  group   See \ref chprops.
+
+    @returns    A pair '(uid, gid)' for 'os.chown' (-1 stands for 'do not
+                change').
+
+    @throws IOError if the user or the group does not exist.
+    """
+    if isinstance(owner, basestring) and ':' in owner:
+        # The 'user:group' syntax of 'chown'.
+        (owner, ownerGroup) = owner.split(':', 1)
+        if group in (None, ''):
+            group = ownerGroup
+    uid = -1 if owner in (None, '') else getUid(owner)
+    gid = -1 if group in (None, '') else getGid(group)
+    if uid is None:
+        raise IOError("The user '" + str(owner) + "' does not exist.")
+    if gid is None:
+        raise IOError("The group '" + str(group) + "' does not exist.")
+    return (uid, gid)
+
+def getUid(user):
+    """
+    @returns    The user ID of the given user (a name, a numeric string or an
+                integer), or None if there is no such user. Names of existing
+                users are looked up only once.
+    """
+    if isinstance(user, (int, long)) or user.isdigit():
+        return int(user)
+    try:
+        return _uidCache[user]
+    except KeyError:
+        import pwd
+        try:
+            uid = pwd.getpwnam(user).pw_uid
+        except KeyError:
+            # Not cached: the user may be created later in the run.
+            return None
+        _uidCache[user] = uid
+        return uid
+
+def getGid(group):
+    """
+    @returns    The group ID of the given group (a name, a numeric string or an
+                integer), or None if there is no such group. Names of
+                existing groups are looked up only once.
+    """
+    if isinstance(group, (int, long)) or group.isdigit():
+        return int(group)
+    try:
+        return _gidCache[group]
+    except KeyError:
+        import grp
+        try:
+            gid = grp.getgrnam(group).gr_gid
+        except KeyError:
+            # Not cached: the group may be created later in the run.
+            return None
+        _gidCache[group] = gid
+        return gid
+
+# The caches of 'getUid' and 'getGid' (names of existing users and groups to
+# IDs).
+_uidCache = {}
+_gidCache = {}
 
 ##
 #   This method links to files within the source directory from the target
@@ -512,7 +1273,12 @@ def chprops(filePath, mode=None, owner=None, group=None):
 #                   and the corresponding sub-directory structure. If this
 #                   directory does not exist it will be created.
 #
-def linkDirTree(srcDir, tarDir):
+#   @param  threads <b>[Optional]</b> The number of threads that move the files
+#                   of the old directory into the source directory tree (one
+#                   directory at a time). Default is
+#                   \ref UTILS_LINK_DIR_TREE_THREADS.
+#
+def linkDirTree(srcDir, tarDir, threads=None):
     """
    This method links to files within the source directory from the target
    directory. However, this method does not produce links to files within the
@@ -563,13 +1329,17 @@ def linkDirTree(srcDir, tarDir):
    @param  tarDir  The directory where to place the folder, its links to files,
                    and the corresponding sub-directory structure. If this
                    directory does not exist it will be created.
+
+   @param  threads <b>[Optional]</b> The number of threads that move the files
+                   of the old directory into the source directory tree (one
+                   directory at a time). Default is
+                   \ref UTILS_LINK_DIR_TREE_THREADS.
     """
     srcDir = joinPaths(srcDir)
     tarDir = joinPaths(tarDir)
     if isdir(srcDir):
         # The target directory must be created if it does not exist yet.
-        if not isdir(tarDir):
-            makedirs(tarDir)
+        if ensureDir(tarDir):
             info("Created folder '" + tarDir + "'.")
         basedir = basename(srcDir)
         # Everything okay. Now, if the target directory contains a sub-dir
@@ -583,21 +1353,77 @@ def linkDirTree(srcDir, tarDir):
         # the symlinked one.
         createLink(srcDir, tarPath)
         if backupDir:
-            for root, _, files in walk(backupDir):
-                for filePath in files:
-                    fullFilePath = join(root, filePath)
-                    destFilePath = join(srcDir, relpath(fullFilePath, backupDir))
-                    if exists(destFilePath):
-                        makeBackup(fullFilePath, dirname(destFilePath))
-                    else:
-                        try:
-                            makedirs(dirname(destFilePath))
-                        except:
-                            pass
-                        move(fullFilePath, destFilePath)
+            _mergeDirTree(backupDir, srcDir, threads or UTILS_LINK_DIR_TREE_THREADS)
     else:
         warn("The source directory '" + srcDir + "' does not exist.")
 
+def _mergeDirTree(fromDir, toDir, threads):
+    """
+    Moves all files from the 'fromDir' tree to the same relative paths in the
+    'toDir' tree. Files that already exist in 'toDir' are not overwritten, the
+    moved file is stored next to them as a backup instead (see \ref
+    makeBackup).
+
+    The work is done per directory (every target directory is listed and
+    created at most once) and the directories are spread over 'threads'
+    threads.
+    """
+    # Collect the files of every directory (like 'os.walk', symbolic links to
+    # directories are neither followed nor moved).
+    work = []
+    pending = ['']
+    while pending:
+        relDir = pending.pop()
+        files = []
+        for (name, isDirectory, isLink) in scanDir(join(fromDir, relDir)):
+            if not isDirectory:
+                files.append(name)
+            elif not isLink:
+                pending.append(join(relDir, name))
+        if files:
+            work.append((relDir, files))
+
+    def mergeDir(item):
+        from shutil import move
+        (relDir, files) = item
+        destDir = join(toDir, relDir)
+        try:
+            destNames = set([name for (name, _, _) in scanDir(destDir)])
+        except OSError:
+            destNames = set()
+            ensureDir(destDir)
+        for name in files:
+            if name in destNames:
+                makeBackup(join(fromDir, relDir, name), destDir)
+            else:
+                move(join(fromDir, relDir, name), join(destDir, name))
+
+    if threads > 1 and len(work) > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(threads, len(work)))
+        try:
+            pool.map(mergeDir, work)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for item in work:
+            mergeDir(item)
+
+def scanDir(dirPath):
+    """
+    @returns    A list of tuples '(name, isDirectory, isLink)' for all entries in
+                the given directory. 'isDirectory' follows symbolic links.
+
+                'os.scandir' (or the 'scandir' package) is used if available,
+                as it usually does not need a 'stat' call per entry.
+    """
+    if _scandir:
+        return [(e.name, e.is_dir(), e.is_symlink()) for e in _scandir(dirPath)]
+    from os import listdir
+    from os.path import islink
+    return [(name, isdir(join(dirPath, name)), islink(join(dirPath, name))) for name in listdir(dirPath)]
+
 def getHomeLibFile(filePath):
     """
     Returns the absolute path to the file of which we know only its relative
@@ -639,12 +1465,7 @@ def linkInSubfolders(theFile, linkName, options, *dirs):
     if not dirs:
         raise Exception("No subfolders given.")
     dirPath = joinPaths(dirs)
-    try:
-        makedirs(dirPath)
-    except:
-        pass
-    if not isdir(dirPath):
-        raise Exception("Could not create folder '" + dirPath + "'.")
+    ensureDir(dirPath)
     createLink(theFile, join(dirPath, linkName or basename(theFile)), options)
 
 def joinPaths(paths):
@@ -693,6 +1514,7 @@ def createTmpFile(prefix='.tmp', dirPath='/tmp'):
     """
     if not isdir(dirPath):
         raise IOError('The given folder does not exist')
+    from tempfile import mkstemp
     return mkstemp('', prefix + '.' + strftime('%Y-%m-%d_%H:%M:%S') + '.', dirPath)
 
 def createTmpDir(prefix='.tmp', dirPath='/tmp'):
@@ -722,6 +1544,7 @@ def createTmpDir(prefix='.tmp', dirPath='/tmp'):
     """
     if not isdir(dirPath):
         raise IOError('The given folder does not exist')
+    from tempfile import mkdtemp
     return mkdtemp('', prefix + '.' + strftime('%Y-%m-%d_%H:%M:%S') + '.', dirPath)
 
 def openOrCreateWithDir(filePath, mode = 'w'):
@@ -736,10 +1559,7 @@ def openOrCreateWithDir(filePath, mode = 'w'):
 
     @returns    The file descriptor (as returned by the 'open' function).
     """
-    try:
-        makedirs(dirname(filePath))
-    except:
-        pass
+    ensureDir(dirname(filePath) or '.')
     return open(filePath, mode)
 
 
@@ -759,6 +1579,7 @@ def runCmd(filePath, * args):
 
     @returns    The return code of the started process.
     """
+    import subprocess
     return subprocess.call(flatten(joinPaths(filePath), args))
 
 def runCmdCwd(workingDirectory, filePath, * args):
@@ -774,6 +1595,7 @@ def runCmdCwd(workingDirectory, filePath, * args):
 
     @returns    The return code of the started process.
     """
+    import subprocess
     return subprocess.call(flatten(joinPaths(filePath), args), cwd=joinPaths(workingDirectory))
 
 def runCmdGetString(filePath, * args):
@@ -789,6 +1611,7 @@ def runCmdGetString(filePath, * args):
                 finished process and the second element the string contents of
                 the application's output.
     """
+    from subprocess import PIPE, Popen
     proc = Popen(flatten(joinPaths(filePath), args), stdout=PIPE);
     cont = proc.stdout.read()
     retcode = proc.wait()
@@ -808,6 +1631,7 @@ def runCmdGetLines(filePath, * args):
                 finished process and the second element the list of string lines
                 which form the contents of the application's output.
     """
+    from subprocess import PIPE, Popen
     proc = Popen(flatten(joinPaths(filePath), args), stdout=PIPE);
     (stdoutdata,_) = proc.communicate()
     retcode = proc.wait()
@@ -965,13 +1789,20 @@ def cfgSet(configParser, section, key, value):
 DEFAULT_LOGGING_FORMAT="[%(levelname)s | %(asctime)s] :: %(message)s"
 DEFAULT_LOGGING_DATE_FORMAT="%Y-%m-%d %H:%M:%S"
 
-# Setup error and information logging.
-logging.basicConfig(
-                    level=logging.DEBUG,
-                    stream=sys.__stdout__,
-                    format=DEFAULT_LOGGING_FORMAT,
-                    datefmt=DEFAULT_LOGGING_DATE_FORMAT
-                   )
+def initLogging():
+    """
+    Sets up error and information logging (to the standard output). Calling
+    this function more than once has no effect.
+
+    This used to happen when this module was imported. It is now called by
+    \link homelib.main.Main \endlink.
+    """
+    logging.basicConfig(
+                        level=logging.DEBUG,
+                        stream=sys.__stdout__,
+                        format=DEFAULT_LOGGING_FORMAT,
+                        datefmt=DEFAULT_LOGGING_DATE_FORMAT
+                       )
 
 def getClassLogger(cls, baseDir=None, level=logging.DEBUG, msgFormat=DEFAULT_LOGGING_FORMAT, dateFormat=DEFAULT_LOGGING_DATE_FORMAT):
     """
@@ -1017,7 +1848,18 @@ def getClassLogger(cls, baseDir=None, level=logging.DEBUG, msgFormat=DEFAULT_LOG
     
     return logger
 
-def addLoggerHandler(cls, baseDir=None, level=logging.DEBUG, msgFormat=DEFAULT_LOGGING_FORMAT, dateFormat=DEFAULT_LOGGING_DATE_FORMAT):
+class _ThreadLogFilter(logging.Filter):
+    """
+    Lets through only the log records that were logged by the given thread.
+    """
+    def __init__(self, threadId):
+        logging.Filter.__init__(self)
+        self.__threadId = threadId
+
+    def filter(self, record):
+        return record.thread == self.__threadId
+
+def addLoggerHandler(cls, baseDir=None, level=logging.DEBUG, msgFormat=DEFAULT_LOGGING_FORMAT, dateFormat=DEFAULT_LOGGING_DATE_FORMAT, onlyCurrentThread=False):
     """
     This method adds to the global logger a handler that appends log messages to
     a file. The name of the file is constructed via the class' name and is
@@ -1035,6 +1877,9 @@ def addLoggerHandler(cls, baseDir=None, level=logging.DEBUG, msgFormat=DEFAULT_L
 
     @param  dateFormat  [Optional] The date format to use for logging.
 
+    @param  onlyCurrentThread   [Optional] If 'True', the handler will write
+                                only messages logged by the calling thread.
+
     @returns    A pair, the elements being:
 
                     0   - The StreamHandler.
@@ -1052,6 +1897,8 @@ def addLoggerHandler(cls, baseDir=None, level=logging.DEBUG, msgFormat=DEFAULT_L
     lh = StreamHandler(fd)
     lh.setFormatter(Formatter(msgFormat, dateFormat))
     lh.setLevel(level)
+    if onlyCurrentThread:
+        lh.addFilter(_ThreadLogFilter(thread.get_ident()))
     logger.addHandler(lh)
 
     return (lh, fd)
@@ -0,0 +1,444 @@
+# coding=UTF-8
+#
+#   Project: HomeLib
+# 
+#       A library for configuration and management of a personal environment.
+# 
+# File name: versionstore.py
+# 
+#    Author: Matej Urbas [matej.urbas@gmail.com]
+#   Created: 18-Oct-2026, 11:02:00
+# 
+#  Copyright © 2026 Matej Urbas
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from ConfigParser import SafeConfigParser
+from logging import info
+from os.path import dirname
+from os.path import exists
+from os.path import join
+from threading import Lock
+
+from homelib.config import CFG_SEC_VINFO
+from homelib.config import CFG_VINFO_CUR_VERSION
+from homelib.config import CFG_VINFO_LAST_RUN_DURATION
+from homelib.config import CFG_VINFO_LAST_RUN_FINISHED
+from homelib.config import CFG_VINFO_LAST_RUN_STARTED
+from homelib.config import CONFIG_VERSION_FILE
+from homelib.config import CONFIG_VERSION_JOURNAL_FILE
+from homelib.journal import ProgressJournal
+from homelib.service import MultiService
+from homelib.utils import cfgGetIntOrDefault
+from homelib.utils import cfgGetOrDefault
+from homelib.utils import cfgSet
+from homelib.utils import UTILS_DURABILITY_STRICT
+from homelib.utils import makedirs
+from homelib.utils import writeFileAtomically
+
+
+
+###
+### Configuration option names/sections
+###
+
+"""
+This value indicates which 'Version Store' implementation should be used to
+keep the progress of configuration scripts.
+
+Currently known (supported) version store implementations:
+
+    file    - A '.config_version' file in each script's store directory (the
+              default).
+
+    sqlite  - A single SQLite database for all scripts and home directories.
+"""
+CFG_GINFO_VERSION_STORE="versionStore"
+
+"""
+The path to the SQLite database used by the 'sqlite' version store. By default
+this is '<homedir>/.homelib/homelib.db'.
+"""
+CFG_GINFO_DATABASE="database"
+
+"""
+The name of the version store implementation used if none is configured.
+"""
+DEFAULT_VERSION_STORE="file"
+
+"""
+The name of the default SQLite database file (in the '.homelib' directory of
+the home folder).
+"""
+DEFAULT_DATABASE_FILE="homelib.db"
+
+
+
+###
+### The 'Version Store' Service
+###
+
+class VersionStore(MultiService):
+    """
+    This is the base class of services that persist the progress of
+    configuration scripts (the 'version info' of every script).
+
+    The version info of a script is a SafeConfigParser with the section
+    'Current Version Info'. The store loads it before a script runs, records
+    a checkpoint after every successful update, and saves it when the script
+    finishes.
+    """
+    def __init__(self, main=None):
+        MultiService.__init__(self, main)
+
+    @classmethod
+    def knownImpls(cls):
+        return {
+            "file": ("versionstore", "FileVersionStore"),
+            "sqlite": ("versionstore", "SqliteVersionStore")
+        }
+
+    @classmethod
+    def getChosenImplCfgKey(cls):
+        return CFG_GINFO_VERSION_STORE
+
+    @classmethod
+    def loadChosenImpl(cls, main=None):
+        if not main:
+            import homelib.main
+            main = homelib.main.Main()
+        return cls.loadImpl(main.getGiCfg(cls.getChosenImplCfgKey()) or DEFAULT_VERSION_STORE, main)
+
+
+
+    ###
+    ### Version Store Service Interface
+    ###
+    def load(self, details):
+        """
+        @param  details The details of the configuration script (see
+                        \link Config.getCfgScriptDetails \endlink).
+
+        @returns    A SafeConfigParser with the saved version info of the
+                    given script (empty if the script has not run yet).
+        """
+        raise NotImplementedError
+
+
+
+    def checkpoint(self, details, versionInfo):
+        """
+        Durably records the current version of the given script. This is
+        called after every successful update.
+
+        @param  details The details of the configuration script.
+
+        @param  versionInfo The version info of the script (as returned by
+                            'load').
+        """
+        raise NotImplementedError
+
+
+
+    def save(self, details, versionInfo):
+        """
+        Stores the whole version info of the given script. This is called when
+        the script finishes (successfully or not).
+
+        @param  details The details of the configuration script.
+
+        @param  versionInfo The version info of the script (as returned by
+                            'load').
+        """
+        raise NotImplementedError
+
+
+
+    def getAllVersions(self):
+        """
+        @returns    A list of tuples '(script, target, version, started,
+                    finished, duration)', one for every configuration script
+                    this store knows about. 'target' is the home directory
+                    (or the store directory) the version applies to, the times
+                    are UNIX timestamps and the duration is in seconds (these
+                    three may be None).
+        """
+        raise NotImplementedError
+
+
+
+###
+### Version files in the scripts' store directories
+###
+
+class FileVersionStore(VersionStore):
+    """
+    Keeps the version info of every script in the '.config_version' file in
+    the script's store directory. Checkpoints are appended to a progress
+    journal next to it.
+    """
+    def __init__(self, main=None):
+        VersionStore.__init__(self, main)
+        # Maps store directories to the progress journals of running scripts.
+        self.__journals = {}
+        self.__lock = Lock()
+
+
+
+    def load(self, details):
+        storeDir = _getStoreDir(details)
+        cfgParser = SafeConfigParser()
+        cfgParser.read(join(storeDir, CONFIG_VERSION_FILE))
+        # Recover the progress of a run that did not get to save the version
+        # file.
+        for (key, value) in ProgressJournal(join(storeDir, CONFIG_VERSION_JOURNAL_FILE)).replay().items():
+            info("Recovered '" + key + " = " + value + "' from the progress journal of '" + details[0] + "'.")
+            cfgSet(cfgParser, CFG_SEC_VINFO, key, value)
+        return cfgParser
+
+
+
+    def checkpoint(self, details, versionInfo):
+        storeDir = _getStoreDir(details)
+        with self.__lock:
+            journal = self.__journals.get(storeDir)
+            if journal is None:
+                journal = ProgressJournal(join(storeDir, CONFIG_VERSION_JOURNAL_FILE))
+                self.__journals[storeDir] = journal
+        journal.append(CFG_VINFO_CUR_VERSION, cfgGetIntOrDefault(versionInfo, CFG_SEC_VINFO, CFG_VINFO_CUR_VERSION, 0))
+
+
+
+    def save(self, details, versionInfo):
+        storeDir = _getStoreDir(details)
+        with self.__lock:
+            journal = self.__journals.pop(storeDir, None)
+        try:
+            try:
+                makedirs(storeDir)
+            except:
+                pass
+            journalPath = join(storeDir, CONFIG_VERSION_JOURNAL_FILE)
+            # The progress journal is removed after this, so the new version
+            # file must reach the disk first (if there is a journal).
+            writeFileAtomically(join(storeDir, CONFIG_VERSION_FILE),
+                                versionInfo.write,
+                                durability=UTILS_DURABILITY_STRICT if journal or exists(journalPath) else None)
+            # The version file now contains all the progress from the journal.
+            (journal or ProgressJournal(journalPath)).clear()
+        finally:
+            if journal:
+                journal.close()
+
+
+
+    def getAllVersions(self):
+        versions = []
+        cfgService = self.getMain().serviceConfig()
+        for name in cfgService.getCfgScriptsNames():
+            details = cfgService.getCfgScriptDetails(name)
+            versionInfo = self.load(details)
+            versions.append((name, details[3]) + _getRunInfo(versionInfo))
+        return versions
+
+
+
+###
+### A single SQLite database
+###
+
+class SqliteVersionStore(VersionStore):
+    """
+    Keeps the version info of all scripts in a single SQLite database. Each
+    script's info is stored per home directory, so one database can serve
+    several users and many scripts, and status queries need just one indexed
+    lookup.
+
+    If the database has no record of a script yet, its '.config_version' file
+    (if any) is imported, so switching to this store does not re-run updates.
+    """
+    def __init__(self, main=None):
+        VersionStore.__init__(self, main)
+        self.__dbPath = self.getMain().getGiCfg(CFG_GINFO_DATABASE) or getDefaultDatabasePath(self.getMain())
+        self.__target = self.getMain().dirHome()
+        conn = self.__connect()
+        try:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS script_versions ('
+                             'script TEXT NOT NULL, '
+                             'target TEXT NOT NULL, '
+                             'store_dir TEXT, '
+                             'version INTEGER NOT NULL DEFAULT 0, '
+                             'started REAL, '
+                             'finished REAL, '
+                             'duration REAL, '
+                             'PRIMARY KEY (script, target))')
+                conn.execute('CREATE INDEX IF NOT EXISTS script_versions_target ON script_versions (target)')
+                conn.execute('CREATE TABLE IF NOT EXISTS script_version_info ('
+                             'script TEXT NOT NULL, '
+                             'target TEXT NOT NULL, '
+                             'section TEXT NOT NULL, '
+                             'key TEXT NOT NULL, '
+                             'value TEXT, '
+                             'PRIMARY KEY (script, target, section, key))')
+        finally:
+            conn.close()
+
+
+
+    def getDatabasePath(self):
+        """
+        @returns    The path to the SQLite database of this store.
+        """
+        return self.__dbPath
+
+
+
+    def load(self, details):
+        conn = self.__connect()
+        try:
+            rows = conn.execute('SELECT section, key, value FROM script_version_info WHERE script = ? AND target = ?', (details[0], self.__target)).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            info("No version info for '" + details[0] + "' in the database '" + self.__dbPath + "'. Importing it from the store directory.")
+            return FileVersionStore(self.getMain()).load(details)
+        cfgParser = SafeConfigParser()
+        for (section, key, value) in rows:
+            cfgSet(cfgParser, section, key, value)
+        return cfgParser
+
+
+
+    def checkpoint(self, details, versionInfo):
+        conn = self.__connect()
+        try:
+            with conn:
+                self.__update(conn, details, versionInfo, [(CFG_SEC_VINFO, CFG_VINFO_CUR_VERSION)])
+        finally:
+            conn.close()
+
+
+
+    def save(self, details, versionInfo):
+        conn = self.__connect()
+        try:
+            with conn:
+                self.__update(conn, details, versionInfo, [(section, key) for section in versionInfo.sections() for key in versionInfo.options(section)])
+        finally:
+            conn.close()
+
+
+
+    def getAllVersions(self):
+        return self.getVersions()
+
+
+
+    def getVersions(self, target=None):
+        """
+        @param  target  <b>[Optional]</b> The home directory for which to list
+                        the versions. If not given, the versions for all home
+                        directories are listed.
+
+        @returns    The same as \link VersionStore.getAllVersions \endlink.
+        """
+        conn = self.__connect()
+        try:
+            if target is None:
+                return conn.execute('SELECT script, target, version, started, finished, duration FROM script_versions ORDER BY target, script').fetchall()
+            return conn.execute('SELECT script, target, version, started, finished, duration FROM script_versions WHERE target = ? ORDER BY script', (target,)).fetchall()
+        finally:
+            conn.close()
+
+
+
+    def getVersion(self, script, target=None):
+        """
+        @param  script  The name of the configuration script.
+
+        @param  target  <b>[Optional]</b> The home directory. If not given, the
+                        home directory of this HomeLib session is used.
+
+        @returns    The version to which the script has updated the given
+                    target (0 if it has not run yet).
+        """
+        conn = self.__connect()
+        try:
+            row = conn.execute('SELECT version FROM script_versions WHERE script = ? AND target = ?', (script, target or self.__target)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else 0
+
+
+
+    def __connect(self):
+        # Connections are not shared, so scripts running in different threads
+        # can use the store at the same time.
+        try:
+            makedirs(dirname(self.__dbPath))
+        except:
+            pass
+        import sqlite3
+        return sqlite3.connect(self.__dbPath, timeout=60)
+
+
+
+    def __update(self, conn, details, versionInfo, keys):
+        for (section, key) in keys:
+            conn.execute('INSERT OR REPLACE INTO script_version_info (script, target, section, key, value) VALUES (?, ?, ?, ?, ?)',
+                         (details[0], self.__target, section, key, versionInfo.get(section, key, True)))
+        conn.execute('INSERT OR REPLACE INTO script_versions (script, target, store_dir, version, started, finished, duration) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (details[0], self.__target, details[3]) + _getRunInfo(versionInfo))
+
+
+
+###
+### Helper functions
+###
+
+def getDefaultDatabasePath(main):
+    """
+    @returns    The path of the SQLite database used when none is configured.
+    """
+    from homelib.main import HOMELIB_CONFIG_DIR
+    return join(main.dirHome(), HOMELIB_CONFIG_DIR, DEFAULT_DATABASE_FILE)
+
+
+
+def _getStoreDir(details):
+    storeDir = details[3]
+    if not storeDir:
+        raise Exception("The store directory for the configuration script '" + details[0] + "' not specified.")
+    return storeDir
+
+
+
+def _getRunInfo(versionInfo):
+    """
+    @returns    A tuple '(version, started, finished, duration)' from the given
+                version info.
+    """
+    def getFloat(key):
+        value = cfgGetOrDefault(versionInfo, CFG_SEC_VINFO, key)
+        return float(value) if value else None
+    return (cfgGetIntOrDefault(versionInfo, CFG_SEC_VINFO, CFG_VINFO_CUR_VERSION, 0),
+            getFloat(CFG_VINFO_LAST_RUN_STARTED),
+            getFloat(CFG_VINFO_LAST_RUN_FINISHED),
+            getFloat(CFG_VINFO_LAST_RUN_DURATION))